@@ -0,0 +1,93 @@
+"""
+Supportive functions shared by the benchmarks. This includes seeding a local PostgreSQL database with generated sensor
+data that resembles the data inserted by the Raspberry pi zero, and timing the functions that are benchmarked.
+
+The benchmarks drop and recreate the measurement tables, so the database config that is given to them should always
+point to a local database that is only used for benchmarking.
+"""
+import datetime
+import statistics
+import time
+import tracemalloc
+
+from indoor_climate_assistant.database import ROLLUP_TABLES, SENSORS_TABLE, MEASUREMENTS_TABLE, RAW_TABLE, \
+    DEFAULT_SENSOR, DEFAULT_ROOM
+
+
+def seed_measurements(database, years):
+    """
+    Drops and recreates the measurement tables and fills the measurements table with a data point for each minute in
+    the given amount of years, ending now, taken by the sensor in the living room. Any existing rollup tables are
+    dropped as well. The data follows a daily pattern with some noise to resemble real indoor climate data.
+
+    :param database: The database that should be seeded.
+    :param years: The amount of years of data that should be generated.
+    :return: A tuple with the format (sensor id, number of rows that was inserted).
+    """
+    with database.transaction() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS " + ", ".join([MEASUREMENTS_TABLE, RAW_TABLE, SENSORS_TABLE] +
+                                                            list(ROLLUP_TABLES.values())) + " CASCADE")
+
+    database.partitions.clear()
+    database.rollups_available = False
+
+    database.create_tables()
+    sensor_id = database.register_sensor(DEFAULT_SENSOR, DEFAULT_ROOM)
+
+    end = datetime.datetime.now(datetime.timezone.utc)
+    database.create_partitions(MEASUREMENTS_TABLE, end - datetime.timedelta(days=int(years * 365.25)), end)
+
+    with database.transaction() as cursor:
+        # Generating the data in PostgreSQL since inserting millions of rows from Python would take far longer.
+        cursor.execute("INSERT INTO " + MEASUREMENTS_TABLE + " (sensor_id, temperature, airpressure, humidity, "
+                       "gasresistance, airquality, time) "
+                       "SELECT %s, round((21 + 2 * sin(extract(epoch FROM t) / 13750.99) + random())::numeric, 2), "
+                       "round((1013 + 10 * sin(extract(epoch FROM t) / 604800) + random())::numeric, 2), "
+                       "round((45 + 10 * sin(extract(epoch FROM t) / 13750.99) + random())::numeric, 2), "
+                       "(150000 + 20000 * random())::integer, "
+                       "round((80 + 15 * random())::numeric, 2), t "
+                       "FROM generate_series(%s - make_interval(days => %s), %s, "
+                       "interval '1 minute') AS t", (sensor_id, end, int(years * 365.25), end))
+        row_count = cursor.rowcount
+
+        cursor.execute("ANALYZE " + MEASUREMENTS_TABLE)
+
+    return sensor_id, row_count
+
+
+def measure(function, repeat=5):
+    """
+    Calls the function the given amount of times and measures how long each call takes.
+
+    :param function: The function that should be measured. It is called without any arguments.
+    :param repeat: The amount of times the function should be called.
+    :return: A tuple with the format (median seconds, result of the last call).
+    """
+    durations = []
+    result = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+
+    return statistics.median(durations), result
+
+
+def measure_memory(function):
+    """
+    Calls the function and measures the memory allocated by Python while doing so.
+
+    :param function: The function that should be measured. It is called without any arguments.
+    :return: A tuple with the format (retained bytes, peak bytes, result of the call), where retained bytes is the
+    memory that is still allocated after the call, which is mostly the result itself.
+    """
+    tracemalloc.start()
+
+    try:
+        result = function()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return retained, peak, result
@@ -0,0 +1,72 @@
+"""
+Benchmark comparing the conversion of the queried rows into plottable data, where the rows are either retrieved as
+tuples of datetime and Decimal objects and converted row by row, or retrieved directly as NumPy arrays. Both the time
+and the memory used by each approach are measured. The benchmark is run against a local PostgreSQL database that is
+seeded with generated data.
+
+Run from the root of the repository with:
+    python -m benchmarks.conversion_benchmark --config path/to/benchmark_database_config.json --years 1
+"""
+import argparse
+import datetime
+
+import matplotlib.dates
+
+from indoor_climate_assistant.database import Database
+from benchmarks.common import seed_measurements, measure, measure_memory
+
+# The time ranges that are benchmarked, given as the number of minutes in the time range.
+TIME_RANGES = {
+    "Today": 1440,
+    "This month": 43829,
+    "This year": 525949
+}
+
+
+def convert_rows(database, sensor_id, start, end):
+    """Retrieving the rows as tuples and converting each row into a number and a float, like the main window did."""
+    rows = database.get_range([sensor_id], ["temperature"], start, end)[sensor_id]
+
+    x = matplotlib.dates.date2num([row[0] for row in rows])
+    y = [float(row[1]) for row in rows]
+
+    return x, y
+
+
+def convert_arrays(database, sensor_id, start, end):
+    """Retrieving the rows as arrays and converting all times with a single vectorized operation."""
+    times, (values,) = database.get_range([sensor_id], ["temperature"], start, end, as_arrays=True)[sensor_id]
+
+    x = matplotlib.dates.date2num(times.view("datetime64[us]"))
+
+    return x, values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of row by row versus array based conversion of data.")
+    parser.add_argument("--config", required=True, help="Database config pointing to a local benchmark database.")
+    parser.add_argument("--years", type=float, default=1, help="The amount of years of minute data to generate.")
+    args = parser.parse_args()
+
+    # Disabling the statement timeout since seeding multiple years of data takes a while.
+    database = Database(args.config, statement_timeout=0)
+
+    sensor_id, row_count = seed_measurements(database, args.years)
+    print("Seeded " + str(row_count) + " rows")
+
+    for time_range, minutes in TIME_RANGES.items():
+        end = datetime.datetime.now(datetime.timezone.utc)
+        start = end - datetime.timedelta(minutes=minutes)
+
+        for name, convert in [("rows", convert_rows), ("arrays", convert_arrays)]:
+            seconds, (x, _) = measure(lambda: convert(database, sensor_id, start, end))
+            retained, peak, _ = measure_memory(lambda: convert(database, sensor_id, start, end))
+
+            print("{:<11} {:<6}: {:8.1f} ms {:>7} rows | retained {:8.2f} MB | peak {:8.2f} MB".format(
+                time_range, name, seconds * 1000, len(x), retained / 2 ** 20, peak / 2 ** 20))
+
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
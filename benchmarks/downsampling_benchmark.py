@@ -0,0 +1,65 @@
+"""
+Benchmark comparing the condensed get_sensor_data query, which picks every 60th row, with the downsampled query that
+aggregates the data into buckets in PostgreSQL, both from the raw data and from the rollup tables. The benchmark is run
+against a local PostgreSQL database that is seeded with multiple years of generated data.
+
+Run from the root of the repository with:
+    python -m benchmarks.downsampling_benchmark --config path/to/benchmark_database_config.json --years 5
+"""
+import argparse
+import datetime
+
+from indoor_climate_assistant.database import Database
+from benchmarks.common import seed_measurements, measure
+
+# The time frames that are benchmarked, given as the number of minutes in the time frame like in the main window.
+TIME_FRAMES = {
+    "This week": 10080,
+    "This month": 43829,
+    "This year": 525949,
+    "All time": 946707779
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of condensed versus downsampled sensor data queries.")
+    parser.add_argument("--config", required=True, help="Database config pointing to a local benchmark database.")
+    parser.add_argument("--years", type=float, default=5, help="The amount of years of minute data to generate.")
+    parser.add_argument("--width", type=int, default=981, help="The width of the plot in pixels.")
+    args = parser.parse_args()
+
+    # Disabling the statement timeout since seeding multiple years of data takes a while.
+    database = Database(args.config, statement_timeout=0)
+
+    sensor_id, row_count = seed_measurements(database, args.years)
+    print("Seeded " + str(row_count) + " rows")
+
+    backfill_seconds, _ = measure(lambda: (database.create_rollups(), database.backfill_rollups()), repeat=1)
+    print("Backfilled the rollup tables in {:.1f} s".format(backfill_seconds))
+
+    for time_frame, minutes in TIME_FRAMES.items():
+        end = datetime.datetime.now(datetime.timezone.utc)
+        start = end - datetime.timedelta(minutes=minutes)
+        bucket = database.choose_bucket(start, end, args.width)
+
+        condensed_seconds, condensed_rows = measure(
+            lambda: database.get_sensor_data(sensor_id, "time, temperature", minutes, condense=True))
+
+        # Skipping the rollup tables so the raw data is aggregated.
+        downsampled_seconds, downsampled_rows = measure(
+            lambda: database.get_downsampled_data([sensor_id], ["temperature"], start, end, bucket,
+                                                  use_rollups=False)[sensor_id])
+
+        rollup_seconds, rollup_rows = measure(
+            lambda: database.get_downsampled_data([sensor_id], ["temperature"], start, end, bucket)[sensor_id])
+
+        print("{:<12} condensed: {:8.1f} ms {:>6} rows | downsampled ({:<6}): {:8.1f} ms {:>6} rows | "
+              "rollup: {:8.1f} ms {:>6} rows".format(time_frame, condensed_seconds * 1000, len(condensed_rows), bucket,
+                                                      downsampled_seconds * 1000, len(downsampled_rows),
+                                                      rollup_seconds * 1000, len(rollup_rows)))
+
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Benchmark of the cold start of the desktop application. Each start runs main_gui in a new process, so nothing has been
+imported beforehand, and measures the time from starting the process until the modules are imported, the main window
+is first painted, the first data is plotted, which is the coarse preview if the data has to be queried, and the
+requested data is plotted. The application is started from a temporary folder with its own settings and database
+config, so the settings of the application are not changed.
+
+Run from the root of the repository with:
+    python -m benchmarks.startup_benchmark --config path/to/benchmark_database_config.json --years 1
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from indoor_climate_assistant.database import Database
+from benchmarks.common import seed_measurements, measure
+
+# The folder containing the files of the desktop application.
+PACKAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "indoor_climate_assistant")
+
+# The moments of the start that are measured, in the order they happen.
+MILESTONES = ["imported", "first_paint", "first_plot", "plot"]
+
+
+def run_child(started, timeout):
+    """
+    Starts the application like main_gui does and prints the number of milliseconds from the given start of the process
+    until each milestone as json, after which the application is closed. This is run in the started process.
+
+    :param started: The time the process was started, given as seconds since the epoch.
+    :param timeout: The number of seconds before the start is given up.
+    """
+    from indoor_climate_assistant import main_gui
+    from PyQt5 import QtCore
+
+    milestones = {"imported": (time.time() - started) * 1000}
+
+    app, main_window, system_tray = main_gui.start([sys.argv[0]])
+
+    class PaintFilter(QtCore.QObject):
+        """Event filter that saves the time of the first paint of any widget."""
+        def eventFilter(self, watched, event):
+            if event.type() == QtCore.QEvent.Paint and "first_paint" not in milestones:
+                milestones["first_paint"] = (time.time() - started) * 1000
+
+                # Saving whether matplotlib was imported before the window was painted.
+                milestones["matplotlib_before_paint"] = "matplotlib" in sys.modules
+
+            return False
+
+    paint_filter = PaintFilter()
+    app.installEventFilter(paint_filter)
+
+    plot_data = main_window.plot_data
+
+    def record_plot(data, bucket, preview=False):
+        """Plots the data and saves the time of the first plot, and of the requested data, which ends the start."""
+        plot_data(data, bucket, preview)
+
+        elapsed = (time.time() - started) * 1000
+        milestones.setdefault("first_plot", elapsed)
+        milestones["plots"] = milestones.get("plots", 0) + 1
+
+        if not preview:
+            milestones["plot"] = elapsed
+            app.quit()
+
+    # The data store calls the plot_data attribute of the main window, so the replacement is called instead.
+    main_window.plot_data = record_plot
+
+    QtCore.QTimer.singleShot(int(timeout * 1000), app.quit)
+    app.exec_()
+
+    print(json.dumps(milestones), flush=True)
+
+
+def benchmark_startup(config_path, time_frame="This month", repeat=5, timeout=60):
+    """
+    Measures the cold start of the application against the database in the given config, where the main window shows
+    the temperature in the given time frame.
+
+    :return: A dictionary with the median milliseconds from starting the process until each milestone.
+    """
+    runs = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        resources = os.path.join(directory, "resources")
+        os.makedirs(resources)
+        os.makedirs(os.path.join(directory, "app"))
+
+        shutil.copy(config_path, os.path.join(resources, "database_config.json"))
+        shutil.copy(os.path.join(PACKAGE_PATH, "..", "resources", "graph_icon.ico"), resources)
+
+        settings = {
+            "data": "Temperature",
+            "time frame": time_frame,
+            "air quality warning": False,
+            "air quality min threshold": 70,
+            "temperature warning": False,
+            "temperature min threshold": 18,
+            "temperature max threshold": 25,
+            "rooms": None
+        }
+
+        # The application is run from its folder, where the custom plot widget is imported as a top level module.
+        environment = dict(os.environ, QT_QPA_PLATFORM="offscreen",
+                           PYTHONPATH=os.pathsep.join([os.path.dirname(PACKAGE_PATH), PACKAGE_PATH]))
+
+        for _ in range(repeat):
+            # Writing the settings before every start, since the application saves them while it runs.
+            with open(os.path.join(resources, "settings.json"), "w") as file:
+                json.dump(settings, file)
+
+            started = time.time()
+            child = subprocess.run([sys.executable, "-m", "benchmarks.startup_benchmark", "--child", str(started),
+                                    "--timeout", str(timeout)], cwd=os.path.join(directory, "app"), env=environment,
+                                   stdout=subprocess.PIPE, universal_newlines=True, timeout=timeout + 30)
+
+            runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    if any("plot" not in run for run in runs):
+        raise RuntimeError("The application did not plot the data within " + str(timeout) + " seconds")
+
+    results = {milestone + "_ms": statistics.median(run[milestone] for run in runs) for milestone in MILESTONES}
+    results["matplotlib_before_paint"] = any(run["matplotlib_before_paint"] for run in runs)
+    results["plots"] = max(run["plots"] for run in runs)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the cold start of the desktop application.")
+    parser.add_argument("--config", help="Database config pointing to a local benchmark database.")
+    parser.add_argument("--years", type=float, default=1, help="The amount of years of minute data to generate.")
+    parser.add_argument("--time-frames", nargs="+", default=["Today", "This month", "All time"],
+                        help="The time frames that the application is started with.")
+    parser.add_argument("--repeat", type=int, default=5, help="The amount of starts of each time frame.")
+    parser.add_argument("--timeout", type=float, default=60, help="The seconds before a start is given up.")
+    parser.add_argument("--child", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child, args.timeout)
+        return
+
+    if args.config is None:
+        parser.error("--config is required")
+
+    # Disabling the statement timeout since seeding multiple years of data takes a while.
+    database = Database(args.config, statement_timeout=0)
+
+    seed_seconds, (_, row_count) = measure(lambda: seed_measurements(database, args.years), repeat=1)
+    database.create_rollups()
+    database.backfill_rollups()
+    database.close()
+
+    print("Seeded {} rows in {:.1f} s".format(row_count, seed_seconds))
+
+    for time_frame in args.time_frames:
+        results = benchmark_startup(os.path.abspath(args.config), time_frame, args.repeat, args.timeout)
+
+        print("{:<11} imported: {:6.0f} ms | first paint: {:6.0f} ms | first plot: {:6.0f} ms | plot: {:6.0f} ms | "
+              "plots: {} | matplotlib before paint: {}".format(
+                time_frame, results["imported_ms"], results["first_paint_ms"], results["first_plot_ms"],
+                results["plot_ms"], results["plots"], results["matplotlib_before_paint"]))
+
+
+if __name__ == '__main__':
+    main()
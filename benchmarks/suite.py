@@ -0,0 +1,282 @@
+"""
+Benchmark suite covering the performance critical paths of the application: inserting data, querying the time frames
+with and without condensing or downsampling, converting the queried data into plottable arrays, and redrawing the plot.
+For each amount of years the local PostgreSQL database is seeded with a data point for each minute and every benchmark
+is run against it. The results are written as JSON, and can be compared with the results of an earlier run to see how
+each timing changed between versions.
+
+Run from the root of the repository with:
+    python -m benchmarks.suite --config path/to/benchmark_database_config.json --years 1 5 10 --output results.json
+    python -m benchmarks.suite --config path/to/benchmark_database_config.json --baseline previous.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+# The plot is drawn offscreen, so the benchmark can run without a display.
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import matplotlib.dates
+import numpy as np
+
+from indoor_climate_assistant.database import Database, MEASUREMENTS_TABLE
+from indoor_climate_assistant.data_store import DataStore
+from indoor_climate_assistant.series_buffer import SeriesBuffer
+from benchmarks.common import seed_measurements, measure
+
+# The time frames of the main window.
+TIME_FRAMES = ["Now", "Today", "This week", "This month", "This year", "All time"]
+
+# The folder containing the files of the desktop application.
+PACKAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "indoor_climate_assistant")
+
+
+def benchmark_ingestion(database, sensor_id, single_rows=500, batch_rows=10000):
+    """
+    Measures how many rows can be inserted per second, both one row per transaction like insert_sensor_data and in a
+    single batch like the ingestion writer. The inserted rows are deleted afterwards.
+
+    :return: A dictionary with the rows per second of each way of inserting.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    # Inserting the batch a day into the future so it does not overlap the seeded rows or the rows inserted one by one.
+    row = (21.5, 1013.25, 45.0, 150000, 85.0)
+    batch = [row + (now + datetime.timedelta(days=1, seconds=second),) for second in range(batch_rows)]
+
+    single_seconds, _ = measure(lambda: [database.insert_sensor_data(sensor_id, row) for _ in range(single_rows)],
+                                repeat=1)
+    batch_seconds, _ = measure(lambda: database.insert_sensor_data_batch(sensor_id, batch), repeat=1)
+
+    with database.transaction() as cursor:
+        cursor.execute("DELETE FROM " + MEASUREMENTS_TABLE + " WHERE sensor_id = %s AND time > %s", (sensor_id, now))
+
+    return {
+        "single_rows_per_second": single_rows / single_seconds,
+        "batch_rows_per_second": batch_rows / batch_seconds
+    }
+
+
+def benchmark_queries(database, data_store, sensor_id, start, end, row_count, width):
+    """
+    Measures the queries for a time frame: the original get_sensor_data query with and without condensing, and the
+    array query that the data store uses, followed by the conversion of the result into the series that is plotted.
+
+    :return: A tuple with the format (results, ({sensor_id: (times, arrays)}, bucket)) where the second element is the
+    queried data.
+    """
+    minutes = row_count if start is None else int((end - start).total_seconds() // 60)
+    start = start or database.get_first_time([sensor_id])
+
+    sensor_data_seconds, sensor_data_rows = measure(lambda: database.get_sensor_data(sensor_id, "time, temperature",
+                                                                                     minutes))
+    condensed_seconds, condensed_rows = measure(lambda: database.get_sensor_data(sensor_id, "time, temperature",
+                                                                                 minutes, condense=True))
+
+    # Using the same resolution as the data store does when the time frame is requested by the main window.
+    bucket = database.choose_bucket(start, end, width) if end - start >= DataStore.BUCKET_SPAN else None
+    query_seconds, entries = measure(lambda: data_store.query([sensor_id], start, end, bucket))
+    entry = entries[sensor_id]
+
+    suffixes = [""] if bucket is None else ["_min", "_avg", "_max"]
+    arrays = [entry.columns["temperature" + suffix] for suffix in suffixes]
+    conversion_seconds, _ = measure(lambda: SeriesBuffer(matplotlib.dates.date2num(entry.times.view("datetime64[us]")),
+                                                         arrays[len(arrays) // 2]))
+
+    results = {
+        "get_sensor_data_ms": sensor_data_seconds * 1000,
+        "get_sensor_data_rows": len(sensor_data_rows),
+        "get_sensor_data_condensed_ms": condensed_seconds * 1000,
+        "get_sensor_data_condensed_rows": len(condensed_rows),
+        "bucket": bucket,
+        "query_ms": query_seconds * 1000,
+        "query_rows": len(entry.times),
+        "conversion_ms": conversion_seconds * 1000
+    }
+
+    return results, ({sensor_id: (entry.times, arrays)}, bucket)
+
+
+def create_main_window(data_store, directory):
+    """
+    Creates the main window in the same way as when the application is started from its folder, where the custom plot
+    widget is imported as a top level module and the files are read relative to the working directory. The window is
+    run from a temporary directory so the benchmark does not change the settings of the application.
+
+    :param data_store: The data store used by the main window.
+    :param directory: A temporary directory that the settings of the main window are saved in.
+    :return: The main window, which is shown offscreen.
+    """
+    from PyQt5 import QtWidgets
+
+    sys.path.append(PACKAGE_PATH)
+    from indoor_climate_assistant.main_window import MainWindow
+
+    os.makedirs(os.path.join(directory, "resources"))
+    os.makedirs(os.path.join(directory, "app"))
+    os.chdir(os.path.join(directory, "app"))
+
+    main_window = MainWindow(data_store)
+    main_window.dataComboBox.setCurrentIndex(main_window.dataComboBox.findText("Temperature"))
+    main_window.show()
+    QtWidgets.QApplication.processEvents()
+
+    return main_window
+
+
+def benchmark_drawing(main_window, time_frame, data):
+    """
+    Measures how long it takes to draw the plot of a time frame completely, which is done when the plot is initialized,
+    and to redraw only the line, which is done by the live updates.
+
+    :return: A dictionary with the timings in milliseconds.
+    """
+    # Changing the time frame without requesting the data again, since the queried data is given.
+    main_window.timeFrameComboBox.blockSignals(True)
+    main_window.timeFrameComboBox.setCurrentIndex(main_window.timeFrameComboBox.findText(time_frame))
+    main_window.timeFrameComboBox.blockSignals(False)
+
+    main_window.plot_data(*data)
+
+    draw_seconds, _ = measure(lambda: (main_window.graphWidget.canvas.ax.cla(), main_window.draw_plot()))
+    blit_seconds, _ = measure(main_window.blit_lines)
+
+    return {
+        "draw_ms": draw_seconds * 1000,
+        "blit_ms": blit_seconds * 1000
+    }
+
+
+def get_metadata(database, years):
+    """Describes the environment of the run, so the results of different runs can be told apart."""
+    git = subprocess.run(["git", "rev-parse", "HEAD"], cwd=PACKAGE_PATH, stdout=subprocess.PIPE,
+                         stderr=subprocess.DEVNULL, universal_newlines=True)
+
+    with database.transaction() as cursor:
+        cursor.execute("SHOW server_version")
+        server_version = cursor.fetchone()[0]
+
+    return {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": git.stdout.strip() or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "postgresql": server_version,
+        "years": years
+    }
+
+
+def flatten(results, prefix=""):
+    """Flattens the nested results into a dictionary from the path of each number to the number."""
+    flat = {}
+
+    for key, value in results.items():
+        path = prefix + "/" + str(key) if prefix else str(key)
+
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+
+    return flat
+
+
+def compare(results, baseline):
+    """Prints how each timing and throughput changed compared to the results of an earlier run."""
+    current = flatten(results["datasets"])
+    previous = flatten(baseline["datasets"])
+
+    for path, value in current.items():
+        if path in previous and previous[path] and (path.endswith("_ms") or path.endswith("_per_second")):
+            print("{:<70} {:10.1f} -> {:10.1f} ({:+.0%})".format(path, previous[path], value,
+                                                                 value / previous[path] - 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite for ingestion, queries, conversion and drawing.")
+    parser.add_argument("--config", required=True, help="Database config pointing to a local benchmark database.")
+    parser.add_argument("--years", type=float, nargs="+", default=[1, 5, 10],
+                        help="The amounts of years of minute data that the benchmarks are run with.")
+    parser.add_argument("--width", type=int, default=981, help="The width of the plot in pixels.")
+    parser.add_argument("--output", default="benchmark_results.json", help="The file the results are written to.")
+    parser.add_argument("--baseline", help="Results of an earlier run that the results are compared with.")
+    args = parser.parse_args()
+
+    # Resolving the paths before the main window changes the working directory.
+    output_path = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline is not None else None
+
+    from PyQt5 import QtWidgets
+    app = QtWidgets.QApplication(sys.argv)
+
+    # Disabling the statement timeout since seeding multiple years of data takes a while.
+    database = Database(args.config, statement_timeout=0)
+    results = {"metadata": get_metadata(database, args.years), "datasets": {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        main_window = None
+        data_store = None
+
+        for years in args.years:
+            seed_seconds, (sensor_id, row_count) = measure(lambda: seed_measurements(database, years), repeat=1)
+
+            backfill_seconds, _ = measure(lambda: (database.create_rollups(), database.backfill_rollups()), repeat=1)
+            print("Seeded {} rows in {:.1f} s and backfilled the rollup tables in {:.1f} s".format(
+                row_count, seed_seconds, backfill_seconds))
+
+            dataset = {
+                "rows": row_count,
+                "seed_seconds": seed_seconds,
+                "backfill_seconds": backfill_seconds,
+                "ingestion": benchmark_ingestion(database, sensor_id),
+                "time_frames": {}
+            }
+
+            # The data store and the main window are created once the first dataset exists, since the main window
+            # requests its initial plot as soon as the data store has loaded the sensors.
+            if main_window is None:
+                data_store = DataStore(database)
+                while data_store.sensors is None:
+                    app.processEvents()
+
+                main_window = create_main_window(data_store, directory)
+
+            for time_frame in TIME_FRAMES:
+                end = datetime.datetime.now(datetime.timezone.utc)
+                start = main_window.get_time_frame_start(time_frame, end)
+
+                timings, data = benchmark_queries(database, data_store, sensor_id, start, end, row_count,
+                                                  args.width)
+                timings.update(benchmark_drawing(main_window, time_frame, data))
+                dataset["time_frames"][time_frame] = timings
+
+                print("{:>4g} years {:<11} get_sensor_data: {:8.1f} ms | condensed: {:8.1f} ms | query: {:8.1f} ms "
+                      "| conversion: {:6.1f} ms | draw: {:6.1f} ms | blit: {:5.1f} ms".format(
+                        years, time_frame, timings["get_sensor_data_ms"], timings["get_sensor_data_condensed_ms"],
+                        timings["query_ms"], timings["conversion_ms"], timings["draw_ms"], timings["blit_ms"]))
+
+            results["datasets"][str(years)] = dataset
+
+        main_window.close()
+        app.processEvents()
+
+    database.close()
+
+    with open(output_path, "w") as file:
+        json.dump(results, file, indent=2)
+
+    print("Wrote the results to " + output_path)
+
+    if baseline_path is not None:
+        with open(baseline_path, "r") as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
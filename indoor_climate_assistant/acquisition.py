@@ -0,0 +1,165 @@
+"""
+Acquisition file for sampling the bme680 sensor at a fixed rate. The samples are scheduled from a monotonic clock, so
+the time it takes to read the sensor does not make the sampling drift, and the samples are handed to a separate thread
+through a bounded queue, so a slow insertion into the database does not stall the sampling. If the queue is full the
+sample is dropped instead of blocking the sampling. The jitter of the sampling and the number of missed and dropped
+samples are reported periodically, and recorded as metrics if the metrics are enabled.
+"""
+import datetime
+import queue
+import threading
+import time
+
+from indoor_climate_assistant import metrics
+
+# The metrics of the sampling. A tick is overrun when reading its sample takes so long that the next tick is missed.
+READ_SECONDS = metrics.histogram("aqt_sensor_read_seconds", "Time spent reading a sample from the sensor.")
+CONSUME_SECONDS = metrics.histogram("aqt_acquisition_consume_seconds", "Time spent consuming a sample, which includes "
+                                                                       "inserting it into the database.")
+JITTER_SECONDS = metrics.histogram("aqt_acquisition_jitter_seconds", "Seconds between the tick and the start of the "
+                                                                     "reading of its sample.")
+SAMPLES = metrics.counter("aqt_acquisition_samples_total", "Number of samples read.")
+OVERRUNS = metrics.counter("aqt_acquisition_overruns_total", "Number of ticks where reading the sample made the loop "
+                                                             "miss the next tick.")
+MISSED = metrics.counter("aqt_acquisition_missed_ticks_total", "Number of ticks skipped since they had already passed.")
+DROPPED = metrics.counter("aqt_acquisition_dropped_samples_total", "Number of samples dropped since the queue was "
+                                                                   "full.")
+QUEUED = metrics.gauge("aqt_acquisition_queued_samples", "Number of samples waiting for the consumer.")
+
+
+class AcquisitionLoop:
+    """
+    Loop that reads a sample at every tick of a fixed interval and passes it to a consumer that runs in its own thread.
+    """
+    # The number of seconds between each report of the sampling statistics.
+    REPORT_INTERVAL = 600
+
+    def __init__(self, read, consume, interval=1.0, queue_size=300, clock=None):
+        """
+        :param read: Function that reads a single sample measured at the given time. It is called in the thread that
+        runs the loop.
+        :param consume: Function that is called with the arguments (tick, sample, measured_at) for each sample in the
+        consumer thread, where tick is the number of intervals since the loop was started.
+        :param interval: The number of seconds between each sample.
+        :param queue_size: The maximum number of samples waiting for the consumer before new samples are dropped.
+        :param clock: Function that returns the measurement time of the sample at the given tick. If None the current
+        time is used. This is used to run a simulated sensor faster than real time.
+        """
+        self.read = read
+        self.consume = consume
+        self.interval = interval
+        self.clock = clock
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.consumer_thread = None
+
+        # The number of samples that were read, missed because reading the previous sample took longer than the
+        # interval, and dropped because the consumer could not keep up.
+        self.samples = 0
+        self.missed = 0
+        self.dropped = 0
+
+        # The jitter of the samples since the last report, which is how many seconds after its tick a sample was read.
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.jitter_count = 0
+
+    def run(self):
+        """
+        Starts the consumer thread and reads a sample at every tick until the loop is interrupted. If a tick has already
+        passed when the previous sample is done, the tick is skipped and counted as missed.
+
+        The consumer thread is stopped when the loop ends for any reason, including an error while reading the sensor,
+        after the samples that are still queued have been consumed, so the process can exit.
+        """
+        self.consumer_thread = threading.Thread(target=self.run_consumer, name="acquisition-consumer")
+        self.consumer_thread.start()
+
+        try:
+            self.run_ticks()
+        finally:
+            self.stop()
+
+    def run_ticks(self):
+        """Reads a sample at every tick and puts it in the queue of the consumer until the loop is interrupted."""
+        start = time.monotonic()
+        last_report = start
+        tick = 0
+
+        while True:
+            # Sleeping until the tick, which is always computed from the start so the delays do not add up.
+            scheduled = start + tick * self.interval
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            measured_at = datetime.datetime.now(datetime.timezone.utc) if self.clock is None else self.clock(tick)
+            self.record_jitter(time.monotonic() - scheduled)
+
+            with READ_SECONDS.time():
+                sample = self.read(measured_at)
+            self.samples += 1
+            SAMPLES.inc()
+
+            try:
+                self.queue.put_nowait((tick, sample, measured_at))
+            except queue.Full:
+                self.dropped += 1
+                DROPPED.inc()
+
+            QUEUED.set(self.queue.qsize())
+
+            # Moving on to the tick whose interval we are in, unless it is the tick that was just sampled.
+            now = time.monotonic()
+            next_tick = max(tick + 1, int((now - start) // self.interval))
+            if next_tick > tick + 1:
+                self.missed += next_tick - tick - 1
+                OVERRUNS.inc()
+                MISSED.inc(next_tick - tick - 1)
+            tick = next_tick
+
+            if now - last_report >= self.REPORT_INTERVAL:
+                self.report()
+                last_report = now
+
+    def run_consumer(self):
+        """Passes the samples from the queue to the consumer until the loop is stopped."""
+        while True:
+            item = self.queue.get()
+
+            # None is put in the queue when the loop is stopped.
+            if item is None:
+                return
+
+            # An error in the consumer should not stop the consumer thread, since the queue would never be emptied.
+            try:
+                with CONSUME_SECONDS.time():
+                    self.consume(*item)
+            except Exception as error:
+                print("Error while consuming sample: " + str(error))
+
+    def record_jitter(self, jitter):
+        """Adds the jitter of a sample to the statistics."""
+        self.jitter_sum += jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+        self.jitter_count += 1
+        JITTER_SECONDS.observe(jitter)
+
+    def report(self):
+        """Prints the sampling statistics and resets the jitter statistics."""
+        mean_jitter = self.jitter_sum / self.jitter_count if self.jitter_count else 0.0
+
+        print("Samples: " + str(self.samples) + ", missed: " + str(self.missed) + ", dropped: " + str(self.dropped) +
+              ", queued: " + str(self.queue.qsize()) + ", mean jitter: " + str(round(mean_jitter * 1000, 1)) +
+              " ms, max jitter: " + str(round(self.jitter_max * 1000, 1)) + " ms", flush=True)
+
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.jitter_count = 0
+
+    def stop(self):
+        """Stops the consumer thread after it has consumed the samples that are still in the queue."""
+        if self.consumer_thread is not None:
+            self.queue.put(None)
+            self.consumer_thread.join()
+            self.consumer_thread = None
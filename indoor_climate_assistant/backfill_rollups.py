@@ -0,0 +1,26 @@
+"""
+This file creates the hourly and daily rollup tables if they do not exist and recomputes them from the existing data in
+the measurements table. It only needs to be run once since the rollup tables are updated automatically when new data is
+inserted. Running it again is safe and can be used to recompute a specific time range.
+
+Usage: python backfill_rollups.py [start date] [end date], where the dates are given in the format YYYY-MM-DD.
+"""
+import datetime
+import sys
+
+from indoor_climate_assistant.database import Database
+
+if __name__ == '__main__':
+    # Parsing the optional time range from the command line arguments.
+    dates = [datetime.datetime.strptime(argument, "%Y-%m-%d") for argument in sys.argv[1:3]]
+    start = dates[0] if len(dates) > 0 else None
+    end = dates[1] if len(dates) > 1 else None
+
+    # Disabling the statement timeout since recomputing a chunk of a large table can take a while.
+    aqtassistant_db = Database(statement_timeout=0)
+
+    aqtassistant_db.create_tables()
+    aqtassistant_db.create_rollups()
+    aqtassistant_db.backfill_rollups(start, end)
+
+    aqtassistant_db.close()
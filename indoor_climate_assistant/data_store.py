@@ -0,0 +1,574 @@
+"""
+Data store file for the data queried from the database by the desktop application. The data is stored in memory as a
+NumPy array for each column, with the times stored as int64 microseconds, and is shared by the main window and the
+system tray. All columns are queried at once, so changing the data shown in the GUI does not query the database, and
+the store is kept up to date by a single poller that only queries the rows that arrived since the last poll. The poller
+is triggered by the notifications that PostgreSQL sends when new rows are inserted, which are read from a listening
+connection whose socket is watched by the Qt event loop, so new rows are shown right away without idle queries. The data
+of every sensor is stored separately, but the data of multiple sensors is always queried with a single query.
+
+The queries are run by a worker thread so the GUI is never blocked by the database. The results are delivered back to
+the GUI thread through signals, where they are added to the store.
+"""
+import collections
+import datetime
+import json
+import threading
+import time
+
+import numpy as np
+import psycopg2
+from PyQt5 import QtCore
+
+from indoor_climate_assistant.database import SENSOR_COLUMNS, NOTIFY_CHANNEL, MEASUREMENTS_TABLE
+
+# The Unix epoch that the stored times are relative to.
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class StoreEntry:
+    """
+    The stored data of a single sensor for all columns at a single resolution, covering the time range from start to
+    end.
+    """
+    def __init__(self, start, end, times, columns):
+        self.start = start
+        self.end = end
+
+        # The time of each row as int64 microseconds since the epoch in UTC and a float array for each column.
+        self.times = times
+        self.columns = columns
+
+    @property
+    def nbytes(self):
+        """The amount of memory used by the arrays of the entry."""
+        return self.times.nbytes + sum(array.nbytes for array in self.columns.values())
+
+
+class WorkerSignals(QtCore.QObject):
+    """
+    Signals used by the query worker. The signals are defined on a separate object since QRunnable is not a QObject.
+    """
+    # Signal that is emitted with the result of the query if it succeeded.
+    finished = QtCore.pyqtSignal(object)
+
+    # Signal that is emitted with the error if the query failed.
+    failed = QtCore.pyqtSignal(object)
+
+
+class QueryWorker(QtCore.QRunnable):
+    """
+    Worker that calls the given function in a thread from the thread pool and emits the result through its signals.
+    Since the signals object is created in the GUI thread the connected slots are called in the GUI thread.
+    """
+    def __init__(self, database, function, *args):
+        super(QueryWorker, self).__init__()
+
+        self.database = database
+        self.function = function
+        self.args = args
+
+        self.signals = WorkerSignals()
+        self.thread_id = None
+        self.cancelled = False
+
+        # The worker is kept alive by the store until it is finished.
+        self.setAutoDelete(False)
+
+    def run(self):
+        """Calling the function and emitting the result, unless the worker was cancelled."""
+        if self.cancelled:
+            return
+
+        # Saving the thread so a running query can be cancelled.
+        self.thread_id = threading.get_ident()
+
+        try:
+            result = self.function(*self.args)
+        except (Exception, psycopg2.Error) as pg_error:
+            if not self.cancelled:
+                self.signals.failed.emit(pg_error)
+        else:
+            if not self.cancelled:
+                self.signals.finished.emit(result)
+        finally:
+            self.thread_id = None
+
+    def cancel(self):
+        """Cancelling the worker so no result is emitted. If the query is running it is cancelled in PostgreSQL."""
+        self.cancelled = True
+
+        thread_id = self.thread_id
+        if thread_id is not None:
+            self.database.cancel(thread_id)
+
+
+class DataStore(QtCore.QObject):
+    """
+    In-memory columnar store in front of the database. The data of each sensor is stored at different resolutions,
+    which is either the raw data or a bucket width, and each entry covers a time range. A request is answered from the
+    store if the entries of the requested sensors cover the start of the request. The least recently used entries are
+    evicted when the memory used by the store exceeds the given limit, except for the raw data, which is kept up to date
+    by the poller.
+
+    The poller runs when a notification about new rows in the measurements table is received. If the listening
+    connection is lost the store falls back to polling with the given interval until it is listening again.
+    """
+    # Signal that is emitted every time the poller has added new rows to the raw data.
+    updated = QtCore.pyqtSignal()
+
+    # Signal that is emitted every time the sensors have been loaded from the database.
+    sensors_loaded = QtCore.pyqtSignal()
+
+    # The amount of raw data that is kept by the poller.
+    RAW_RETENTION = datetime.timedelta(days=1)
+
+    # Time ranges of this length or longer are aggregated into buckets instead of retrieving a data point for each row.
+    BUCKET_SPAN = datetime.timedelta(weeks=1)
+
+    # The bucket widths that a preview can use. These are read from the rollup tables, so the preview is fast no matter
+    # how long the time range is.
+    PREVIEW_BUCKETS = ["hour", "day"]
+
+    def __init__(self, database, max_bytes=64 * 1024 * 1024, poll_interval=60000):
+        super(DataStore, self).__init__()
+
+        self.database = database
+        self.max_bytes = max_bytes
+
+        # The entries keyed by (sensor id, bucket), where the bucket is None for the raw data.
+        self.entries = collections.OrderedDict()
+
+        # The sensors as a list of tuples with the format (id, name, room), which is None until they are loaded.
+        self.sensors = None
+
+        # The time of the first row of each combination of sensors, which is found the first time all of their data is
+        # requested.
+        self.first_times = {}
+
+        # Using two threads so the poller and the requests from the main window can query the database in parallel,
+        # each using their own connection from the connection pool of the database.
+        self.thread_pool = QtCore.QThreadPool()
+        self.thread_pool.setMaxThreadCount(2)
+
+        # The workers that have not finished yet, the latest request from request, the latest poll, the worker that
+        # loads the sensors and the worker that opens the listening connection. If a notification arrives while
+        # polling, the poll is repeated afterwards.
+        self.workers = set()
+        self.request_worker = None
+        self.poll_worker = None
+        self.sensors_worker = None
+        self.listen_worker = None
+        self.poll_pending = False
+
+        # The connection that receives the notifications, the notifier that watches its socket and the monotonic time
+        # the latest notification was received.
+        self.listener = None
+        self.notifier = None
+        self.last_notification = time.monotonic()
+
+        # Setup a timer that polls the database for new rows every minute while the store is not listening for
+        # notifications, or while no notification has arrived. Listening and polling right away so the raw data is
+        # available as soon as possible, where the first poll loads the sensors.
+        self.poll_timer = QtCore.QTimer()
+        self.poll_timer.setInterval(poll_interval)
+        self.poll_timer.timeout.connect(self.poll_fallback)
+        self.poll_timer.start()
+        self.listen()
+        self.poll()
+
+    def load_sensors(self):
+        """
+        Loads the sensors from the database in the worker thread and polls the database for the raw data of every
+        sensor afterwards. This is done when the store is created and when a sensor that is not known yet inserts rows.
+        """
+        if self.sensors_worker is not None:
+            return
+
+        def finish(sensors):
+            self.sensors_worker = None
+            self.sensors = sensors
+
+            self.sensors_loaded.emit()
+            self.poll()
+
+        self.sensors_worker = self.start_worker(self.database.get_sensors, (), finish,
+                                                lambda pg_error: setattr(self, "sensors_worker", None))
+
+    def request(self, column, sensor_ids, start, end, max_points, callback, preview_points=None, on_failed=None):
+        """
+        Requests the data of the given sensors for the given column within the given time range. If the time range is
+        long the data is aggregated into buckets so at most max_points buckets are returned for each sensor. The data is
+        retrieved from the store if possible, otherwise the data of every requested sensor is queried with a single
+        query in the worker thread. Any previous request that has not finished is cancelled.
+
+        If preview_points is given and the data has to be queried, a coarse preview with at most preview_points buckets
+        is delivered first when it can be read from the hourly or daily buckets, so something can be shown while the
+        data is queried.
+
+        :param column: The column that we wish to retrieve.
+        :param sensor_ids: A list of the sensors that we wish to retrieve the data of.
+        :param start: The start of the time range. If None the time range starts at the first row of the sensors.
+        :param end: The end of the time range.
+        :param max_points: The maximum number of buckets that we want to retrieve when the data is aggregated.
+        :param callback: Function that is called with the arguments (data, bucket, preview) in the GUI thread when the
+        data is ready, where data is a dictionary from each sensor to a tuple with the same format as returned by peek,
+        bucket is the chosen bucket width, or None for the raw data, and preview is true if the data is a preview that
+        is followed by the requested data.
+        :param preview_points: The maximum number of buckets in the preview. If None no preview is delivered.
+        :param on_failed: Function that is called with the error in the GUI thread if a query of the request fails,
+        after which the request is not continued.
+        """
+        self.cancel_request()
+
+        sensor_ids = list(sensor_ids)
+        key = frozenset(sensor_ids)
+
+        # Finding the time of the first row before the data can be requested.
+        if start is None and key not in self.first_times:
+            def retry(first_time):
+                self.first_times[key] = first_time or end
+                self.request(column, sensor_ids, None, end, max_points, callback, preview_points, on_failed)
+
+            self.request_worker = self.start_worker(self.database.get_first_time, (sensor_ids,), retry, on_failed)
+            return
+
+        start = start or self.first_times[key]
+
+        bucket = None
+        if end - start >= self.BUCKET_SPAN:
+            bucket = self.database.choose_bucket(start, end, max_points)
+
+        def deliver(entries, entries_bucket=bucket, preview=False):
+            for sensor_id, entry in entries.items():
+                self.store(sensor_id, entries_bucket, entry)
+
+            # Only evicting entries once the data has been taken from the store, so none of the requested entries are
+            # evicted before they are delivered.
+            data = {sensor_id: self.peek(column, sensor_id, start, entries_bucket) for sensor_id in sensor_ids}
+            self.evict(len(entries))
+
+            callback(data, entries_bucket, preview)
+
+        entries = {sensor_id: self.entries.get((sensor_id, bucket)) for sensor_id in sensor_ids}
+
+        if any(entry is None or start < entry.start for entry in entries.values()):
+            def fetch():
+                self.request_worker = self.start_worker(self.query, (sensor_ids, start, end, bucket), deliver,
+                                                        on_failed)
+
+            preview_bucket = None
+            if preview_points is not None:
+                preview_bucket = self.database.choose_bucket(start, end, preview_points)
+
+            if preview_bucket not in self.PREVIEW_BUCKETS or preview_bucket == bucket:
+                fetch()
+                return
+
+            def refine(preview_entries):
+                deliver(preview_entries, preview_bucket, True)
+                fetch()
+
+            # Using the stored preview if it covers the time range, since a preview does not have to be up to date.
+            stored = {sensor_id: self.entries.get((sensor_id, preview_bucket)) for sensor_id in sensor_ids}
+
+            if any(entry is None or start < entry.start for entry in stored.values()):
+                self.request_worker = self.start_worker(self.query, (sensor_ids, start, end, preview_bucket), refine,
+                                                        on_failed)
+            else:
+                refine(stored)
+        elif any(end > entry.end for entry in entries.values()):
+            # Extending every entry with a single query from the earliest of the latest rows of the entries.
+            latest_time = min(self.get_latest_time(entry) for entry in entries.values())
+            self.request_worker = self.start_worker(
+                self.query, (sensor_ids, latest_time, end, bucket),
+                lambda new_entries: deliver({sensor_id: self.extend(entries[sensor_id], new_entry)
+                                             for sensor_id, new_entry in new_entries.items()}), on_failed)
+        else:
+            deliver(entries)
+
+    def cancel_request(self):
+        """Cancels the latest request if it has not finished."""
+        if self.request_worker is not None:
+            self.request_worker.cancel()
+            self.thread_pool.tryTake(self.request_worker)
+            self.workers.discard(self.request_worker)
+
+            self.request_worker = None
+
+    def peek(self, column, sensor_id, start, bucket=None):
+        """
+        Retrieves the data of the given sensor for the given column from the time range start to the last poll, using
+        only the data in the store. If the store does not contain the data the returned arrays are empty.
+
+        :param column: The column that we wish to retrieve.
+        :param sensor_id: The sensor that we wish to retrieve the data of.
+        :param start: The start of the time range.
+        :param bucket: The width of the buckets that the data is aggregated into. If None the raw data is retrieved.
+        :return: A tuple with the format (times, arrays) where times is an int64 array of microseconds and arrays is a
+        list containing a float array with the values of the column, or the min, avg and max arrays if a bucket is
+        given. The arrays are views of the stored arrays.
+        """
+        entry = self.entries.get((sensor_id, bucket))
+        suffixes = [""] if bucket is None else ["_min", "_avg", "_max"]
+
+        if entry is None:
+            return np.empty(0, dtype=np.int64), [np.empty(0) for _ in suffixes]
+
+        # Slicing the stored data so only the data within the time range is returned. When aggregated the bucket
+        # containing the start of the time range is included.
+        lower = self.to_microseconds(start)
+        if bucket is not None:
+            lower -= self.database.BUCKET_SECONDS[bucket] * 1000000
+
+        first = np.searchsorted(entry.times, lower, side="right" if bucket else "left")
+
+        return entry.times[first:], [entry.columns[column + suffix][first:] for suffix in suffixes]
+
+    def poll(self):
+        """
+        Extends the raw data of every sensor with the rows that arrived since the last poll and removes the rows that
+        are older than the raw retention. The rows of every sensor are queried with a single query, and this is the
+        only place where the database is polled for new data.
+        """
+        # The sensors are loaded before the first poll, which polls again when they are loaded.
+        if self.sensors is None:
+            self.load_sensors()
+            return
+
+        # If the previous poll is still running we poll again when it is done, since it might have missed new rows.
+        if self.poll_worker is not None:
+            self.poll_pending = True
+            return
+
+        end = datetime.datetime.now(datetime.timezone.utc)
+        sensor_ids = [sensor_id for sensor_id, _, _ in self.sensors]
+        entries = [self.entries.get((sensor_id, None)) for sensor_id in sensor_ids]
+
+        def finish(new_entries):
+            for sensor_id, new_entry in new_entries.items():
+                current = self.entries.get((sensor_id, None))
+                if current is None:
+                    self.entries[(sensor_id, None)] = new_entry
+                else:
+                    self.extend(current, new_entry)
+                    self.trim(current, end - self.RAW_RETENTION)
+
+            self.updated.emit()
+            done()
+
+        def done(pg_error=None):
+            self.poll_worker = None
+
+            if self.poll_pending:
+                self.poll_pending = False
+                self.poll()
+
+        # Querying from the earliest of the latest rows, or the whole raw retention if a sensor has no raw data yet.
+        if not entries or None in entries:
+            start = end - self.RAW_RETENTION
+        else:
+            start = min(self.get_latest_time(entry) for entry in entries)
+
+        self.poll_worker = self.start_worker(self.query, (sensor_ids, start, end, None), finish, done)
+
+    def poll_fallback(self):
+        """
+        Polls the database if the store is not listening for notifications, and tries to listen again. This is called
+        by the poll timer, so nothing is queried while notifications keep arriving. The database is also polled if no
+        notification has arrived since the previous timeout, since a listening connection that was dropped without
+        being closed is only noticed once its keepalives fail.
+        """
+        if self.listener is None:
+            self.listen()
+            self.poll()
+        elif time.monotonic() - self.last_notification >= self.poll_timer.interval() / 1000:
+            self.poll()
+
+    def listen(self):
+        """
+        Opens the listening connection in the worker thread and watches its socket from the GUI thread, so the
+        notifications are received by the Qt event loop as soon as they arrive.
+        """
+        if self.listener is not None or self.listen_worker is not None:
+            return
+
+        def finish(listener):
+            self.listen_worker = None
+            self.listener = listener
+            self.last_notification = time.monotonic()
+
+            self.notifier = QtCore.QSocketNotifier(listener.fileno(), QtCore.QSocketNotifier.Read)
+            self.notifier.activated.connect(self.receive)
+
+        self.listen_worker = self.start_worker(self.database.listen, (), finish,
+                                               lambda pg_error: setattr(self, "listen_worker", None))
+
+    def receive(self):
+        """
+        Reads the notifications that have arrived on the listening connection and polls the database if any of them
+        announces rows in the measurements table that are newer than the raw data of the sensor in the store. If the
+        rows are from a sensor that is not known yet, the sensors are loaded again before polling. If the connection is
+        lost it is closed and the poll timer is used until the store is listening again.
+        """
+        try:
+            self.listener.poll()
+        except (Exception, psycopg2.Error) as pg_error:
+            print("Lost the connection listening for notifications from PostgreSQL" + str(pg_error))
+            self.stop_listening()
+            return
+
+        # Any notification shows that the listening connection still works, even if it is about another table.
+        if self.listener.notifies:
+            self.last_notification = time.monotonic()
+
+        notifications = [json.loads(notify.payload) for notify in self.listener.notifies
+                         if notify.channel == NOTIFY_CHANNEL]
+        notifications = [notification for notification in notifications if notification["table"] == MEASUREMENTS_TABLE]
+        self.listener.notifies.clear()
+
+        if not notifications:
+            return
+
+        known = set() if self.sensors is None else {sensor_id for sensor_id, _, _ in self.sensors}
+
+        if any(notification["sensor_id"] not in known for notification in notifications):
+            self.sensors = None
+            self.poll()
+            return
+
+        for notification in notifications:
+            entry = self.entries.get((notification["sensor_id"], None))
+
+            if entry is None or datetime.datetime.fromisoformat(notification["time"]) > self.get_latest_time(entry):
+                self.poll()
+                return
+
+    def stop_listening(self):
+        """Stops watching the listening connection and closes it."""
+        if self.notifier is not None:
+            self.notifier.setEnabled(False)
+            self.notifier = None
+
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+    def start_worker(self, function, args, on_finished, on_failed=None):
+        """
+        Starts a worker that calls the function with the given arguments in the worker thread.
+
+        :param function: The function that is called in the worker thread.
+        :param args: A tuple with the arguments for the function.
+        :param on_finished: Function that is called with the result in the GUI thread.
+        :param on_failed: Function that is called with the error in the GUI thread if the function fails.
+        :return: The started worker.
+        """
+        worker = QueryWorker(self.database, function, *args)
+
+        def finished(result):
+            self.workers.discard(worker)
+            on_finished(result)
+
+        def failed(pg_error):
+            self.workers.discard(worker)
+            print("Error while working with PostgreSQL" + str(pg_error))
+
+            if on_failed is not None:
+                on_failed(pg_error)
+
+        worker.signals.finished.connect(finished)
+        worker.signals.failed.connect(failed)
+
+        self.workers.add(worker)
+        self.thread_pool.start(worker)
+
+        return worker
+
+    def store(self, sensor_id, bucket, entry):
+        """Storing the entry as the most recently used entry. The entries are evicted by evict afterwards."""
+        self.entries[(sensor_id, bucket)] = entry
+        self.entries.move_to_end((sensor_id, bucket))
+
+    def extend(self, entry, new_entry):
+        """
+        Extends the entry with the rows in the new entry, which was queried from the time of the latest row in the
+        entry or earlier. The latest row is queried again since rows can be inserted some time after they are measured,
+        and when aggregated the latest bucket might not have been complete.
+
+        :param entry: The entry that should be extended.
+        :param new_entry: The entry containing the new rows.
+        :return: The extended entry.
+        """
+        # Only keeping the stored rows before the new rows since the new rows might overlap the latest stored rows.
+        keep = np.searchsorted(entry.times, new_entry.times[0], side="left") if len(new_entry.times) \
+            else len(entry.times)
+
+        entry.times = np.concatenate((entry.times[:keep], new_entry.times))
+        entry.columns = {column: np.concatenate((array[:keep], new_entry.columns[column]))
+                         for column, array in entry.columns.items()}
+        entry.end = max(entry.end, new_entry.end)
+
+        return entry
+
+    def trim(self, entry, start):
+        """
+        Removes the rows before the given start from the entry and moves the start of the entry to the given start. This
+        is done even if the entry was created for a longer time range, so the raw data never covers more than the raw
+        retention. If the entry starts after the given start it is left as it is.
+
+        :param entry: The entry that should be trimmed.
+        :param start: The start of the rows that should be kept.
+        """
+        start = max(entry.start, start)
+        first = np.searchsorted(entry.times, self.to_microseconds(start), side="left")
+
+        entry.start = start
+        entry.times = entry.times[first:]
+        entry.columns = {column: array[first:] for column, array in entry.columns.items()}
+
+    def get_latest_time(self, entry):
+        """Finds the time of the latest row in the entry, or the start of the entry if it is empty."""
+        return self.from_microseconds(entry.times[-1]) if len(entry.times) else entry.start
+
+    def query(self, sensor_ids, start, end, bucket):
+        """
+        Queries all columns of the given sensors from the database as arrays with a single query and converts them into
+        an entry for each sensor. This is called in the worker thread.
+
+        :return: A dictionary from each sensor to the entry containing its queried rows.
+        """
+        if bucket is None:
+            data = self.database.get_range(sensor_ids, SENSOR_COLUMNS, start, end, as_arrays=True)
+            names = SENSOR_COLUMNS
+        else:
+            data = self.database.get_downsampled_data(sensor_ids, SENSOR_COLUMNS, start, end, bucket, as_arrays=True)
+            names = [column + suffix for column in SENSOR_COLUMNS for suffix in ("_min", "_avg", "_max")]
+
+        return {sensor_id: StoreEntry(start, end, times, dict(zip(names, arrays)))
+                for sensor_id, (times, arrays) in data.items()}
+
+    def evict(self, keep=1):
+        """
+        Evicts the least recently used entries until the memory used by the store is within the limit.
+
+        :param keep: The amount of most recently used entries that are never evicted, which are the entries of the
+        latest request.
+        """
+        while sum(entry.nbytes for entry in self.entries.values()) > self.max_bytes:
+            # The raw data and the most recently used entries are never evicted.
+            candidates = [key for key in list(self.entries)[:len(self.entries) - keep] if key[1] is not None]
+            if not candidates:
+                break
+
+            del self.entries[candidates[0]]
+
+    @staticmethod
+    def to_microseconds(time):
+        """Converts a timezone aware datetime into the int64 microseconds used for the stored times."""
+        return np.int64((time - EPOCH) // datetime.timedelta(microseconds=1))
+
+    @staticmethod
+    def from_microseconds(microseconds):
+        """Converts the int64 microseconds used for the stored times into a timezone aware datetime in UTC."""
+        return EPOCH + datetime.timedelta(microseconds=int(microseconds))
@@ -1,66 +1,549 @@
 """
-Database file for inserting and querying from the database related to the bme680 sensor. This file contains supportive
+Database file for inserting and querying from the database related to the bme680 sensors. This file contains supportive
 database related functions that provide the necessary functionality needed for the AQT assistant. This includes
 functions for querying that support the temperature and air quality warnings together with data visualization and
 insertion of data.
+
+The measurements from every sensor are stored in the same tables, where each measurement refers to the sensor it was
+taken by and each sensor is placed in a room. The measurement tables are partitioned by time, so a query for a time
+range only reads the partitions within the range, and old measurements are removed by dropping whole partitions.
 """
 import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+import psycopg2.pool
+import psycopg2.sql
+import contextlib
+import datetime
+import io
 import json
+import threading
+import time
+
+import numpy as np
+
+from indoor_climate_assistant import metrics
+from indoor_climate_assistant.sensor import get_air_quality_array, HUMIDITY_WEIGHTING
+
+# The path to the config file containing the settings used to connect to the database.
+DATABASE_CONFIG_PATH = "../resources/database_config.json"
+
+# The columns in the measurement tables that contain data from the sensor.
+SENSOR_COLUMNS = ["temperature", "airpressure", "humidity", "gasresistance", "airquality"]
+
+# The table containing the sensors and the room that each sensor is placed in.
+SENSORS_TABLE = "sensors"
+
+# The sensor and room that are used when no sensor is given, which is the sensor of the original single room setup.
+DEFAULT_SENSOR = "livingroom"
+DEFAULT_ROOM = "Living room"
+
+# The table containing a measurement from each sensor every minute.
+MEASUREMENTS_TABLE = "measurements"
+
+# The table containing every reading from the sensors when the high-frequency capture mode is used.
+RAW_TABLE = "measurements_raw"
+
+# The table that the readings in the raw table are downsampled into before they are dropped, which contains the count,
+# sum, min and max of the readings within each minute, so short spikes can still be seen after the retention.
+RAW_MINUTELY_TABLE = "measurements_raw_minutely"
+
+# The tables that the partitions of a measurement table are aggregated into by the minute before they are dropped.
+DOWNSAMPLED_TABLES = {
+    RAW_TABLE: RAW_MINUTELY_TABLE
+}
+
+# How long the aggregates in the downsampled tables are kept after the partitions they were aggregated from have been
+# dropped, which bounds the size of the downsampled tables to about half a million rows per sensor.
+DOWNSAMPLED_RETENTION = datetime.timedelta(days=365)
+
+# The width of the partitions of each measurement table. The raw table is partitioned by day since it only keeps the
+# readings from the last few days.
+PARTITION_INTERVALS = {
+    MEASUREMENTS_TABLE: "month",
+    RAW_TABLE: "day"
+}
+
+# The number of microseconds between the Unix epoch and the PostgreSQL epoch (2000-01-01), which the binary format of
+# timestamps is relative to.
+POSTGRES_EPOCH_MICROSECONDS = 946684800000000
+
+# The channel that a notification is sent on every time measurements are inserted, so the desktop application can
+# retrieve the new measurements right away instead of polling for them.
+NOTIFY_CHANNEL = "sensor_data_inserted"
+
+# The rollup tables containing precomputed aggregates of the measurements table for each supported bucket width.
+ROLLUP_TABLES = {
+    "hour": "measurements_hourly",
+    "day": "measurements_daily"
+}
+
+# The tables of the original single room setup and the tables that their measurements are moved to when migrating.
+LEGACY_TABLES = {
+    "livingroom": MEASUREMENTS_TABLE,
+    "livingroom_raw": RAW_TABLE
+}
+
+# The rollup tables of the original single room setup, which are replaced by the rollup tables of the measurements.
+LEGACY_ROLLUP_TABLES = ["livingroom_hourly", "livingroom_daily"]
+
+# The metrics of the time spent inserting and querying the measurements. The time of a query covers running it and
+# transferring the result, while the time of the fetch covers turning the result into Python objects or NumPy arrays.
+INSERT_SECONDS = metrics.histogram("aqt_database_insert_seconds", "Time spent inserting and committing a batch of "
+                                                                  "measurements.")
+INSERTED_ROWS = metrics.counter("aqt_database_inserted_rows_total", "Number of measurements sent to the database.")
+QUERY_SECONDS = metrics.histogram("aqt_database_query_seconds", "Time spent running a query for measurements.")
+FETCH_SECONDS = metrics.histogram("aqt_database_fetch_seconds", "Time spent fetching and parsing the result of a "
+                                                                "query for measurements.")
 
 
 class Database:
     """
-    Database that can be used to query from and insert data into the livingroom database table.
+    Database that can be used to query from and insert data into the measurement tables.
     """
-    def __init__(self):
-        # Creating a connection to the PostgreSQL database.
-        self.connection = self.get_database_connection()
+    # The bucket widths that are supported when downsampling, given as the number of seconds in each bucket.
+    BUCKET_SECONDS = {
+        "minute": 60,
+        "hour": 3600,
+        "day": 86400
+    }
+
+    # The number of seconds a connection can be idle in the pool before it is checked before being used again.
+    HEALTH_CHECK_INTERVAL = 30
+
+    # The TCP keepalive settings of the listening connection, which is idle until a notification arrives. The keepalive
+    # probes are sent after 30 seconds of silence, so a connection that was dropped without being closed, for example
+    # when the network goes down, is noticed after about a minute instead of the two hours used by the OS by default.
+    KEEPALIVE_SETTINGS = {
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 3
+    }
+
+    def __init__(self, config_path=DATABASE_CONFIG_PATH, max_connections=4, statement_timeout=30000,
+                 connect_attempts=5):
+        """
+        :param config_path: The path to the json file containing the database settings.
+        :param max_connections: The maximum number of connections in the pool, which is the number of queries that can
+        run in parallel.
+        :param statement_timeout: The number of milliseconds a statement can run before it is cancelled by PostgreSQL.
+        If 0 there is no timeout.
+        :param connect_attempts: The number of attempts at connecting to the database before giving up. The delay
+        between the attempts is doubled after each attempt.
+        """
+        self.config_path = config_path
+        self.statement_timeout = statement_timeout
+        self.connect_attempts = connect_attempts
+
+        # Creating a pool of connections to the PostgreSQL database. The connections are created when they are first
+        # needed so the database does not have to be reachable when the object is created.
+        self.pool = self.get_connection_pool(config_path, max_connections, statement_timeout)
+
+        # The time each idle connection was last used, and the connection used by each thread in a transaction.
+        self.last_used = {}
+        self.active = {}
 
-        # Creating a cursor object that can be used for INSERT statements.
-        self.cursor = self.connection.cursor()
+        # Whether the rollup tables are known to exist. This is checked when the rollup tables are needed until they
+        # exist.
+        self.rollups_available = False
+
+        # The names of the partitions that are known to exist, so they are only created once.
+        self.partitions = set()
+
+    @staticmethod
+    def get_connection_pool(config_path=DATABASE_CONFIG_PATH, max_connections=4, statement_timeout=30000):
+        """
+        Function that makes database connections easier to work with since there is multiple threads that each need a
+        connection.
+        :param config_path: The path to the json file containing the database settings.
+        :param max_connections: The maximum number of connections in the pool.
+        :param statement_timeout: The number of milliseconds a statement can run before it is cancelled.
+        :return: A pool of connections to the AQT assistant database that is running on the Raspberry pi zero.
+        """
+        return psycopg2.pool.ThreadedConnectionPool(0, max_connections,
+                                                    **Database.get_connection_settings(config_path, statement_timeout))
 
     @staticmethod
-    def get_database_connection():
+    def get_connection_settings(config_path=DATABASE_CONFIG_PATH, statement_timeout=30000):
         """
-        Function that makes database connections easier to work with since there is multiple functions that
-        each need a connection.
-        :return: A database connection to the AQT assistant database that is running on the Raspberry pi zero.
+        Reads the settings used to connect to the database from the config file. If the config contains a "timezone",
+        such as "Europe/Copenhagen", it is used as the time zone of the connections, which decides where PostgreSQL
+        truncates the timestamps into hours and days.
+        :param config_path: The path to the json file containing the database settings.
+        :param statement_timeout: The number of milliseconds a statement can run before it is cancelled.
+        :return: A dictionary with the keyword arguments for psycopg2.connect.
         """
 
         # Pulling the database settings from the config file.
-        with open("../resources/database_config.json", "r") as config:
+        with open(config_path, "r") as config:
             config_dict = json.load(config)
 
+        options = "-c statement_timeout=" + str(statement_timeout)
+        if "timezone" in config_dict:
+            options += " -c TimeZone=" + config_dict["timezone"]
+
+        return {
+            "user": config_dict["user"],
+            "password": config_dict["password"],
+            "host": config_dict["host"],
+            "port": config_dict["port"],
+            "database": config_dict["database"],
+            "options": options
+        }
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Context manager that provides a cursor on a connection from the pool. The transaction is committed if the block
+        succeeds and rolled back if it fails. Connections that are broken, for example because PostgreSQL was restarted,
+        are closed so the pool creates a new connection the next time.
+
+        :return: A cursor that is closed when the block ends.
+        """
+        connection = self.get_connection()
+        self.active[threading.get_ident()] = connection
+        broken = False
+
+        try:
+            with connection.cursor() as cursor:
+                yield cursor
+
+            connection.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as pg_error:
+            # A cancelled query or a statement timeout does not break the connection, while other errors of these
+            # types are caused by the connection itself.
+            if isinstance(pg_error, psycopg2.extensions.QueryCanceledError):
+                connection.rollback()
+            else:
+                broken = True
+
+            raise
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            del self.active[threading.get_ident()]
+
+            broken = broken or connection.closed != 0
+            self.last_used[id(connection)] = time.monotonic()
+            self.pool.putconn(connection, close=broken)
+
+    def get_connection(self):
+        """
+        Gets a healthy connection from the pool. Connections that have been idle for a while are checked before they
+        are used, and if the database cannot be reached we try again with an increasing delay.
+
+        :return: A connection that is ready to be used.
+        """
+        delay = 0.5
+
+        for attempt in range(self.connect_attempts):
+            try:
+                connection = self.pool.getconn()
+
+                if time.monotonic() - self.last_used.pop(id(connection), 0) > self.HEALTH_CHECK_INTERVAL:
+                    self.check_connection(connection)
+
+                return connection
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as pg_error:
+                print("Error while connecting to PostgreSQL" + str(pg_error))
+
+                if attempt == self.connect_attempts - 1:
+                    raise
+
+                time.sleep(delay)
+                delay *= 2
+
+    def check_connection(self, connection):
+        """
+        Checks that the connection works by running a trivial query. If it does not work the connection is closed and
+        the error is raised.
+
+        :param connection: The connection that should be checked.
+        """
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+
+            connection.rollback()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.pool.putconn(connection, close=True)
+            raise
+
+    def cancel(self, thread_id):
+        """
+        Cancels the query that is running in a transaction in the given thread, if any.
+
+        :param thread_id: The identifier of the thread, as returned by threading.get_ident.
+        """
+        connection = self.active.get(thread_id)
+
+        if connection is not None:
+            connection.cancel()
+
+    def listen(self):
+        """
+        Opens a dedicated connection that listens for the notifications sent when measurements are inserted. The
+        connection is not taken from the pool since it has to stay open, and it is in autocommit mode so the
+        notifications are delivered as soon as they arrive instead of when a transaction ends. TCP keepalives are used
+        so the socket becomes readable with an error if the connection is dropped, see KEEPALIVE_SETTINGS.
+
+        :return: The listening connection. The notifications are read by calling poll on the connection when its
+        socket is readable, after which they are available in its notifies list.
+        """
+        connection = psycopg2.connect(**self.get_connection_settings(self.config_path, self.statement_timeout),
+                                      **self.KEEPALIVE_SETTINGS)
+        connection.autocommit = True
+
+        with connection.cursor() as cursor:
+            cursor.execute("LISTEN " + NOTIFY_CHANNEL)
+
+        return connection
+
+    @staticmethod
+    def notify(cursor, table, sensor_id, time):
+        """
+        Sends a notification that measurements have been inserted into the given table. Since the notification is sent
+        in the transaction of the insertion, PostgreSQL only delivers it if the transaction is committed.
+
+        :param cursor: The cursor of the transaction that inserted the measurements.
+        :param table: The table that the measurements were inserted into.
+        :param sensor_id: The sensor that took the measurements.
+        :param time: The time of the latest inserted measurement.
+        """
+        payload = json.dumps({"table": table, "sensor_id": sensor_id, "time": time.isoformat()})
+
+        cursor.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, payload))
+
+    def create_tables(self):
+        """
+        Creates the sensors table and the measurement tables if they do not exist. The measurement tables are
+        partitioned by time, where the partitions are created when measurements within them are inserted.
+
+        The measurements table has a primary key on the sensor and the time, which is used by the queries for the time
+        range of one or more sensors and ensures that a measurement is only inserted once. Both measurement tables also
+        have a BRIN index on the time, which is used when the measurements of all sensors within a time range are
+        processed. A BRIN index is a tiny fraction of the size of a B-tree index since the rows are inserted in
+        chronological order.
+
+        The raw table is downsampled into a table with the same aggregates as the rollup tables for each minute, see
+        drop_partitions_before.
+        """
+        columns = ", ".join(column + " numeric" for column in SENSOR_COLUMNS)
+        aggregates = ", ".join("{0}_sum numeric, {0}_min numeric, {0}_max numeric".format(column)
+                               for column in SENSOR_COLUMNS)
+
+        with self.transaction() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS " + SENSORS_TABLE + " (id serial PRIMARY KEY, "
+                           "name text NOT NULL UNIQUE, room text NOT NULL)")
+
+            # The retention of the raw readings of each sensor, which is null for the sensors that do not store them.
+            # The column is added separately since it was added after the sensors table.
+            cursor.execute("ALTER TABLE " + SENSORS_TABLE + " ADD COLUMN IF NOT EXISTS raw_retention interval")
+
+            cursor.execute("CREATE TABLE IF NOT EXISTS " + MEASUREMENTS_TABLE + " (sensor_id integer NOT NULL "
+                           "REFERENCES " + SENSORS_TABLE + ", time timestamptz NOT NULL, " + columns + ", "
+                           "PRIMARY KEY (sensor_id, time)) PARTITION BY RANGE (time)")
+
+            # The raw table has no primary key since the index would be larger than the readings that it keeps.
+            cursor.execute("CREATE TABLE IF NOT EXISTS " + RAW_TABLE + " (sensor_id integer NOT NULL REFERENCES " +
+                           SENSORS_TABLE + ", time timestamptz NOT NULL, " + columns + ") PARTITION BY RANGE (time)")
+
+            for table in PARTITION_INTERVALS:
+                cursor.execute("CREATE INDEX IF NOT EXISTS " + table + "_time_idx ON " + table + " USING brin (time)")
+
+            cursor.execute("CREATE TABLE IF NOT EXISTS " + RAW_MINUTELY_TABLE + " (sensor_id integer NOT NULL, "
+                           "bucket timestamptz NOT NULL, count integer NOT NULL, " + aggregates + ", "
+                           "PRIMARY KEY (sensor_id, bucket))")
+
+        # Making the time zone of the config the default time zone of the database, so the connections of the sensors
+        # and desktops whose config does not contain a time zone truncate the timestamps in the same time zone.
+        with open(self.config_path, "r") as config:
+            time_zone = json.load(config).get("timezone")
+
+        if time_zone is not None:
             try:
-                return psycopg2.connect(user=config_dict["user"],
-                                        password=config_dict["password"],
-                                        host=config_dict["host"],
-                                        port=config_dict["port"],
-                                        database=config_dict["database"])
+                with self.transaction() as cursor:
+                    cursor.execute("SELECT current_database()")
+                    cursor.execute(psycopg2.sql.SQL("ALTER DATABASE {} SET TimeZone TO {}").format(
+                        psycopg2.sql.Identifier(cursor.fetchone()[0]), psycopg2.sql.Literal(time_zone)))
+            except psycopg2.errors.InsufficientPrivilege as pg_error:
+                print("Error while setting the time zone of the database in PostgreSQL: " + str(pg_error))
+
+    def register_sensor(self, name, room, raw_retention=None):
+        """
+        Adds the sensor to the sensors table if it does not exist, or moves it to the given room and updates its raw
+        retention if it does.
+
+        :param name: The unique name of the sensor, for example the hostname of the Raspberry Pi it is connected to.
+        :param room: The room that the sensor is placed in.
+        :param raw_retention: A timedelta with how long the raw readings of the sensor are kept, or None if the sensor
+        does not store raw readings.
+        :return: The id of the sensor.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("INSERT INTO " + SENSORS_TABLE + " (name, room, raw_retention) VALUES (%s, %s, %s) "
+                           "ON CONFLICT (name) DO UPDATE SET room = excluded.room, "
+                           "raw_retention = excluded.raw_retention RETURNING id", (name, room, raw_retention))
+
+            return cursor.fetchone()[0]
+
+    def get_longest_raw_retention(self):
+        """
+        Finds the longest raw retention of the registered sensors. Since the partitions of the raw table contain the
+        readings of every sensor, a partition can only be dropped once it is older than the longest retention.
+
+        :return: A timedelta with the longest raw retention, or None if no sensor stores raw readings.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT max(raw_retention) FROM " + SENSORS_TABLE)
+
+            return cursor.fetchone()[0]
+
+    def get_sensors(self):
+        """
+        Retrieves every sensor.
+
+        :return: A list of tuples with the format (id, name, room), ordered by id.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT id, name, room FROM " + SENSORS_TABLE + " ORDER BY id")
+
+            return cursor.fetchall()
+
+    @staticmethod
+    def get_partition_range(table, time):
+        """
+        Finds the time range of the partition of the given table that contains the given time. The partitions are
+        aligned with UTC, so they do not depend on the time zone of the connection.
+
+        :param table: The partitioned table.
+        :param time: A timezone aware datetime within the partition.
+        :return: A tuple with the format (start, end, name) where start is inclusive and end is exclusive.
+        """
+        time = time.astimezone(datetime.timezone.utc)
+
+        if PARTITION_INTERVALS[table] == "month":
+            start = datetime.datetime(time.year, time.month, 1, tzinfo=datetime.timezone.utc)
+            end = datetime.datetime(time.year + time.month // 12, time.month % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+        else:
+            start = datetime.datetime(time.year, time.month, time.day, tzinfo=datetime.timezone.utc)
+            end = start + datetime.timedelta(days=1)
+
+        return start, end, table + "_" + start.strftime("%Y%m%d")
+
+    def create_partitions(self, table, start, end):
+        """
+        Creates the partitions of the given table that are needed to insert measurements within the given time range.
+
+        :param table: The partitioned table.
+        :param start: The time of the first measurement.
+        :param end: The time of the last measurement.
+        """
+        partition_start = start
+
+        while partition_start <= end:
+            partition_start, partition_end, name = self.get_partition_range(table, partition_start)
+
+            if name not in self.partitions:
+                try:
+                    with self.transaction() as cursor:
+                        cursor.execute("CREATE TABLE IF NOT EXISTS " + name + " PARTITION OF " + table +
+                                       " FOR VALUES FROM (%s) TO (%s)", (partition_start, partition_end))
+                except (psycopg2.errors.DuplicateTable, psycopg2.errors.UniqueViolation):
+                    # The partition was created by another sensor at the same time.
+                    pass
+
+                self.partitions.add(name)
+
+            partition_start = partition_end
+
+    def drop_partitions_before(self, table, time):
+        """
+        Drops the partitions of the given table that only contain measurements older than the given time. This is used
+        to bound the size of the raw table, and is far cheaper than deleting the measurements since the rows do not
+        have to be found and no dead rows are left behind. The measurements in the partition containing the time are
+        kept until the whole partition is older than the time.
+
+        If the table is downsampled, such as the raw table, the count, sum, min and max of the measurements within each
+        minute of a partition are inserted into the downsampled table in the same transaction as the partition is
+        dropped, so the measurements are never lost without being aggregated. The aggregates are kept for
+        DOWNSAMPLED_RETENTION after the partitions are dropped, so the downsampled table does not grow without limit.
 
-            except (Exception, psycopg2.Error) as pg_error:
-                print("Error while working with PostgreSQL" + str(pg_error))
+        :param table: The partitioned table.
+        :param time: The partitions ending at or before this time are dropped.
+        :return: The number of dropped partitions.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = inhrelid "
+                           "WHERE inhparent = %s::regclass", (table,))
+            names = [name for name, in cursor.fetchall()]
+
+            dropped = 0
+            for name in names:
+                # Skipping partitions that were not created by create_partitions, since their range is unknown.
+                try:
+                    partition_start = datetime.datetime.strptime(name[len(table) + 1:], "%Y%m%d").replace(
+                        tzinfo=datetime.timezone.utc)
+                except ValueError:
+                    continue
+
+                if self.get_partition_range(table, partition_start)[1] <= time:
+                    # Since the partitions are aligned with UTC every minute is within a single partition.
+                    if table in DOWNSAMPLED_TABLES:
+                        cursor.execute(self.get_rollup_insert_query(DOWNSAMPLED_TABLES[table], "minute", name) +
+                                       " GROUP BY 1, 2 ON CONFLICT (sensor_id, bucket) DO NOTHING")
+
+                    cursor.execute("DROP TABLE " + name)
+                    self.partitions.discard(name)
+                    dropped += 1
+
+            if dropped and table in DOWNSAMPLED_TABLES:
+                cursor.execute("DELETE FROM " + DOWNSAMPLED_TABLES[table] + " WHERE bucket < %s",
+                               (time - DOWNSAMPLED_RETENTION,))
 
-    def insert_sensor_data(self, data):
+        return dropped
+
+    def insert_sensor_data(self, sensor_id, data):
         """
-        Inserts a single data measurement into the LivingRoom table. We only insert temperate, air pressure,
-        humidity, gas resistance and air quality since time is handled by the default value (now()) and the id is
-        auto incrementing.
-        :return:
+        Inserts a single data measurement from the given sensor into the measurements table, measured now.
+
+        :param sensor_id: The sensor that took the measurement.
+        :param data: A list with the format (temperature, air pressure, humidity, gas resistance, air quality).
         """
-        # Creating the INSERT query that insert the data into the LivingRoom table.
-        pg_insert_query = "insert into livingroom values (%s, %s, %s, %s, %s)"
+        self.insert_sensor_data_batch(sensor_id, [tuple(data) + (datetime.datetime.now(datetime.timezone.utc),)])
 
-        # Executing the query while also replacing the placeholders in the query with the actual data.
-        self.cursor.execute(pg_insert_query, data)
+    def insert_sensor_data_batch(self, sensor_id, rows, table=MEASUREMENTS_TABLE):
+        """
+        Inserts multiple data measurements from the given sensor into the given table using a single INSERT statement
+        and a single commit. Since the measurements are not inserted when they are taken the time of each measurement
+        is included. Measurements that have already been inserted are skipped, so a batch can safely be inserted again.
 
-        # Committing the changes to the database, hereby ending the transaction.
-        self.connection.commit()
+        :param sensor_id: The sensor that took the measurements.
+        :param rows: A list of tuples with the format (temperature, air pressure, humidity, gas resistance,
+        air quality, time).
+        :param table: The table that the measurements are inserted into, either the measurements or the raw table.
+        """
+        times = [row[-1] for row in rows]
+        self.create_partitions(table, min(times), max(times))
 
-    def get_sensor_data(self, column_names, limit, condense=False):
+        pg_insert_query = "INSERT INTO " + table + " (sensor_id, " + ", ".join(SENSOR_COLUMNS) + ", time) " \
+                          "VALUES %s ON CONFLICT DO NOTHING"
+
+        # Using execute_values instead of executemany since executemany sends a separate statement for each row.
+        with INSERT_SECONDS.time(), self.transaction() as cursor:
+            psycopg2.extras.execute_values(cursor, pg_insert_query, [(sensor_id,) + tuple(row) for row in rows],
+                                           page_size=1000)
+            self.notify(cursor, table, sensor_id, max(times))
+
+        INSERTED_ROWS.inc(len(rows))
+
+    def get_sensor_data(self, sensor_id, column_names, limit, condense=False):
         """
-        Retrieves the latest sensor data from the livingroom table according to the settings given in the parameters.
+        Retrieves the latest sensor data of the given sensor according to the settings given in the parameters.
 
+        :param sensor_id: The sensor that we wish to retrieve the data of.
         :param column_names: The columns that we wish to retrieve.
         :param limit: The amount of rows that we wish to retrieve.
         :param condense: Flag used to determine whether a condensed select query should be used. If true then instead
@@ -68,16 +551,557 @@ class Database:
         :return: The data in the database that matches the select query.
         """
         if condense:
-            pg_select_query = "SELECT " + column_names + " FROM livingroom WHERE id % 60 = 0 ORDER BY id DESC LIMIT " +\
-                              str(limit // 60)
+            pg_select_query = "SELECT " + column_names + " FROM " + MEASUREMENTS_TABLE + " WHERE sensor_id = %s AND " \
+                              "extract(minute FROM time) = 0 ORDER BY time DESC LIMIT " + str(limit // 60)
         else:
-            pg_select_query = "SELECT " + column_names + " FROM livingroom ORDER BY id DESC LIMIT " + str(limit)
+            pg_select_query = "SELECT " + column_names + " FROM " + MEASUREMENTS_TABLE + " WHERE sensor_id = %s " \
+                              "ORDER BY time DESC LIMIT " + str(limit)
+
+        with self.transaction() as cursor:
+            with QUERY_SECONDS.time():
+                cursor.execute(pg_select_query, (sensor_id,))
+
+            with FETCH_SECONDS.time():
+                return cursor.fetchall()
+
+    def get_range(self, sensor_ids, column_names, start, end, as_arrays=False):
+        """
+        Retrieves the sensor data of the given sensors within the given time range. Since the range is given as
+        wall-clock time instead of a number of rows, gaps in the data do not shift the range, and only the partitions
+        within the range are read using the primary key index. The data of every sensor is retrieved with a single
+        query.
+
+        :param sensor_ids: A list of the sensors that we wish to retrieve the data of.
+        :param column_names: A list of the columns that we wish to retrieve.
+        :param start: The (inclusive) start of the time range.
+        :param end: The (inclusive) end of the time range.
+        :param as_arrays: Flag used to determine whether the data should be returned as NumPy arrays, see select.
+        :return: A dictionary from each sensor to its data, which is a list of tuples with the format
+        (time, value, value, ...) with a value for each of the given columns, ordered by time.
+        """
+        return self.select_by_sensor(sensor_ids, ["time"] + column_names, "FROM " + MEASUREMENTS_TABLE + " WHERE "
+                                     "sensor_id = ANY(%s) AND time BETWEEN %s AND %s ORDER BY sensor_id, time",
+                                     (list(sensor_ids), start, end), as_arrays)
+
+    def get_first_time(self, sensor_ids):
+        """
+        Retrieves the time of the first measurement of any of the given sensors. The primary key index is used to find
+        the first measurement of each sensor.
+
+        :param sensor_ids: A list of the sensors.
+        :return: The time of the first measurement, or None if the sensors have no measurements.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT min(first.time) FROM unnest(%s) AS sensor (id), LATERAL (SELECT time FROM " +
+                           MEASUREMENTS_TABLE + " WHERE sensor_id = sensor.id ORDER BY time LIMIT 1) AS first",
+                           (list(sensor_ids),))
+
+            return cursor.fetchone()[0]
+
+    def migrate_legacy_tables(self):
+        """
+        Moves the measurements from the tables of the original single room setup, where every measurement was taken by
+        the sensor in the living room, into the measurement tables as measurements taken by the default sensor, which
+        is added to the living room if it does not exist yet. The measurements are moved to the default sensor no
+        matter which sensor migrates them, since the migration only runs once. The legacy tables are renamed with a
+        "_legacy" suffix instead of being dropped, so they can be dropped by hand once the migration has been checked.
+        The legacy rollup tables are replaced by the rollup tables of the measurements.
+
+        Timestamps without a time zone in the legacy tables were inserted by a database running in UTC, so they are
+        interpreted as UTC.
+        """
+        with self.transaction() as cursor:
+            cursor.execute("SELECT table_name, data_type FROM information_schema.columns WHERE table_schema = "
+                           "current_schema() AND table_name = ANY(%s) AND column_name = 'time'", (list(LEGACY_TABLES),))
+            time_types = dict(cursor.fetchall())
+
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (LEGACY_ROLLUP_TABLES[0],))
+            legacy_rollups = cursor.fetchone()[0]
+
+        if not time_types:
+            return
+
+        # The room of an existing default sensor is kept, since the sensor may have been moved after the migration.
+        with self.transaction() as cursor:
+            cursor.execute("INSERT INTO " + SENSORS_TABLE + " (name, room) VALUES (%s, %s) ON CONFLICT (name) "
+                           "DO NOTHING", (DEFAULT_SENSOR, DEFAULT_ROOM))
+            cursor.execute("SELECT id FROM " + SENSORS_TABLE + " WHERE name = %s", (DEFAULT_SENSOR,))
+            sensor_id = cursor.fetchone()[0]
+
+        # Creating the new rollup tables first if the legacy rollup tables were used, so they are filled by the trigger
+        # as the measurements are moved.
+        if legacy_rollups:
+            self.create_rollups()
+
+        columns = ", ".join(SENSOR_COLUMNS)
+
+        for legacy_table, table in LEGACY_TABLES.items():
+            if legacy_table not in time_types:
+                continue
+
+            time = "time AT TIME ZONE 'UTC'" if time_types[legacy_table] == "timestamp without time zone" else "time"
+
+            with self.transaction() as cursor:
+                cursor.execute("SELECT min(" + time + "), max(" + time + ") FROM " + legacy_table)
+                start, end = cursor.fetchone()
+
+            if start is not None:
+                self.create_partitions(table, start, end)
+
+            with self.transaction() as cursor:
+                cursor.execute("INSERT INTO " + table + " (sensor_id, time, " + columns + ") SELECT %s, " + time +
+                               ", " + columns + " FROM " + legacy_table + " WHERE time IS NOT NULL ON CONFLICT DO "
+                               "NOTHING", (sensor_id,))
+                cursor.execute("ALTER TABLE " + legacy_table + " RENAME TO " + legacy_table + "_legacy")
+
+        with self.transaction() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS " + ", ".join(LEGACY_ROLLUP_TABLES))
+            cursor.execute("DROP FUNCTION IF EXISTS livingroom_update_rollups() CASCADE")
+
+    def get_downsampled_data(self, sensor_ids, column_names, start, end, bucket, as_arrays=False, use_rollups=True):
+        """
+        Retrieves the sensor data of the given sensors within the given time range, aggregated into buckets of the
+        given width. The aggregation is done by PostgreSQL so only a single row per bucket is transferred.
+
+        :param sensor_ids: A list of the sensors that we wish to retrieve the data of.
+        :param column_names: A list of the columns that we wish to aggregate.
+        :param start: The (inclusive) start of the time range.
+        :param end: The (exclusive) end of the time range.
+        :param bucket: The width of each bucket, either "minute", "hour" or "day".
+        :param as_arrays: Flag used to determine whether the data should be returned as NumPy arrays, see select.
+        :param use_rollups: Flag used to determine whether the rollup tables are used when they exist. If false the
+        raw data is always aggregated, which is used to benchmark the rollup tables.
+        :return: A dictionary from each sensor to its data, which is a list of tuples with the format
+        (bucket, min, avg, max, min, avg, max, ...) with a min, avg and max for each of the given columns, ordered by
+        time.
+        """
+        # Ensuring that the bucket width is one we support since it is passed directly to date_trunc.
+        if bucket not in self.BUCKET_SECONDS:
+            raise ValueError("Unsupported bucket width: " + str(bucket))
+
+        # If the bucket width has a rollup table we use the precomputed aggregates instead of the raw data.
+        if use_rollups and bucket in ROLLUP_TABLES and self.has_rollups():
+            return self.get_rollup_data(sensor_ids, column_names, start, end, bucket, as_arrays)
+
+        aggregates = [function + "(" + column + ")" for column in column_names for function in ("min", "avg", "max")]
+
+        return self.select_by_sensor(sensor_ids, ["date_trunc(%s, time) AS bucket"] + aggregates, "FROM " +
+                                     MEASUREMENTS_TABLE + " WHERE sensor_id = ANY(%s) AND time >= %s AND time < %s "
+                                     "GROUP BY sensor_id, bucket ORDER BY sensor_id, bucket",
+                                     (bucket, list(sensor_ids), start, end), as_arrays)
+
+    def get_rollup_data(self, sensor_ids, column_names, start, end, bucket, as_arrays=False):
+        """
+        Retrieves the precomputed aggregates from the rollup table with the given bucket width. Since the rollup
+        tables only contain a single row per bucket and sensor the cost of the query does not depend on the size of the
+        measurements table.
+
+        :param sensor_ids: A list of the sensors that we wish to retrieve the aggregates of.
+        :param column_names: A list of the columns that we wish to retrieve the aggregates of.
+        :param start: The start of the time range. The bucket containing the start is included.
+        :param end: The (exclusive) end of the time range.
+        :param bucket: The width of each bucket, either "hour" or "day".
+        :param as_arrays: Flag used to determine whether the data should be returned as NumPy arrays, see select.
+        :return: A dictionary with the same format as the dictionary returned by get_downsampled_data.
+        """
+        return self.select_by_sensor(sensor_ids, ["bucket"] + self.get_aggregate_expressions(column_names), "FROM " +
+                                     ROLLUP_TABLES[bucket] + " WHERE sensor_id = ANY(%s) AND "
+                                     "bucket >= date_trunc(%s, %s) AND bucket < %s ORDER BY sensor_id, bucket",
+                                     (list(sensor_ids), bucket, start, end), as_arrays)
+
+    def get_raw_minutely_data(self, sensor_ids, column_names, start, end, as_arrays=False):
+        """
+        Retrieves the aggregates of each minute of the raw readings that have been dropped from the raw table, see
+        drop_partitions_before. The min and max of each minute show the short spikes that the measurements table, with
+        a single reading per minute, does not contain.
+
+        :param sensor_ids: A list of the sensors that we wish to retrieve the aggregates of.
+        :param column_names: A list of the columns that we wish to retrieve the aggregates of.
+        :param start: The (inclusive) start of the time range.
+        :param end: The (exclusive) end of the time range.
+        :param as_arrays: Flag used to determine whether the data should be returned as NumPy arrays, see select.
+        :return: A dictionary with the same format as the dictionary returned by get_downsampled_data.
+        """
+        return self.select_by_sensor(sensor_ids, ["bucket"] + self.get_aggregate_expressions(column_names), "FROM " +
+                                     RAW_MINUTELY_TABLE + " WHERE sensor_id = ANY(%s) AND bucket >= %s AND bucket < %s "
+                                     "ORDER BY sensor_id, bucket", (list(sensor_ids), start, end), as_arrays)
+
+    @staticmethod
+    def get_aggregate_expressions(column_names):
+        """
+        Creates the expressions that select the min, avg and max of the given columns from a table with the count, sum,
+        min and max of each bucket, such as the rollup tables and the downsampled tables.
+
+        :param column_names: A list of the aggregated columns.
+        :return: A list with the expressions of the min, avg and max of each column.
+        """
+        return [expression.format(column) for column in column_names
+                for expression in ("{0}_min", "{0}_sum / count", "{0}_max")]
+
+    def select(self, expressions, pg_from_query, params, as_arrays=False):
+        """
+        Runs a SELECT query where the first expression is a timestamp and the remaining expressions are numbers.
+
+        If as_arrays is true the result is transferred with COPY in the binary format, with each number cast to a
+        float8 in PostgreSQL, and parsed directly into NumPy arrays. Since every row then has the same size the result
+        is parsed by NumPy without creating any Python objects for the rows, which is significantly faster and uses
+        far less memory than creating a datetime and a Decimal for each value.
+
+        :param expressions: A list of the expressions that are selected, where the first expression is the time.
+        :param pg_from_query: The part of the query following the selected expressions.
+        :param params: A tuple with the values for the placeholders in the query.
+        :param as_arrays: Flag used to determine whether the result should be returned as NumPy arrays.
+        :return: A list of tuples, or if as_arrays is true a tuple with the format (times, arrays) where times is an
+        int64 array of microseconds since the epoch and arrays is a list with a float64 array for each number, where
+        null is represented by NaN.
+        """
+        if not as_arrays:
+            with self.transaction() as cursor:
+                with QUERY_SECONDS.time():
+                    cursor.execute("SELECT " + ", ".join(expressions) + " " + pg_from_query, params)
+
+                with FETCH_SECONDS.time():
+                    return cursor.fetchall()
+
+        # Casting the numbers to float8 and replacing null with NaN so every field in every row has the same size.
+        columns = [expressions[0]] + ["coalesce((" + expression + ")::float8, 'NaN')" for expression in expressions[1:]]
+
+        with self.transaction() as cursor:
+            # COPY does not support placeholders so the values are bound to the query before it is sent.
+            pg_select_query = cursor.mogrify("SELECT " + ", ".join(columns) + " " + pg_from_query, params).decode()
+
+            buffer = io.BytesIO()
+            with QUERY_SECONDS.time():
+                cursor.copy_expert("COPY (" + pg_select_query + ") TO STDOUT WITH (FORMAT binary)", buffer)
+
+        with FETCH_SECONDS.time():
+            return self.parse_binary_copy(buffer.getbuffer(), len(expressions) - 1)
+
+    def select_by_sensor(self, sensor_ids, expressions, pg_from_query, params, as_arrays=False):
+        """
+        Runs a SELECT query for multiple sensors at once and splits the result by sensor, so the data of any number of
+        sensors is retrieved with a single query. The sensor id is selected after the first expression, so the query
+        has to order the rows by the sensor before the time.
+
+        :param sensor_ids: A list of the sensors that the query retrieves the data of.
+        :param expressions: A list of the expressions that are selected, where the first expression is the time.
+        :param pg_from_query: The part of the query following the selected expressions.
+        :param params: A tuple with the values for the placeholders in the query.
+        :param as_arrays: Flag used to determine whether the result should be returned as NumPy arrays, see select.
+        :return: A dictionary from each of the given sensors to its part of the result, in the same format as the
+        result of select. Sensors without any rows are included with an empty result.
+        """
+        if not sensor_ids:
+            return {}
+
+        result = self.select(expressions[:1] + ["sensor_id"] + expressions[1:], pg_from_query, params, as_arrays)
+
+        if not as_arrays:
+            rows = {sensor_id: [] for sensor_id in sensor_ids}
+
+            for row in result:
+                rows[row[1]].append(row[:1] + row[2:])
+
+            return rows
+
+        # Since the rows are ordered by the sensor, the rows of each sensor are a contiguous slice of the arrays.
+        times, (ids, *arrays) = result
+        split = {}
+
+        for sensor_id in sensor_ids:
+            first, last = np.searchsorted(ids, sensor_id, side="left"), np.searchsorted(ids, sensor_id, side="right")
+            split[sensor_id] = times[first:last], [array[first:last] for array in arrays]
+
+        return split
+
+    def stream(self, expressions, pg_from_query, params, itersize=10000):
+        """
+        Runs a SELECT query and yields the result in chunks, which are fetched from a server-side cursor one chunk at a
+        time. Unlike select the result is never held in memory at once, so the memory use stays the same no matter how
+        large the result is.
+
+        The cursor is opened on a dedicated read-only connection instead of a connection from the pool, since the
+        connection is kept in the same transaction until the result has been consumed, and the consumer is then free to
+        run other transactions between the chunks, for example to update the rows it has read.
+
+        :param expressions: A list of the expressions that are selected.
+        :param pg_from_query: The part of the query following the selected expressions.
+        :param params: The values for the placeholders in the query, either a tuple or a dictionary.
+        :param itersize: The amount of rows that are fetched from the server-side cursor at a time.
+        :return: A generator of lists with up to itersize tuples. The connection is closed when the generator is
+        exhausted or closed.
+        """
+        connection = psycopg2.connect(**self.get_connection_settings(self.config_path, self.statement_timeout))
+        connection.set_session(readonly=True)
+
+        try:
+            with connection.cursor(name="stream") as cursor:
+                cursor.itersize = itersize
+                cursor.execute("SELECT " + ", ".join(expressions) + " " + pg_from_query, params)
+
+                while True:
+                    chunk = cursor.fetchmany(itersize)
+                    if not chunk:
+                        return
+
+                    yield chunk
+        finally:
+            connection.close()
+
+    def stream_range(self, sensor_id, column_names, start=None, end=None, table=MEASUREMENTS_TABLE, itersize=10000):
+        """
+        Retrieves the sensor data of the given sensor from the given table within the given time range in chunks, see
+        stream. This is used to export or analyse the data of any time range, including all of it.
+
+        :param sensor_id: The sensor that we wish to retrieve the data of.
+        :param column_names: A list of the columns that we wish to retrieve.
+        :param start: The (inclusive) start of the time range. If None the range starts with the first row.
+        :param end: The (inclusive) end of the time range. If None the range ends with the last row.
+        :param table: The table that the data is retrieved from, either the measurements, the raw or the raw minutely
+        table. The time of the raw minutely table is the start of each minute, and its columns have to be given as the
+        expressions of the aggregates, see get_aggregate_expressions.
+        :param itersize: The amount of rows in each chunk.
+        :return: A generator of lists of tuples with the format (time, value, value, ...), ordered by time.
+        """
+        time_column = "bucket" if table in DOWNSAMPLED_TABLES.values() else "time"
+
+        conditions = ["sensor_id = %(sensor_id)s"]
+        if start is not None:
+            conditions.append(time_column + " >= %(start)s")
+        if end is not None:
+            conditions.append(time_column + " <= %(end)s")
+
+        return self.stream([time_column] + column_names, "FROM " + table + " WHERE " + " AND ".join(conditions) +
+                           " ORDER BY " + time_column, {"sensor_id": sensor_id, "start": start, "end": end}, itersize)
+
+    @staticmethod
+    def parse_binary_copy(data, value_count):
+        """
+        Parses the output of COPY in the binary format where each row contains a timestamp followed by the given amount
+        of float8 values, none of which are null.
+
+        :param data: The output of COPY.
+        :param value_count: The amount of float8 values in each row.
+        :return: A tuple with the same format as returned by select when as_arrays is true.
+        """
+        # The header consists of an 11 byte signature, 4 bytes of flags and the length of the header extension.
+        offset = 19 + int.from_bytes(data[15:19], "big")
+
+        # Each row consists of the number of fields followed by the length and value of each field, all big-endian.
+        fields = [("field_count", ">i2"), ("time_length", ">i4"), ("time", ">i8")]
+        for i in range(value_count):
+            fields += [("value_length_" + str(i), ">i4"), ("value_" + str(i), ">f8")]
+
+        row_type = np.dtype(fields)
+
+        # The output ends with a 2 byte trailer.
+        rows = np.frombuffer(data, row_type, count=(len(data) - offset - 2) // row_type.itemsize, offset=offset)
+
+        times = rows["time"].astype(np.int64) + POSTGRES_EPOCH_MICROSECONDS
+
+        return times, [rows["value_" + str(i)].astype(np.float64) for i in range(value_count)]
+
+    def has_rollups(self):
+        """
+        Checks whether the rollup tables have been created. Once the tables exist the result is saved so the check is
+        not done again, while a missing table is checked again the next time, so the rollup tables are used as soon as
+        they are created by another process, such as backfill_rollups.py.
+
+        :return: True if all rollup tables exist, otherwise False.
+        """
+        if not self.rollups_available:
+            with self.transaction() as cursor:
+                cursor.execute("SELECT to_regclass(%s) IS NOT NULL AND to_regclass(%s) IS NOT NULL",
+                               tuple(ROLLUP_TABLES.values()))
+                self.rollups_available = cursor.fetchone()[0]
+
+        return self.rollups_available
+
+    def create_rollups(self):
+        """
+        Creates the rollup tables together with the trigger that keeps them up to date. The trigger runs once for
+        each INSERT statement on the measurements table and adds the inserted rows to the count, sum, min and max of
+        the buckets they belong to, meaning that the rollup tables are updated incrementally as data is inserted.
+        Existing data is not added to the rollup tables, which is instead done by backfill_rollups.
+
+        The trigger truncates the timestamps into buckets in the time zone of the connection that creates the rollup
+        tables, no matter the time zone of the connection that inserts the rows, so the buckets of every sensor agree.
+        """
+        columns = ", ".join("{0}_sum numeric, {0}_min numeric, {0}_max numeric".format(column)
+                            for column in SENSOR_COLUMNS)
+
+        with self.transaction() as cursor:
+            upserts = ""
+            for bucket, table in ROLLUP_TABLES.items():
+                cursor.execute("CREATE TABLE IF NOT EXISTS " + table + " (sensor_id integer NOT NULL, "
+                               "bucket timestamptz NOT NULL, count integer NOT NULL, " + columns + ", "
+                               "PRIMARY KEY (sensor_id, bucket))")
+
+                # Adding the aggregates of the new rows to the existing aggregates of each bucket.
+                updates = ", ".join("{1}_sum = {0}.{1}_sum + excluded.{1}_sum, "
+                                    "{1}_min = least({0}.{1}_min, excluded.{1}_min), "
+                                    "{1}_max = greatest({0}.{1}_max, excluded.{1}_max)".format(table, column)
+                                    for column in SENSOR_COLUMNS)
+
+                upserts += self.get_rollup_insert_query(table, bucket, "new_rows") + " GROUP BY 1, 2 ON CONFLICT " \
+                           "(sensor_id, bucket) DO UPDATE SET count = " + table + ".count + excluded.count, " + \
+                           updates + ";\n"
+
+            cursor.execute("CREATE OR REPLACE FUNCTION " + MEASUREMENTS_TABLE + "_update_rollups() RETURNS trigger "
+                           "AS $$\nBEGIN\n" + upserts + "RETURN NULL;\nEND;\n$$ LANGUAGE plpgsql "
+                           "SET TimeZone FROM CURRENT")
+
+            # Using a statement level trigger with a transition table so inserting multiple rows at once only updates
+            # each bucket once. The transition table contains the rows inserted into every partition, and only the
+            # rows that were actually inserted when a measurement is skipped because it already exists.
+            cursor.execute("DROP TRIGGER IF EXISTS " + MEASUREMENTS_TABLE + "_rollups ON " + MEASUREMENTS_TABLE)
+            cursor.execute("CREATE TRIGGER " + MEASUREMENTS_TABLE + "_rollups AFTER INSERT ON " + MEASUREMENTS_TABLE +
+                           " REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+                           "EXECUTE PROCEDURE " + MEASUREMENTS_TABLE + "_update_rollups()")
+
+        self.rollups_available = True
+
+    def backfill_rollups(self, start=None, end=None, chunk_days=30):
+        """
+        Recomputes the rollup tables from the data in the measurements table within the given time range. The range is
+        processed in chunks with a transaction for each chunk to avoid locking the measurements table for too long.
+
+        :param start: The start of the time range that should be recomputed. If None the first row is used.
+        :param end: The end of the time range that should be recomputed. If None the last row is used.
+        :param chunk_days: The amount of days that are recomputed in each transaction.
+        """
+        # Limiting the range to the existing rows and aligning the start with a day so no chunk contains part of a
+        # bucket. Since greatest and least ignore null the range of the rows is used if no start or end is given. The
+        # first and last row of each sensor are found using the primary key index.
+        with self.transaction() as cursor:
+            self.use_rollup_time_zone(cursor)
+            cursor.execute("SELECT date_trunc('day', greatest(min(first.time), %s)), least(max(last.time), %s) FROM " +
+                           SENSORS_TABLE + ", LATERAL (SELECT time FROM " + MEASUREMENTS_TABLE + " WHERE sensor_id = " +
+                           SENSORS_TABLE + ".id ORDER BY time LIMIT 1) AS first, LATERAL (SELECT time FROM " +
+                           MEASUREMENTS_TABLE + " WHERE sensor_id = " + SENSORS_TABLE + ".id ORDER BY time DESC "
+                           "LIMIT 1) AS last", (start, end))
+            chunk_start, end = cursor.fetchone()
+
+        # If the measurements table is empty there is nothing to backfill.
+        if chunk_start is None:
+            return
+
+        overwrites = ", ".join("{0}_sum = excluded.{0}_sum, {0}_min = excluded.{0}_min, "
+                               "{0}_max = excluded.{0}_max".format(column) for column in SENSOR_COLUMNS)
+
+        while chunk_start <= end:
+            with self.transaction() as cursor:
+                # Finding the end of the chunk in PostgreSQL so it is aligned with a day in the time zone of the
+                # rollup tables, even when the chunk crosses a daylight saving time change.
+                self.use_rollup_time_zone(cursor)
+                cursor.execute("SELECT date_trunc('day', %s + make_interval(days => %s))", (chunk_start, chunk_days))
+                chunk_end = cursor.fetchone()[0]
+
+                # Blocking inserts while the chunk is recomputed so rows inserted meanwhile are not lost.
+                cursor.execute("LOCK TABLE " + MEASUREMENTS_TABLE + " IN SHARE MODE")
+
+                for bucket, table in ROLLUP_TABLES.items():
+                    cursor.execute(self.get_rollup_insert_query(table, bucket, MEASUREMENTS_TABLE) +
+                                   " WHERE time >= %s AND time < %s GROUP BY 1, 2 ON CONFLICT (sensor_id, bucket) "
+                                   "DO UPDATE SET count = excluded.count, " + overwrites, (chunk_start, chunk_end))
+
+            chunk_start = chunk_end
+
+    @staticmethod
+    def use_rollup_time_zone(cursor):
+        """
+        Sets the time zone of the transaction to the time zone that the trigger of the rollup tables truncates the
+        timestamps in, see create_rollups, so the buckets computed in the transaction are the same as the buckets of
+        the trigger. The time zone of the connection is kept if the trigger does not have a time zone.
+
+        :param cursor: A cursor in the transaction.
+        """
+        cursor.execute("SELECT set_config('TimeZone', split_part(setting, '=', 2), true) FROM pg_proc, "
+                       "unnest(proconfig) AS setting WHERE proname = %s AND setting LIKE 'TimeZone=%%'",
+                       (MEASUREMENTS_TABLE + "_update_rollups",))
+
+    def recompute_air_quality(self, sensor_id, gas_baseline, hum_weighting=HUMIDITY_WEIGHTING, start=None, end=None,
+                              chunk_size=10000):
+        """
+        Recalculates the air quality of the measurements of the given sensor within the given time range, for example
+        after the gas baseline or the weighting of the humidity has been changed. The measurements are read through a
+        server-side cursor on a dedicated connection, so only a single chunk is in memory at a time, and each chunk is
+        updated in its own transaction to avoid locking the rows for too long. The rollup tables are recomputed
+        afterwards since they contain aggregates of the air quality.
+
+        :param sensor_id: The sensor that took the measurements.
+        :param gas_baseline: The gas baseline that the air quality is calculated relative to.
+        :param hum_weighting: The balance between humidity and gas reading in the air quality.
+        :param start: The (inclusive) start of the time range. If None the first measurement is used.
+        :param end: The (inclusive) end of the time range. If None the last measurement is used.
+        :param chunk_size: The amount of measurements that are updated in each transaction.
+        :return: The number of updated measurements.
+        """
+        conditions = ["sensor_id = %(sensor_id)s", "gasresistance IS NOT NULL"]
+        if start is not None:
+            conditions.append("time >= %(start)s")
+        if end is not None:
+            conditions.append("time <= %(end)s")
+
+        pg_update_query = "UPDATE " + MEASUREMENTS_TABLE + " AS measurement SET airquality = data.airquality FROM " \
+                          "(VALUES %s) AS data (sensor_id, time, airquality) WHERE measurement.sensor_id = " \
+                          "data.sensor_id AND measurement.time = data.time"
+        updated = 0
+
+        # Streaming the measurements so the updates of each chunk can be committed while the rest are still read.
+        for chunk in self.stream(["time", "gasresistance::float8", "humidity::float8"], "FROM " + MEASUREMENTS_TABLE +
+                                 " WHERE " + " AND ".join(conditions) + " ORDER BY time",
+                                 {"sensor_id": sensor_id, "start": start, "end": end}, chunk_size):
+            times, gas_resistance, humidity = zip(*chunk)
+            air_quality = get_air_quality_array(gas_resistance, humidity, gas_baseline, hum_weighting)
+
+            with self.transaction() as cursor:
+                psycopg2.extras.execute_values(cursor, pg_update_query, [(sensor_id, time, value) for time, value
+                                                                         in zip(times, air_quality.tolist())],
+                                               page_size=1000)
+
+            updated += len(chunk)
+
+        if updated and self.has_rollups():
+            self.backfill_rollups(start, end)
+
+        return updated
+
+    @staticmethod
+    def get_rollup_insert_query(table, bucket, source):
+        """
+        Creates the start of a query that inserts the aggregates of the rows in the source into the given rollup table.
+
+        :param table: The rollup table that the aggregates are inserted into.
+        :param bucket: The bucket width of the rollup table.
+        :param source: The table that the rows are aggregated from.
+        :return: The query without the WHERE, GROUP BY and ON CONFLICT clauses.
+        """
+        aggregates = ", ".join("sum({0}), min({0}), max({0})".format(column) for column in SENSOR_COLUMNS)
+
+        return "INSERT INTO " + table + " SELECT sensor_id, date_trunc('" + bucket + "', time), count(*), " + \
+               aggregates + " FROM " + source
+
+    @classmethod
+    def choose_bucket(cls, start, end, max_points):
+        """
+        Chooses the smallest bucket width that results in at most max_points buckets within the given time range. This
+        can be used to ensure that we never retrieve more data points than the plot has pixels to show them with.
+
+        :param start: The start of the time range.
+        :param end: The end of the time range.
+        :param max_points: The maximum number of buckets that we want to retrieve.
+        :return: The name of the chosen bucket width. If no width is small enough the widest bucket is returned.
+        """
+        seconds = (end - start).total_seconds()
 
-        self.cursor.execute(pg_select_query)
+        # The bucket widths are ordered from the smallest to the largest.
+        for bucket, bucket_seconds in sorted(cls.BUCKET_SECONDS.items(), key=lambda item: item[1]):
+            if seconds / bucket_seconds <= max_points:
+                return bucket
 
-        return self.cursor.fetchall()
+        return max(cls.BUCKET_SECONDS, key=cls.BUCKET_SECONDS.get)
 
     def close(self):
-        """Closes the connection and the cursor."""
-        self.connection.close()
-        self.cursor.close()
+        """Closes all connections in the pool."""
+        self.pool.closeall()
@@ -0,0 +1,125 @@
+"""
+This file exports the data of a sensor within a time range, or all of it, to a CSV or Parquet file. The data is streamed
+from the database in chunks and each chunk is written before the next is fetched, so years of data can be exported
+from the desktop without holding it in memory. Writing Parquet files requires pyarrow.
+
+Usage: python export_data.py OUTPUT [--sensor NAME] [--format {csv,parquet}] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+[--columns COLUMN ...] [--table TABLE] [--itersize ROWS] [--config PATH]
+
+The CSV files can be replayed by pi_zero.py with the replay source. Exporting the measurements_raw_minutely table, which
+keeps the aggregates of each minute of the raw readings after they are dropped, writes the min, avg and max of each
+column instead, which cannot be replayed.
+"""
+import argparse
+import csv
+import datetime
+import importlib.util
+
+from indoor_climate_assistant.database import Database, DATABASE_CONFIG_PATH, SENSOR_COLUMNS, MEASUREMENTS_TABLE, \
+    RAW_TABLE, RAW_MINUTELY_TABLE, DEFAULT_SENSOR
+
+
+def parse_date(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%d")
+
+
+def write_csv(chunks, path, column_names):
+    """
+    Writes the chunks to a CSV file with a header.
+
+    :param chunks: An iterable of lists of tuples with the format (time, value, value, ...).
+    :param path: The path to the CSV file.
+    :param column_names: The names of the value columns.
+    :return: The number of written rows.
+    """
+    rows = 0
+
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["time"] + column_names)
+
+        for chunk in chunks:
+            writer.writerows([time.isoformat()] + values for time, *values in chunk)
+            rows += len(chunk)
+
+    return rows
+
+
+def write_parquet(chunks, path, column_names):
+    """
+    Writes the chunks to a Parquet file where each chunk is a row group, with the time as a timestamp in UTC and the
+    values as float64.
+
+    :param chunks: An iterable of lists of tuples with the format (time, value, value, ...).
+    :param path: The path to the Parquet file.
+    :param column_names: The names of the value columns.
+    :return: The number of written rows.
+    """
+    # Only importing pyarrow when it is used, since it is not needed by the rest of the application.
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema([("time", pyarrow.timestamp("us", tz="UTC"))] +
+                            [(column, pyarrow.float64()) for column in column_names])
+    rows = 0
+
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(column, type=field.type)
+                                                          for column, field in zip(columns, schema)], schema=schema))
+            rows += len(chunk)
+
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exports the sensor data to a CSV or Parquet file.")
+    parser.add_argument("output", help="The file that the data is exported to.")
+    parser.add_argument("--sensor", default=DEFAULT_SENSOR, help="The name of the sensor whose data is exported.")
+    parser.add_argument("--format", choices=["csv", "parquet"],
+                        help="The format of the file. If not given it is chosen from the file extension.")
+    parser.add_argument("--start", type=parse_date, help="The start of the time range that is exported.")
+    parser.add_argument("--end", type=parse_date, help="The end of the time range that is exported.")
+    parser.add_argument("--columns", nargs="+", choices=SENSOR_COLUMNS, default=SENSOR_COLUMNS,
+                        help="The columns that are exported besides the time.")
+    parser.add_argument("--table", choices=[MEASUREMENTS_TABLE, RAW_TABLE, RAW_MINUTELY_TABLE],
+                        default=MEASUREMENTS_TABLE, help="The table that is exported.")
+    parser.add_argument("--itersize", type=int, default=10000, help="The amount of rows fetched at a time.")
+    parser.add_argument("--config", default=DATABASE_CONFIG_PATH, help="The database config file.")
+    args = parser.parse_args()
+
+    export_format = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    if export_format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        parser.error("exporting to Parquet requires pyarrow, which can be installed with: pip install pyarrow")
+
+    # Disabling the statement timeout since the first chunk of a large time range can take a while to find.
+    aqtassistant_db = Database(args.config, max_connections=1, statement_timeout=0)
+
+    sensor_ids = {name: sensor_id for sensor_id, name, _ in aqtassistant_db.get_sensors()}
+    if args.sensor not in sensor_ids:
+        aqtassistant_db.close()
+        parser.error("unknown sensor: " + args.sensor)
+
+    # The raw minutely table contains the aggregates of each minute, which are exported as the min, avg and max.
+    if args.table == RAW_MINUTELY_TABLE:
+        expressions = Database.get_aggregate_expressions(args.columns)
+        column_names = [column + suffix for column in args.columns for suffix in ("_min", "_avg", "_max")]
+    else:
+        expressions = args.columns
+        column_names = args.columns
+
+    if export_format == "parquet":
+        # Casting the values in PostgreSQL so they do not have to be converted from Decimal.
+        chunks = aqtassistant_db.stream_range(sensor_ids[args.sensor], ["(" + expression + ")::float8"
+                                                                        for expression in expressions],
+                                              args.start, args.end, args.table, args.itersize)
+        row_count = write_parquet(chunks, args.output, column_names)
+    else:
+        chunks = aqtassistant_db.stream_range(sensor_ids[args.sensor], expressions, args.start, args.end, args.table,
+                                              args.itersize)
+        row_count = write_csv(chunks, args.output, column_names)
+
+    print("Exported " + str(row_count) + " rows to " + args.output)
+
+    aqtassistant_db.close()
@@ -0,0 +1,108 @@
+"""
+Gas baseline file for the baseline that the air quality is calculated relative to. The baseline is the gas resistance
+of clean air, which is found by burning in the sensor the first time. Afterwards the baseline keeps adapting to the gas
+resistance that is read while running and is saved to a file, so a restart can reuse it instead of burning in the sensor
+for 5 minutes before the first reading is recorded.
+"""
+import datetime
+import json
+import os
+import time
+
+# The path to the file that the gas baseline is saved to.
+BASELINE_PATH = "../resources/gas_baseline.json"
+
+
+class GasBaseline:
+    """
+    Gas baseline that tracks a high percentile of the gas resistance readings. The percentile is estimated by moving
+    the baseline up by a small fraction when a reading is above it and down when it is below it, weighted so the
+    baseline settles where the given fraction of the readings are below it. This takes constant time and memory for
+    each reading, and the baseline follows an increase in the gas resistance faster than a decrease, since a decrease
+    is usually caused by the air getting worse rather than by the sensor drifting.
+    """
+    # The number of seconds between each time the baseline is saved while running.
+    SAVE_INTERVAL = 600
+
+    # How old a saved baseline can be before the sensor is burned in again instead of reusing it.
+    MAX_AGE = datetime.timedelta(days=1)
+
+    def __init__(self, value, path=BASELINE_PATH, quantile=0.95, rate=0.0005, updated_at=None):
+        """
+        :param value: The initial gas baseline in Ohms.
+        :param path: The path to the file that the baseline is saved to. If None the baseline is not saved.
+        :param quantile: The fraction of the gas resistance readings that should be below the baseline.
+        :param rate: The fraction that the baseline is moved by for each reading.
+        :param updated_at: The time the baseline was last updated. If None the current time is used.
+        """
+        self.value = value
+        self.path = path
+        self.quantile = quantile
+        self.rate = rate
+        self.updated_at = updated_at or datetime.datetime.now(datetime.timezone.utc)
+
+        # The time of the latest save, which is None until the baseline has been saved.
+        self.last_save = None
+
+    @classmethod
+    def load(cls, path=BASELINE_PATH, max_age=MAX_AGE):
+        """
+        Loads the saved gas baseline if it exists and is recent enough to be reused.
+
+        :param path: The path to the file that the baseline was saved to.
+        :param max_age: How old the saved baseline can be.
+        :return: The loaded baseline, or None if there is no recent baseline.
+        """
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, "r") as file:
+                saved = json.load(file)
+
+            value = float(saved["baseline"])
+            updated_at = datetime.datetime.fromisoformat(saved["time"])
+        except (ValueError, KeyError, TypeError) as error:
+            print("Ignoring the saved gas baseline: " + str(error))
+            return None
+
+        if value <= 0 or datetime.datetime.now(datetime.timezone.utc) - updated_at > max_age:
+            return None
+
+        return cls(value, path, updated_at=updated_at)
+
+    def update(self, gas_resistance):
+        """
+        Moves the baseline towards the high percentile of the gas resistance readings.
+
+        :param gas_resistance: A gas resistance reading in Ohms from a stable hot plate.
+        """
+        if gas_resistance > self.value:
+            self.value *= 1 + self.rate * self.quantile
+        else:
+            self.value *= 1 - self.rate * (1 - self.quantile)
+
+        self.updated_at = datetime.datetime.now(datetime.timezone.utc)
+
+    def save(self):
+        """
+        Saves the baseline to the file. The baseline is written to a temporary file first, which replaces the file when
+        it is complete, so a power loss while saving does not leave a corrupt file.
+        """
+        if self.path is None:
+            return
+
+        temporary_path = self.path + ".tmp"
+
+        with open(temporary_path, "w") as file:
+            json.dump({"baseline": self.value, "time": self.updated_at.isoformat()}, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temporary_path, self.path)
+        self.last_save = time.monotonic()
+
+    def save_if_due(self):
+        """Saves the baseline if the save interval has passed since it was last saved."""
+        if self.last_save is None or time.monotonic() - self.last_save >= self.SAVE_INTERVAL:
+            self.save()
@@ -0,0 +1,228 @@
+"""
+Ingestion file for buffering the data from the bme680 sensor before it is inserted into the database. Instead of
+inserting each measurement on its own, the measurements are inserted in batches, which reduces the number of round-trips
+and commits. This is used for the every-second readings of the raw table, while the measurements table only receives a
+reading every minute, which pi_zero.py inserts right away. If the database cannot be reached the measurements are
+written to a local spool file which is replayed when the connection is restored, so no measurements are lost while the
+database is unavailable.
+"""
+import datetime
+import json
+import os
+import time
+
+import psycopg2
+
+from indoor_climate_assistant import metrics
+from indoor_climate_assistant.database import Database, DATABASE_CONFIG_PATH, MEASUREMENTS_TABLE
+
+# The path to the append-only file that measurements are written to while the database is unreachable.
+SPOOL_PATH = "../resources/ingestion_spool.jsonl"
+
+# The path to the spool file used for the raw table in the high-frequency capture mode.
+RAW_SPOOL_PATH = "../resources/ingestion_raw_spool.jsonl"
+
+# The metrics of the measurements that could not be inserted right away.
+SPOOLED_ROWS = metrics.counter("aqt_ingestion_spooled_rows_total", "Number of measurements written to the spool file "
+                                                                    "since the database could not be reached.")
+
+
+class IngestionWriter:
+    """
+    Writer that buffers the measurements of a sensor and inserts them into a table when the buffer is full or when
+    enough time has passed since the last insertion. If a retention is given the partitions of the table that only
+    contain measurements older than the retention are dropped once an hour. Since the partitions contain the
+    measurements of every sensor, the longest raw retention registered by any sensor is used if it is longer.
+
+    If the database could not be reached when the writer was created, the id of the sensor is not known yet. The
+    measurements are then spooled until the database can be reached, at which point the database is set up and the id
+    of the sensor is found by the given setup function. Since the spooled measurements do not contain the sensor, they
+    are inserted with the id found by the setup function.
+    """
+    # The number of seconds between each drop of the partitions that are older than the retention.
+    PRUNE_INTERVAL = 3600
+
+    def __init__(self, sensor_id, config_path=DATABASE_CONFIG_PATH, spool_path=SPOOL_PATH, batch_size=60,
+                 flush_interval=60, table=MEASUREMENTS_TABLE, retention=None, setup=None):
+        """
+        :param sensor_id: The sensor that took the measurements, or None if it is not known yet.
+        :param setup: Function that sets up the database and returns the id of the sensor. It is called the first time
+        the database is reached if the sensor id is None.
+        """
+        self.sensor_id = sensor_id
+        self.setup = setup
+        self.config_path = config_path
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.table = table
+        self.retention = retention
+
+        # Pruning on the first flush so old measurements are deleted right after a restart.
+        self.last_prune = None
+
+        # The time of the latest measurement, which the retention is relative to, so the retention follows the clock of
+        # a simulated or replayed sensor instead of the current time.
+        self.latest_time = None
+
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+        # The connection to the database is created when the first batch is flushed.
+        self.database = None
+
+    def add(self, data, measured_at=None):
+        """
+        Adds a single measurement to the buffer and flushes the buffer if it is full or if the flush interval has
+        passed.
+
+        :param data: A list with the format (temperature, air pressure, humidity, gas resistance, air quality).
+        :param measured_at: The time the measurement was taken. If None the current time is used.
+        """
+        measured_at = measured_at or datetime.datetime.now(datetime.timezone.utc)
+
+        self.buffer.append(tuple(data) + (measured_at,))
+        self.latest_time = measured_at if self.latest_time is None else max(self.latest_time, measured_at)
+
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Inserts the buffered measurements into the database. Any measurements in the spool file are inserted first so
+        the measurements are inserted in chronological order. If the insertion fails the buffered measurements are
+        written to the spool file instead. The old partitions are only pruned after the measurements have been inserted,
+        and an error while pruning does not spool the measurements again.
+        """
+        self.last_flush = time.monotonic()
+
+        if not self.buffer and not os.path.isfile(self.spool_path):
+            return
+
+        try:
+            if self.database is None:
+                # Only trying to connect once since the measurements are spooled if the database is unreachable.
+                self.database = Database(self.config_path, max_connections=1, connect_attempts=1)
+
+            if self.sensor_id is None:
+                self.sensor_id = self.setup()
+
+            self.replay_spool()
+
+            if self.buffer:
+                self.database.insert_sensor_data_batch(self.sensor_id, self.buffer, self.table)
+        except (Exception, psycopg2.Error) as pg_error:
+            print("Error while inserting into PostgreSQL, spooling to disk: " + str(pg_error))
+
+            self.write_spool(self.buffer)
+            self.disconnect()
+            self.buffer = []
+            return
+
+        # Clearing the buffer as soon as the measurements have been committed, so they are never spooled again.
+        self.buffer = []
+
+        self.prune()
+
+    def replay_spool(self):
+        """
+        Inserts the measurements from the spool file into the database and removes the file afterwards. Lines that
+        cannot be parsed, such as a line that was torn by a power loss while it was written, are skipped, since they
+        would otherwise keep the spool file from ever being replayed.
+        """
+        if not os.path.isfile(self.spool_path):
+            return
+
+        rows = []
+        with open(self.spool_path, "r") as spool:
+            for line in spool:
+                if not line.strip():
+                    continue
+
+                try:
+                    rows.append(self.parse_spool_line(line))
+                except (ValueError, TypeError, IndexError) as error:
+                    print("Skipping a line in the spool file that could not be parsed: " + str(error))
+
+        if rows:
+            self.database.insert_sensor_data_batch(self.sensor_id, rows, self.table)
+
+        # The file is only removed after the commit so the measurements are kept if the insertion fails.
+        os.remove(self.spool_path)
+
+    def prune(self):
+        """
+        Drops the partitions that are older than the retention, counted back from the latest measurement, if the prune
+        interval has passed. The retention is extended to the longest raw retention of the registered sensors, so a
+        sensor with a short retention does not drop the measurements that other sensors keep for longer.
+        """
+        if self.retention is None or self.latest_time is None:
+            return
+
+        if self.last_prune is not None and time.monotonic() - self.last_prune < self.PRUNE_INTERVAL:
+            return
+
+        # The measurements have already been inserted, so an error is only printed and pruning is tried again on the
+        # next flush.
+        try:
+            retention = max(self.retention, self.database.get_longest_raw_retention() or self.retention)
+            self.database.drop_partitions_before(self.table, self.latest_time - retention)
+        except (Exception, psycopg2.Error) as pg_error:
+            print("Error while dropping old partitions in PostgreSQL: " + str(pg_error))
+            return
+
+        self.last_prune = time.monotonic()
+
+    def write_spool(self, rows):
+        """
+        Appends the given measurements to the spool file. The file is synced to disk so the measurements survive a
+        power loss on the Raspberry Pi.
+
+        :param rows: A list of tuples with the format (temperature, air pressure, humidity, gas resistance,
+        air quality, time).
+        """
+        # Ending a line that was torn by a power loss, so the measurements are not appended to it.
+        torn = False
+        if os.path.isfile(self.spool_path) and os.path.getsize(self.spool_path) > 0:
+            with open(self.spool_path, "rb") as spool:
+                spool.seek(-1, os.SEEK_END)
+                torn = spool.read(1) != b"\n"
+
+        with open(self.spool_path, "a") as spool:
+            if torn:
+                spool.write("\n")
+
+            for row in rows:
+                spool.write(json.dumps(list(row[:-1]) + [row[-1].isoformat()]) + "\n")
+
+            spool.flush()
+            os.fsync(spool.fileno())
+
+        SPOOLED_ROWS.inc(len(rows))
+
+    @staticmethod
+    def parse_spool_line(line):
+        """
+        Parses a single line from the spool file into a measurement.
+
+        :param line: A line containing a json list where the last element is the time in ISO format.
+        :return: A tuple with the same format as the tuples in the buffer.
+        """
+        values = json.loads(line)
+
+        return tuple(values[:-1]) + (datetime.datetime.fromisoformat(values[-1]),)
+
+    def disconnect(self):
+        """Closes the connection to the database so a new connection is created on the next flush."""
+        if self.database is not None:
+            try:
+                self.database.close()
+            except (Exception, psycopg2.Error):
+                pass
+
+        self.database = None
+
+    def close(self):
+        """Flushes the remaining measurements and closes the connection to the database."""
+        self.flush()
+        self.disconnect()
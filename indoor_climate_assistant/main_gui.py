@@ -1,41 +1,69 @@
 from PyQt5 import QtWidgets, QtGui
-from PyQt5.QtWinExtras import QtWin
 
 from indoor_climate_assistant.main_window import MainWindow
 from indoor_climate_assistant.system_tray import SystemTray
 from indoor_climate_assistant.database import Database
+from indoor_climate_assistant.data_store import DataStore
+from indoor_climate_assistant import metrics
 
 import sys
-import qdarkstyle
 
 
-def main():
+def start(argv):
     """
-    Main function for the GUI that sets up the application, main window, database and system tray and starts the
-    even loop. General settings regarding the application is also handled here.
+    Sets up the application, main window, database and system tray and shows the main window. The window is shown
+    before matplotlib is imported and before the database has been reached, since the plot is created when the event
+    loop starts and every query is run by the worker threads of the data store.
+
+    :param argv: The command line arguments of the application. If they contain "--metrics" the timings of the queries
+    and the plot are recorded and the latest timings are shown in the status bar of the main window.
+    :return: A tuple with the format (app, main window, system tray), which have to be kept alive while the event loop
+    runs.
     """
-    app = QtWidgets.QApplication(sys.argv)
+    if "--metrics" in argv:
+        metrics.enable()
+
+    app = QtWidgets.QApplication(argv)
     app.setWindowIcon(QtGui.QIcon("../resources/graph_icon.ico"))
 
-    # Changing the app id so our custom window icon is shown on the toolbar.
-    QtWin.setCurrentProcessExplicitAppUserModelID("aqt_assistant.v1.0")
+    # Changing the app id so our custom window icon is shown on the toolbar. The Windows extras are only available on
+    # Windows.
+    if sys.platform == "win32":
+        from PyQt5.QtWinExtras import QtWin
+        QtWin.setCurrentProcessExplicitAppUserModelID("aqt_assistant.v1.0")
 
     # Ensuring that we do not stop the application when the main window is closed.
     app.setQuitOnLastWindowClosed(False)
 
-    # Setting up the database object that can be used to query from the livingroom database.
+    # setup stylesheet, before the widgets are created so they are only styled once.
+    import qdarkstyle
+    app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
+
+    # Setting up the database object that can be used to query the measurements of every room. The connections are
+    # opened by the worker threads of the data store when they are first needed.
     aqt_assistant_db = Database()
 
+    # Setting up the data store that is shared by the main window and the system tray, so the database is only polled
+    # for new data in a single place.
+    data_store = DataStore(aqt_assistant_db)
+
     # Setting up the main GUI window.
-    main_window = MainWindow(aqt_assistant_db)
+    main_window = MainWindow(data_store)
 
     # Setting up the system tray icon.
-    system_tray = SystemTray(main_window, aqt_assistant_db, app)
-
-    # setup stylesheet
-    app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
+    system_tray = SystemTray(main_window, data_store, app)
 
     main_window.show()
+
+    return app, main_window, system_tray
+
+
+def main():
+    """
+    Main function for the GUI that starts the application and the even loop. General settings regarding the application
+    is handled by start.
+    """
+    app, main_window, system_tray = start(sys.argv)
     sys.exit(app.exec_())
 
 
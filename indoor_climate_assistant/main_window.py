@@ -2,46 +2,131 @@ import datetime
 import json
 import os.path
 
-import matplotlib
-from PyQt5 import QtWidgets, uic, QtCore
+import dateutil.tz
+import numpy as np
+from PyQt5 import QtWidgets, QtCore
 
+from indoor_climate_assistant import metrics
+from indoor_climate_assistant.database import QUERY_SECONDS, FETCH_SECONDS
+from indoor_climate_assistant.series_buffer import SeriesBuffer
+from indoor_climate_assistant.ui_mainwindow import Ui_MainWindow
 
-class MainWindow(QtWidgets.QMainWindow):
+# The metrics of the time spent turning the queried data into plottable series, drawing the whole plot and redrawing
+# only the lines.
+CONVERSION_SECONDS = metrics.histogram("aqt_plot_conversion_seconds", "Time spent converting the queried data into "
+                                                                      "plottable series.")
+DRAW_SECONDS = metrics.histogram("aqt_plot_draw_seconds", "Time spent drawing the whole plot.")
+BLIT_SECONDS = metrics.histogram("aqt_plot_blit_seconds", "Time spent redrawing only the lines of the plot.")
+
+
+class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     """
-    Main window that represents the visible window the application runs in.
+    Main window that represents the visible window the application runs in. The UI is set up from the code that is
+    generated from mainwindow.ui with "pyuic5 ../resources/mainwindow.ui -o ui_mainwindow.py", which has to be run
+    again when mainwindow.ui is changed, so the UI file does not have to be parsed every time the application starts.
     """
-    def __init__(self, database, *args, **kwargs):
+    # The local time zone that the times are shown in. This follows the daylight saving time of the system.
+    LOCAL_TIMEZONE = dateutil.tz.tzlocal()
+
+    # The time frames that are updated with live data.
+    LIVE_TIME_FRAMES = ["Now", "Today"]
+
+    # The fraction of the time frame that is added as empty space after the latest data point in live time frames, so
+    # live updates can be drawn without redrawing the axes.
+    LIVE_HEADROOM = 0.1
+
+    # The colors of the lines of the rooms, in the order the rooms are shown.
+    ROOM_COLORS = ["#0088DE", "#F5A623", "#7ED321", "#BD10E0", "#50E3C2", "#F8E71C"]
+
+    # The fraction of the points in the plot that are shown in the coarse preview, which is drawn while the data of a
+    # time frame is queried.
+    PREVIEW_FRACTION = 0.1
+
+    def __init__(self, data_store, *args, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
 
-        self.aqt_assistant_db = database
+        # The store containing the queried data, which is shared with the system tray.
+        self.data_store = data_store
+
+        # Setting up the UI from the generated code.
+        self.setupUi(self)
 
-        # Load the UI Page
-        uic.loadUi("../resources/mainwindow.ui", self)
+        # The names of the sensors of the rooms that are shown, or None if every room is shown. The menu containing an
+        # action for each room is filled when the sensors have been loaded by the data store.
+        self.rooms = None
+        self.room_actions = {}
+        self.rooms_menu = self.menubar.addMenu("Rooms")
 
-        # Loading the GUI settings from the persistent json file if it exists.
+        # Loading the GUI settings from the persistent json file if it exists. This is done before the signals of the
+        # settings are connected, so loading them does not request the data of the plot.
         if os.path.isfile("../resources/settings.json"):
             self.load_settings()
 
-        self.x = []
-        self.y = []
-        self.initialize_plot()
+        # The plotted series of each sensor, the minimum and maximum of each bucket if the data is aggregated, and the
+        # time of the latest plotted row of each sensor.
+        self.series = {}
+        self.bounds = {}
+        self.latest_times = {}
+
+        # Whether the requested data has not been plotted yet, which is the case until the first data is plotted.
+        self.loading = True
+
+        # The lines showing the series of each sensor and the background of the plot without the lines, which is used
+        # for blitting. The canvas of the plot is created by create_plot.
+        self.lines = {}
+        self.background = None
+        self.plot_created = False
 
-        # Initializing a new plot if any of the plot changing settings are changed.
+        # If the metrics are enabled the latest timings of the plot are shown in the status bar.
+        if metrics.enabled:
+            self.statusbar.showMessage("Waiting for the first plot...")
+
+        # Initializing a new plot if any of the data changing settings are changed.
         self.dataComboBox.currentIndexChanged.connect(self.initialize_plot)
         self.timeFrameComboBox.currentIndexChanged.connect(self.initialize_plot)
-        self.aqMinSpinBox.valueChanged.connect(self.initialize_plot)
-        self.tMinSpinBox.valueChanged.connect(self.initialize_plot)
-        self.tMaxSpinBox.valueChanged.connect(self.initialize_plot)
+
+        # Redrawing the plot with the existing data if any of the thresholds are changed.
+        self.aqMinSpinBox.valueChanged.connect(self.redraw_plot)
+        self.tMinSpinBox.valueChanged.connect(self.redraw_plot)
+        self.tMaxSpinBox.valueChanged.connect(self.redraw_plot)
 
         # Saving the settings if non plot changing settings are changed.
         self.aqWarningCheckBox.toggled.connect(self.save_settings)
         self.tWarningCheckBox.toggled.connect(self.save_settings)
 
-        # Setup a timer to trigger the redraw every minute by calling update_plot.
-        self.update_plot_timer = QtCore.QTimer()
-        self.update_plot_timer.setInterval(60000)
-        self.update_plot_timer.timeout.connect(self.update_plot)
-        self.update_plot_timer.start()
+        # Redrawing the plot every time the data store has received new data from the database.
+        self.data_store.updated.connect(self.update_plot)
+
+        # Adding the rooms to the menu every time the sensors have been loaded, which is done right away if they have
+        # already been loaded. The data of the plot is first requested when the rooms are added, so it is only
+        # requested once when the application starts.
+        self.data_store.sensors_loaded.connect(self.update_rooms)
+        if self.data_store.sensors is not None:
+            self.update_rooms()
+
+    def paintEvent(self, event):
+        """Creates the plot after the window has been painted the first time, so it is shown before matplotlib is
+        imported."""
+        super(MainWindow, self).paintEvent(event)
+
+        if not self.plot_created:
+            QtCore.QTimer.singleShot(0, self.create_plot)
+
+    def create_plot(self):
+        """
+        Creates the canvas of the plot, which imports matplotlib, and shows that the data is loading until the data is
+        plotted. This is called after the window is first painted, or before that if the data is plotted right away.
+        """
+        if self.plot_created:
+            return
+
+        self.plot_created = True
+        self.graphWidget.canvas.mpl_connect("draw_event", self.on_draw)
+
+        if not self.series:
+            self.graphWidget.canvas.ax.set_facecolor("#19232d")
+            self.graphWidget.canvas.ax.set_title("Loading...", color="white", fontsize=12)
+            self.graphWidget.canvas.draw_idle()
 
     def save_settings(self):
         """Saving the settings from the GUI in a persistent json file."""
@@ -52,7 +137,8 @@ class MainWindow(QtWidgets.QMainWindow):
             "air quality min threshold": self.aqMinSpinBox.value(),
             "temperature warning": self.tWarningCheckBox.isChecked(),
             "temperature min threshold": self.tMinSpinBox.value(),
-            "temperature max threshold": self.tMaxSpinBox.value()
+            "temperature max threshold": self.tMaxSpinBox.value(),
+            "rooms": self.rooms
         }
 
         with open("../resources/settings.json", "w+") as file:
@@ -70,69 +156,266 @@ class MainWindow(QtWidgets.QMainWindow):
         self.tWarningCheckBox.setChecked(settings["temperature warning"])
         self.tMinSpinBox.setValue(settings["temperature min threshold"])
         self.tMaxSpinBox.setValue(settings["temperature max threshold"])
+        self.rooms = settings.get("rooms")
+
+    def update_rooms(self):
+        """
+        Adds a checkable action to the rooms menu for each sensor that does not have one yet, where the checked rooms
+        are shown in the plot. New rooms are checked if every room is shown. The plot is initialized again if any of
+        the new rooms are shown, and always the first time the sensors are loaded.
+        """
+        shown = not self.room_actions
+
+        for sensor_id, name, room in self.data_store.sensors:
+            if sensor_id in self.room_actions:
+                continue
+
+            action = QtWidgets.QAction(room + " (" + name + ")", self)
+            action.setCheckable(True)
+            action.setChecked(self.rooms is None or name in self.rooms)
+            action.toggled.connect(self.toggle_room)
+
+            self.rooms_menu.addAction(action)
+            self.room_actions[sensor_id] = action
+            shown = shown or action.isChecked()
+
+        if shown:
+            self.initialize_plot()
+
+    def toggle_room(self):
+        """Saving which rooms are shown and initializing a new plot with the checked rooms."""
+        names = {sensor_id: name for sensor_id, name, _ in self.data_store.sensors}
+        checked = [names[sensor_id] for sensor_id, action in self.room_actions.items() if action.isChecked()]
+
+        self.rooms = None if len(checked) == len(self.room_actions) else checked
+
+        self.initialize_plot()
+
+    def get_shown_sensors(self):
+        """Finds the sensors of the rooms that are checked in the rooms menu, in the order of the menu."""
+        return [sensor_id for sensor_id, action in self.room_actions.items() if action.isChecked()]
 
     def initialize_plot(self):
-        """Initialize a plot according to the settings set in the GUI. This is called every time the settings change."""
-        # Getting the settings from the GUI and converting them into interval values that can be used for querying.
-        number_rows = self.convert_time_frame(self.timeFrameComboBox.currentText())
+        """
+        Initialize a plot according to the settings set in the GUI. This is called every time the settings change. The
+        data is requested from the data store, which calls plot_data when the data is ready, and a loading state is
+        shown until then.
+        """
+        # Getting the settings from the GUI and converting them into a time range and column that can be used for
+        # querying.
+        end = datetime.datetime.now(datetime.timezone.utc)
+        start = self.get_time_frame_start(self.timeFrameComboBox.currentText(), end)
         data_name = self.convert_data_name(self.dataComboBox.currentText())
 
-        # If we are retrieving a weeks worth of data or more then we want a data point for each hour instead of data
-        # point for each minute, achieved by setting condense to True.
-        condense = False
-        if number_rows >= 10080:
-            condense = True
+        # Showing that the data is loading without clearing the current plot. If the plot has not been created yet it
+        # shows that the data is loading when it is created.
+        self.loading = True
+        self.graphWidget.setCursor(QtCore.Qt.BusyCursor)
+        if self.plot_created:
+            self.graphWidget.canvas.ax.set_title("Loading...", color="white", fontsize=12)
+            self.graphWidget.canvas.draw_idle()
+
+        # Since this is called when the settings change we save the updated settings to the persistent json file.
+        self.save_settings()
 
-        # Getting the last n rows from the database as a list of tuples with the format (time, data) and reversing
-        # the list so they in the correct order.
-        rows = self.aqt_assistant_db.get_sensor_data("time, " + data_name, number_rows, condense)[::-1]
+        # The plot is initialized again when the sensors have been loaded by the data store.
+        if self.data_store.sensors is None:
+            return
 
-        # Extracting the time from every row and adding two hours to get the correct local time.
-        self.x = [row[0] + datetime.timedelta(hours=2) for row in rows]
+        # If we are retrieving a weeks worth of data or more then the data store lets the database aggregate the data
+        # into buckets, where we retrieve at most a single bucket for each pixel in the graph. The data of every shown
+        # room is retrieved with a single query, and any previous request that has not finished yet is cancelled. If
+        # the data has to be queried a coarse preview is plotted first, which is replaced when the data is ready.
+        width = self.graphWidget.width()
+        self.data_store.request(data_name, self.get_shown_sensors(), start, end, width, self.plot_data,
+                                preview_points=int(width * self.PREVIEW_FRACTION), on_failed=self.plot_failed)
 
-        # Extracting the data from every row and casting from Decimal to float.
-        self.y = [float(row[1]) for row in rows]
+    def plot_failed(self, pg_error):
+        """
+        Showing that the data requested by initialize_plot could not be retrieved, for example because the query timed
+        out. This is called by the data store instead of plot_data. The plot is cleared, since the plotted data might
+        not match the settings, and the data is requested again when the settings are changed.
 
-        # Clear the canvas.
+        :param pg_error: The error that made the query fail.
+        """
+        self.series = {}
+        self.bounds = {}
+        self.latest_times = {}
+
+        self.loading = False
+        self.graphWidget.unsetCursor()
+
+        self.create_plot()
+        self.graphWidget.canvas.ax.cla()
+        self.graphWidget.canvas.ax.set_title("Could not load the data: " + str(pg_error).strip().split("\n")[0],
+                                             color="white", fontsize=12)
+        self.draw_plot()
+
+    def plot_data(self, data, bucket, preview=False):
+        """
+        Plotting the data that was requested by initialize_plot. This is called by the data store when the data is
+        ready, and before that with a preview if the data has to be queried, in which case the plot is drawn again in
+        place when the data is ready.
+
+        :param data: A dictionary from each shown sensor to a tuple with the format (times, arrays), where times is the
+        time of each row or bucket as int64 microseconds and arrays is a list containing the values of the column, or
+        the min, avg and max of each bucket.
+        :param bucket: The width of the buckets, or None if the data is not aggregated.
+        :param preview: Flag used to determine whether the data is a coarse preview of the requested data.
+        """
+        # Only importing matplotlib when the first data is plotted, so the window can be shown before it is imported.
+        import matplotlib.dates
+
+        self.series = {}
+        self.bounds = {}
+        self.latest_times = {}
+        now = self.data_store.to_microseconds(datetime.datetime.now(datetime.timezone.utc))
+
+        with CONVERSION_SECONDS.time():
+            for sensor_id, (times, arrays) in data.items():
+                if bucket is not None:
+                    # Saving the minimum and maximum of each bucket so the spread within the bucket can be shown.
+                    y_min, values, y_max = arrays
+                    self.bounds[sensor_id] = (y_min, y_max)
+                else:
+                    values, = arrays
+
+                # Saving the time of the latest row so the live updates only add the rows inserted after it.
+                self.latest_times[sensor_id] = times[-1] if len(times) else now
+
+                # Converting the times, which are in UTC, into numbers that matplotlib can plot. The conversion into the
+                # local time zone is done by matplotlib when the tick labels are drawn.
+                self.series[sensor_id] = SeriesBuffer(matplotlib.dates.date2num(times.view("datetime64[us]")), values)
+
+        # The plot is still loading while the preview is shown, so it is not updated with live data.
+        self.loading = preview
+        if not preview:
+            self.graphWidget.unsetCursor()
+
+        # Clear the canvas, which is created first if the data is ready before the window has been painted.
+        self.create_plot()
         self.graphWidget.canvas.ax.cla()
 
         # Drawing the canvas with all the plot configurations.
         self.draw_plot()
-
-        # Since this is called when the settings change we save the updated settings to the persistent json file.
-        self.save_settings()
+        self.show_metrics()
 
     def update_plot(self):
         """
         Updating the plot with the latest data from the database if the time frame is "Now" or "Today". Updating the
-        plot with the latest data in any of the other time frames would have an insignificant effect.
+        plot with the latest data in any of the other time frames would have an insignificant effect. Only the line is
+        redrawn unless the new data is outside the axes, in which case the whole plot is redrawn.
         """
         time_frame = self.timeFrameComboBox.currentText()
-        if time_frame == "Now" or time_frame == "Today":
+
+        # If the requested data has not been plotted yet, the latest data is included when it is.
+        if time_frame in self.LIVE_TIME_FRAMES and not self.loading:
+            import matplotlib.dates
             data_name = self.convert_data_name(self.dataComboBox.currentText())
 
-            # Getting a tuple with the format (time, temperature).
-            latest = self.aqt_assistant_db.get_sensor_data("time, " + data_name, 1)[0]
+            start = self.get_time_frame_start(time_frame, datetime.datetime.now(datetime.timezone.utc))
+            x_max = self.graphWidget.canvas.ax.get_xlim()[1]
+            y_min, y_max = self.graphWidget.canvas.ax.get_ylim()
+            outside = self.background is None
+
+            for sensor_id, series in self.series.items():
+                # Getting the data of the room within the time frame from the data store, which has just been updated
+                # with the latest rows, and finding the rows that are not plotted yet.
+                times, (values,) = self.data_store.peek(data_name, sensor_id, start)
+
+                first = np.searchsorted(times, self.latest_times[sensor_id], side="right")
+                latest_times, latest_values = times[first:], values[first:]
+
+                if len(latest_times):
+                    self.latest_times[sensor_id] = latest_times[-1]
+
+                # Removing the data that is no longer within the time frame and adding the latest data.
+                series.drop_before(matplotlib.dates.date2num(start))
+                series.extend(matplotlib.dates.date2num(latest_times.view("datetime64[us]")), latest_values)
 
-            # Removing the oldest element and adding the latest for both time and temperature.
-            self.x = self.x[1:] + [latest[0] + datetime.timedelta(hours=2)]
-            self.y = self.y[1:] + [float(latest[1])]
+                if sensor_id in self.lines:
+                    self.lines[sensor_id].set_data(series.x, series.y)
 
-            # Clear the canvas.
-            self.graphWidget.canvas.ax.cla()
+                latest_y = series.y[len(series) - len(latest_values):]
+                outside = outside or (len(series) and series.x[-1] > x_max) or (latest_y < y_min).any() or \
+                    (latest_y > y_max).any()
 
-            # Redrawing the canvas with all the plot configurations.
-            self.draw_plot()
+            # Redrawing the whole plot if the latest data is outside the axes, otherwise only the lines are redrawn.
+            if outside:
+                self.graphWidget.canvas.ax.cla()
+                self.draw_plot()
+            else:
+                self.blit_lines()
+
+            self.show_metrics()
+
+    def redraw_plot(self):
+        """
+        Redrawing the plot with the data that is already plotted. This is called when only the thresholds change, since
+        that does not change the data. The thresholds are drawn when the plot is created if it has not been yet.
+        """
+        if not self.plot_created:
+            return
 
+        self.graphWidget.canvas.ax.cla()
+        self.draw_plot()
+
+        self.save_settings()
+
+    def on_draw(self, event):
+        """
+        Saving the background of the plot every time the whole canvas is drawn, which includes when the window is
+        resized, and drawing the lines on top of it since the lines are excluded from the normal drawing.
+        """
+        self.background = self.graphWidget.canvas.copy_from_bbox(self.graphWidget.canvas.ax.bbox)
+
+        for line in self.lines.values():
+            self.graphWidget.canvas.ax.draw_artist(line)
+
+    @metrics.timed(BLIT_SECONDS)
+    def blit_lines(self):
+        """Redrawing only the lines by drawing them on top of the saved background and repainting the axes area."""
+        self.graphWidget.canvas.restore_region(self.background)
+
+        for line in self.lines.values():
+            self.graphWidget.canvas.ax.draw_artist(line)
+
+        self.graphWidget.canvas.blit(self.graphWidget.canvas.ax.bbox)
+
+    @metrics.timed(DRAW_SECONDS)
     def draw_plot(self):
         """Drawing the plot completely by plotting the data and drawing the canvas specific stuff like labels."""
-        # Plotting the data by converting the datetime objects from the database into numbers that matplotlib can plot.
-        self.graphWidget.canvas.ax.plot_date(matplotlib.dates.date2num(self.x), self.y, 'r', color="#0088DE")
+        rooms = {sensor_id: room for sensor_id, _, room in self.data_store.sensors or []}
+        self.lines = {}
+
+        for index, (sensor_id, series) in enumerate(self.series.items()):
+            color = self.ROOM_COLORS[index % len(self.ROOM_COLORS)]
+
+            # Plotting the data of each room as an animated line, meaning that it is excluded from the normal drawing
+            # of the canvas so the background can be saved without it. The times are shown in the local time zone.
+            self.lines[sensor_id], = self.graphWidget.canvas.ax.plot_date(series.x, series.y, 'r', color=color,
+                                                                          tz=self.LOCAL_TIMEZONE, animated=True,
+                                                                          label=rooms.get(sensor_id))
+
+            # If the data is aggregated into buckets we shade the area between the minimum and maximum of each bucket.
+            if sensor_id in self.bounds:
+                y_min, y_max = self.bounds[sensor_id]
+                self.graphWidget.canvas.ax.fill_between(series.x, y_min, y_max, color=color, alpha=0.3, linewidth=0)
+
+        # If the plot is updated with live data we leave room for the data after the latest data point.
+        time_frame = self.timeFrameComboBox.currentText()
+        plotted = [series for series in self.series.values() if len(series)]
+        if time_frame in self.LIVE_TIME_FRAMES and plotted:
+            headroom = self.convert_time_frame(time_frame).total_seconds() / 86400 * self.LIVE_HEADROOM
+            self.graphWidget.canvas.ax.set_xlim(min(series.x[0] for series in plotted),
+                                                max(series.x[-1] for series in plotted) + headroom)
 
         data_name = self.dataComboBox.currentText()
 
+        # If multiple rooms are shown the legend tells the lines of the rooms apart.
+        lines = list(self.lines.values()) if len(self.lines) > 1 else []
+
         if data_name == "Air quality" or data_name == "Temperature":
-            lines = []
             # If we are plotting air quality we draw the min air quality threshold.
             if data_name == "Air quality":
                 lines.append(self.graphWidget.canvas.ax.axhline(y=self.aqMinSpinBox.value(), label="Min threshold",
@@ -144,6 +427,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 lines.append(self.graphWidget.canvas.ax.axhline(y=self.tMaxSpinBox.value(), label="Max threshold",
                                                                 color="red"))
 
+        if lines:
             # Setting the legend, including the background and edge color.
             legend = self.graphWidget.canvas.ax.legend(handles=lines, facecolor="#19232d", edgecolor="#19232d", loc=1)
 
@@ -164,23 +448,49 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.graphWidget.canvas.draw()
 
+    def show_metrics(self):
+        """Showing the latest timings of the query and the plot in the status bar, if the metrics are enabled."""
+        if not metrics.enabled:
+            return
+
+        timings = [("Query", QUERY_SECONDS), ("Fetch", FETCH_SECONDS), ("Conversion", CONVERSION_SECONDS),
+                   ("Draw", DRAW_SECONDS), ("Blit", BLIT_SECONDS)]
+
+        self.statusbar.showMessage(" | ".join(name + ": " + ("-" if histogram.last is None else
+                                                             str(round(histogram.last * 1000, 1)) + " ms")
+                                              for name, histogram in timings))
+
+    def get_time_frame_start(self, time_frame, end):
+        """
+        Finds the start of the time range that corresponds to the time frame from the combobox.
+
+        :param time_frame: The time frame that we find the start of.
+        :param end: The end of the time range.
+        :return: The start of the time range, or None for "All time" where the range starts at the first row.
+        """
+        duration = self.convert_time_frame(time_frame)
+
+        if duration is None:
+            return None
+
+        return end - duration
+
     @staticmethod
     def convert_time_frame(time_frame):
         """
-        Converts the time frame from the combobox into an internal value that can be used to query the corresponding
-        amount of rows from the database. The value corresponds to the number of minutes in the time frame.
+        Converts the time frame from the combobox into the duration of the time frame, which is used to find the
+        wall-clock time range that should be queried from the database.
 
-        :param time_frame: The time frame that we convert into a value.
-        :return: The value that corresponds to the time_frame argument.
+        :param time_frame: The time frame that we convert into a duration.
+        :return: The duration that corresponds to the time_frame argument, or None if the time frame covers all data.
         """
         return {
-            "Now": 60,
-            "Today": 1440,
-            "This week": 10080,
-            "This month": 43829,
-            "This year": 525949,
-            # Using a number that is large enough to ensure that all rows are queried.
-            "All time": 946707779
+            "Now": datetime.timedelta(hours=1),
+            "Today": datetime.timedelta(days=1),
+            "This week": datetime.timedelta(weeks=1),
+            "This month": datetime.timedelta(days=30.44),
+            "This year": datetime.timedelta(days=365.25),
+            "All time": None
         }[time_frame]
 
     @staticmethod
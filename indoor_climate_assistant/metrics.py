@@ -0,0 +1,275 @@
+"""
+Metrics file for measuring where the time goes in the hot paths of the Raspberry Pi and the desktop application, such as
+reading the sensor, inserting and querying the measurements and drawing the plot. The metrics are counters, gauges and
+histograms that are kept in memory and rendered in the Prometheus text format, which can be served by a local HTTP
+endpoint so the metrics can be scraped by Prometheus or read with curl.
+
+The metrics are disabled by default. While they are disabled recording a metric only checks a flag and timing a block
+uses a shared context manager that does nothing, so the instrumentation costs close to nothing.
+"""
+import bisect
+import contextlib
+import functools
+import http.server
+import math
+import threading
+import time
+
+# The upper bounds of the histogram buckets in seconds, from a tenth of a millisecond to ten seconds.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+# The content type of the Prometheus text format.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Whether the metrics are recorded. This is set by enable.
+enabled = False
+
+# The metrics that have been created, by name, in the order they were created.
+registry = {}
+
+# Context manager used instead of a timer while the metrics are disabled.
+NULL_TIMER = contextlib.nullcontext()
+
+
+class Counter:
+    """
+    Metric counting how many times something has happened, such as the number of inserted rows.
+    """
+    type = "counter"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Increases the counter by the given amount if the metrics are enabled."""
+        if not enabled:
+            return
+
+        with self.lock:
+            self.value += amount
+
+    def render(self):
+        """Renders the samples of the counter in the Prometheus text format."""
+        return [self.name + " " + format_value(self.value)]
+
+
+class Gauge:
+    """
+    Metric with a value that can go up and down, such as the number of samples waiting in a queue.
+    """
+    type = "gauge"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def set(self, value):
+        """Sets the value of the gauge if the metrics are enabled."""
+        if enabled:
+            self.value = value
+
+    def render(self):
+        """Renders the samples of the gauge in the Prometheus text format."""
+        return [self.name + " " + format_value(self.value)]
+
+
+class Histogram:
+    """
+    Metric counting the observed values, usually durations in seconds, in buckets with fixed upper bounds, so the
+    distribution of the values can be seen and not only the average. The last observed value is saved as well, so it
+    can be shown while the application runs.
+    """
+    type = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+
+        # The number of values in each bucket, where the last bucket contains the values above the largest bound.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.last = None
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        """Adds a value to the histogram if the metrics are enabled."""
+        if not enabled:
+            return
+
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            self.last = value
+
+    def time(self):
+        """
+        Creates a context manager that observes the number of seconds spent in the block. While the metrics are disabled
+        a shared context manager that does nothing is returned instead.
+        """
+        return Timer(self) if enabled else NULL_TIMER
+
+    def render(self):
+        """Renders the samples of the histogram in the Prometheus text format, where the buckets are cumulative."""
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+
+        lines = []
+        cumulative = 0
+
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            lines.append(self.name + '_bucket{le="' + format_value(bound) + '"} ' + str(cumulative))
+
+        lines.append(self.name + "_sum " + format_value(total))
+        lines.append(self.name + "_count " + str(count))
+
+        return lines
+
+
+class Timer:
+    """
+    Context manager that observes the number of seconds spent in the block in a histogram.
+    """
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Request handler that responds with the rendered metrics at /metrics.
+    """
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render().encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Not printing every scrape, since the output of the Raspberry pi is used for the sampling reports.
+        pass
+
+
+def enable():
+    """Enables the metrics, so the metrics are recorded from now on."""
+    global enabled
+    enabled = True
+
+
+def get_metric(metric_type, name, *args):
+    """
+    Gets the metric with the given name, which is created the first time, so a metric can be defined in every module
+    that records it.
+
+    :param metric_type: The class of the metric.
+    :param name: The name of the metric, which should be unique.
+    :param args: The arguments given to the class if the metric is created.
+    :return: The metric with the given name.
+    """
+    metric = registry.get(name)
+
+    if metric is None:
+        metric = registry[name] = metric_type(name, *args)
+    elif not isinstance(metric, metric_type):
+        raise ValueError("The metric " + name + " is already defined as a " + metric.type)
+
+    return metric
+
+
+def counter(name, description):
+    """Gets the counter with the given name, see get_metric."""
+    return get_metric(Counter, name, description)
+
+
+def gauge(name, description):
+    """Gets the gauge with the given name, see get_metric."""
+    return get_metric(Gauge, name, description)
+
+
+def histogram(name, description, buckets=DEFAULT_BUCKETS):
+    """Gets the histogram with the given name, see get_metric."""
+    return get_metric(Histogram, name, description, buckets)
+
+
+def timed(histogram):
+    """
+    Decorator that observes the number of seconds spent in each call of the decorated function in the given histogram.
+
+    :param histogram: The histogram that the durations are observed in.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with histogram.time():
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def format_value(value):
+    """Formats a number in the Prometheus text format, where infinity is written as +Inf."""
+    if value == math.inf:
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """
+    Renders every metric in the Prometheus text format.
+
+    :return: A string with the help text, type and samples of each metric.
+    """
+    lines = []
+
+    for metric in list(registry.values()):
+        lines.append("# HELP " + metric.name + " " + metric.description)
+        lines.append("# TYPE " + metric.name + " " + metric.type)
+        lines.extend(metric.render())
+
+    return "\n".join(lines) + "\n"
+
+
+def serve(port, host="127.0.0.1"):
+    """
+    Serves the metrics in the Prometheus text format at http://host:port/metrics from a background thread. The metrics
+    are enabled as well, since there is nothing to serve otherwise.
+
+    :param port: The port of the endpoint.
+    :param host: The address the endpoint listens on, which is only reachable from the same machine by default.
+    :return: The HTTP server, which can be stopped with shutdown.
+    """
+    enable()
+
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+
+    return server
@@ -1,32 +1,50 @@
 from PyQt5 import QtWidgets
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as Canvas
-import matplotlib
 
-# Ensure using PyQt5 backend.
-matplotlib.use('QT5Agg')
 
-
-class MplCanvas(Canvas):
+def create_canvas():
     """
-    Matplotlib canvas used to create figure.
+    Creates the matplotlib canvas used to create figure. Matplotlib is only imported when the first canvas is created,
+    since importing it takes longer than creating the rest of the main window, so the window can be shown before it is
+    imported.
     """
-    def __init__(self):
-        self.fig = Figure(facecolor="#19232d")
-        self.ax = self.fig.add_subplot(111)
-        self.fig.set_tight_layout(True)
-        Canvas.__init__(self, self.fig)
-        Canvas.setSizePolicy(self, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
-        Canvas.updateGeometry(self)
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as Canvas
+    import matplotlib
+
+    # Ensure using PyQt5 backend.
+    matplotlib.use('QT5Agg')
+
+    class MplCanvas(Canvas):
+        """
+        Matplotlib canvas used to create figure.
+        """
+        def __init__(self):
+            self.fig = Figure(facecolor="#19232d")
+            self.ax = self.fig.add_subplot(111)
+            self.fig.set_tight_layout(True)
+            Canvas.__init__(self, self.fig)
+            Canvas.setSizePolicy(self, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+            Canvas.updateGeometry(self)
+
+    return MplCanvas()
 
 
 class MplWidget(QtWidgets.QWidget):
     """
-    Matplotlib widget that is used in the GUI to display a matplotlib graph.
+    Matplotlib widget that is used in the GUI to display a matplotlib graph. The canvas is created the first time it is
+    used, so the widget is empty until then.
     """
     def __init__(self, parent=None):
         QtWidgets.QWidget.__init__(self, parent)
-        self.canvas = MplCanvas()
+        self.mpl_canvas = None
         self.vbl = QtWidgets.QVBoxLayout()
-        self.vbl.addWidget(self.canvas)
         self.setLayout(self.vbl)
+
+    @property
+    def canvas(self):
+        """The matplotlib canvas of the widget, which is created and added to the widget when it is first used."""
+        if self.mpl_canvas is None:
+            self.mpl_canvas = create_canvas()
+            self.vbl.addWidget(self.mpl_canvas)
+
+        return self.mpl_canvas
@@ -1,31 +1,186 @@
 """
 This file should be run from the Raspberry pi zero that is connected to the bme680 sensor. Running this file starts an
 infinite loop that inserts data into the PostgreSQL database.
+
+Usage: python pi_zero.py [--sensor NAME] [--room ROOM] [--high-frequency] [--retention-days DAYS] [--burn-in]
+[--metrics-port PORT], where --sensor and --room register the sensor and the room it is placed in (the living room by
+default), --high-frequency additionally stores every reading in the raw table, which keeps the readings from the last
+DAYS days (7 by default), --burn-in burns in the sensor even if a recent gas baseline has been saved and --metrics-port
+serves the timings of the sensor reads and insertions at http://localhost:PORT/metrics in the Prometheus text format.
+Every room runs its own Raspberry pi with a unique sensor name, and all of them insert into the same database. Since the
+raw table is shared by the sensors, its readings are kept for the longest DAYS of any sensor in the capture mode.
+
+The readings can also be simulated or replayed from exported data to load test the pipeline without the sensor, for
+example: python pi_zero.py --source simulated --speed 1000 --start 2020-01-01 --config local_database_config.json,
+which inserts a simulated day every 86 seconds starting from the given date.
 """
-from indoor_climate_assistant.database import Database
-import time
-from indoor_climate_assistant import sensor
+from indoor_climate_assistant.database import Database, SENSOR_COLUMNS, RAW_TABLE, DATABASE_CONFIG_PATH, \
+    DEFAULT_SENSOR, DEFAULT_ROOM
+from indoor_climate_assistant.ingestion import IngestionWriter, RAW_SPOOL_PATH
+from indoor_climate_assistant.acquisition import AcquisitionLoop
+from indoor_climate_assistant.gas_baseline import GasBaseline
+from indoor_climate_assistant.sensor_sources import BME680Source, SimulatedSource, ReplaySource
+from indoor_climate_assistant import metrics
+import argparse
+import datetime
+import psycopg2
+import signal
+import sys
+
+# The metric of the readings that are skipped since the gas resistance was not stable or the reading failed.
+INCOMPLETE_READINGS = metrics.counter("aqt_sensor_incomplete_readings_total", "Number of readings without a value for "
+                                                                              "each column.")
 
 if __name__ == '__main__':
-    # Creating a connection to the PostgreSQL database.
-    aqtassistant_db = Database()
+    parser = argparse.ArgumentParser(description="Inserts data from the bme680 sensor into the PostgreSQL database.")
+    parser.add_argument("--sensor", default=DEFAULT_SENSOR, help="The unique name of the sensor.")
+    parser.add_argument("--room", default=DEFAULT_ROOM, help="The room that the sensor is placed in.")
+    parser.add_argument("--high-frequency", action="store_true", help="Store every reading in the raw table.")
+    parser.add_argument("--retention-days", type=float, default=7, help="The amount of days the raw table is kept.")
+    parser.add_argument("--burn-in", action="store_true", help="Burn in the sensor instead of reusing the saved gas "
+                                                               "baseline.")
+    parser.add_argument("--source", choices=["bme680", "simulated", "replay"], default="bme680",
+                        help="Where the readings are taken from.")
+    parser.add_argument("--replay-file", help="The csv file with exported data used by the replay source.")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="The fraction of faulty simulated readings.")
+    parser.add_argument("--speed", type=float, default=1.0, help="How many times faster than real time the simulated "
+                                                                 "or replayed readings are taken.")
+    parser.add_argument("--start", type=lambda date: datetime.datetime.strptime(date, "%Y-%m-%d").astimezone(),
+                        help="The date of the first simulated or replayed reading, given as YYYY-MM-DD.")
+    parser.add_argument("--config", default=DATABASE_CONFIG_PATH, help="The database config file.")
+    parser.add_argument("--metrics-port", type=int, help="Serve the metrics at http://localhost:PORT/metrics.")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="The address the metrics are served on.")
+    args = parser.parse_args()
+
+    if args.source == "replay" and args.replay_file is None:
+        parser.error("--replay-file is required by the replay source")
+
+    if args.source == "bme680" and (args.speed != 1.0 or args.start is not None):
+        parser.error("--speed and --start can only be used with the simulated and replay sources")
+
+    # The simulated and replayed readings are timed by a simulated clock, which advances a second for every tick of the
+    # acquisition loop, so they can be taken faster than real time.
+    start = args.start or datetime.datetime.now(datetime.timezone.utc)
+    clock = None if args.source == "bme680" else lambda tick: start + datetime.timedelta(seconds=tick)
+
+    if args.source == "simulated":
+        source = SimulatedSource(fault_rate=args.fault_rate)
+    elif args.source == "replay":
+        source = ReplaySource(args.replay_file, start)
+    else:
+        source = BME680Source()
 
-    gas_baseline = sensor.burn_in_sensor()
+    # Serving the metrics before the sensor is burned in, so the endpoint is available right away.
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port, args.metrics_host)
 
-    counter = 0
-    # Wrapping the infinite loop in a try-except to support command line keyboard interruption.
+    # The retention of the raw readings, which is registered with the sensor so the raw partitions are only dropped once
+    # they are older than the longest retention of any sensor.
+    raw_retention = datetime.timedelta(days=args.retention_days) if args.high_frequency else None
+
+    def set_up_database():
+        """
+        Ensures that the tables exist and registers the sensor, after which the data of the original single room setup
+        is moved into the partitioned tables as data of the living room sensor. The statement timeout is disabled since
+        migrating the existing data can take a while.
+
+        :return: The id of the sensor.
+        """
+        aqtassistant_db = Database(args.config, statement_timeout=0, connect_attempts=1)
+
+        try:
+            aqtassistant_db.create_tables()
+            sensor_id = aqtassistant_db.register_sensor(args.sensor, args.room, raw_retention)
+            aqtassistant_db.migrate_legacy_tables()
+        finally:
+            aqtassistant_db.close()
+
+        return sensor_id
+
+    # If the database cannot be reached the readings are spooled right away, and the database is set up by the writers
+    # once it can be reached, so the readings are not lost if the Raspberry pi starts while the database is down.
     try:
-        while True:
-            counter += 1
+        sensor_id = set_up_database()
+    except (Exception, psycopg2.Error) as pg_error:
+        print("Error while setting up PostgreSQL, spooling until it can be reached: " + str(pg_error))
+        sensor_id = None
+
+    # Creating the writer for the measurements table. Since it only receives a reading every minute, each reading is
+    # inserted right away instead of being batched, so the desktop application and the warnings get it without delay.
+    # Only the raw writer batches the readings, and both writers spool the readings while the database is unreachable.
+    writer = IngestionWriter(sensor_id, args.config, batch_size=1, setup=set_up_database)
 
-            # Getting the current data from the bme680 sensor.
-            data = sensor.get_sensor_data(gas_baseline)
+    # In the high-frequency capture mode every reading is also inserted into the raw table, which only keeps the
+    # readings within the retention so the storage used by it stays bounded.
+    raw_writer = None
+    if args.high_frequency:
+        raw_writer = IngestionWriter(sensor_id, args.config, spool_path=RAW_SPOOL_PATH, batch_size=300, table=RAW_TABLE,
+                                     retention=raw_retention, setup=set_up_database)
 
-            # Every 60 seconds we insert the data into the database.
-            if counter % 60 == 0:
-                aqtassistant_db.insert_sensor_data(data)
+    # Reusing the saved gas baseline if it is recent, so the sensor only has to be burned in for 5 minutes the first
+    # time or after it has been turned off for a while. The baseline of the other sources is not saved since it does
+    # not belong to the sensor.
+    if args.source == "bme680":
+        gas_baseline = None if args.burn_in else GasBaseline.load()
+        if gas_baseline is None:
+            gas_baseline = GasBaseline(source.burn_in())
+            gas_baseline.save()
+    else:
+        gas_baseline = GasBaseline(source.burn_in(), path=None)
 
-            time.sleep(1)
+    def read(measured_at):
+        """Reads the source and lets the gas baseline adapt to the gas resistance in the reading."""
+        data = source.read(gas_baseline.value, measured_at)
+
+        if len(data) == len(SENSOR_COLUMNS):
+            gas_baseline.update(data[3])
+        else:
+            INCOMPLETE_READINGS.inc()
+
+        return data
+
+    # The start of the latest minute that a reading has been added to the writer for the measurements table for.
+    last_minute = None
+
+    def store(tick, data, measured_at):
+        """Adds a reading to the writers. This is called in the consumer thread of the acquisition loop."""
+        global last_minute
+
+        # Saving the gas baseline every now and then so it can be reused if the program is restarted.
+        gas_baseline.save_if_due()
+
+        # Readings without a stable gas resistance are skipped since they do not contain a value for each column.
+        if len(data) == len(SENSOR_COLUMNS):
+            if raw_writer is not None:
+                raw_writer.add(data, measured_at)
+
+            # Every minute we add the first complete reading within the minute to the writer for the measurements
+            # table, so a minute is not lost if the reading at the start of it was skipped or incomplete.
+            minute = measured_at.replace(second=0, microsecond=0)
+            if last_minute is None or minute > last_minute:
+                writer.add(data, measured_at)
+                last_minute = minute
+
+    # Getting the current data from the source every second, while the data is inserted into the database in the
+    # consumer thread of the loop so a slow insertion does not delay the readings.
+    acquisition = AcquisitionLoop(read, store, interval=1.0 / args.speed, clock=clock)
+
+    # Stopping the loop with a SystemExit when the program is stopped by systemd, so the remaining data is inserted in
+    # the same way as when the program is interrupted from the command line.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Wrapping the infinite loop in a try-finally so the remaining data is inserted however the loop ends, which is
+    # either a keyboard interruption, a SIGTERM or an error while reading the sensor. An error is raised again after
+    # the data has been inserted, so the program exits with an error and can be restarted.
+    try:
+        acquisition.run()
     except KeyboardInterrupt:
-        # Closing the database connection if execution is halted.
-        aqtassistant_db.close()
+        pass
+    finally:
+        # Inserting the remaining data and closing the database connection, after the loop has added the readings that
+        # were still queued to the writers.
+        gas_baseline.save()
+        writer.close()
+
+        if raw_writer is not None:
+            raw_writer.close()
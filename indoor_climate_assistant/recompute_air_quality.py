@@ -0,0 +1,44 @@
+"""
+This file recalculates the air quality of the measurements of a sensor with the given gas baseline, for example after
+the sensor has been burned in again or the weighting between humidity and gas resistance has been changed. The
+measurements are processed in chunks, so it can be run on the Raspberry pi zero while measurements are inserted.
+
+Usage: python recompute_air_quality.py GAS_BASELINE [--sensor NAME] [--weighting WEIGHTING] [--start YYYY-MM-DD]
+[--end YYYY-MM-DD] [--config PATH], where the gas baseline is given in Ohms.
+"""
+import argparse
+import datetime
+
+from indoor_climate_assistant.database import Database, DATABASE_CONFIG_PATH, DEFAULT_SENSOR
+from indoor_climate_assistant.sensor import HUMIDITY_WEIGHTING
+
+
+def parse_date(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%d")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recalculates the air quality of the recorded measurements.")
+    parser.add_argument("gas_baseline", type=float, help="The gas baseline in Ohms.")
+    parser.add_argument("--sensor", default=DEFAULT_SENSOR, help="The name of the sensor that took the measurements.")
+    parser.add_argument("--weighting", type=float, default=HUMIDITY_WEIGHTING,
+                        help="The balance between humidity and gas resistance in the air quality.")
+    parser.add_argument("--start", type=parse_date, help="The start of the time range that is recalculated.")
+    parser.add_argument("--end", type=parse_date, help="The end of the time range that is recalculated.")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="The measurements updated in each transaction.")
+    parser.add_argument("--config", default=DATABASE_CONFIG_PATH, help="The database config file.")
+    args = parser.parse_args()
+
+    # Disabling the statement timeout since recomputing the rollup tables of a large table can take a while.
+    aqtassistant_db = Database(args.config, statement_timeout=0)
+
+    sensor_ids = {name: sensor_id for sensor_id, name, _ in aqtassistant_db.get_sensors()}
+    if args.sensor not in sensor_ids:
+        aqtassistant_db.close()
+        parser.error("unknown sensor: " + args.sensor)
+
+    updated = aqtassistant_db.recompute_air_quality(sensor_ids[args.sensor], args.gas_baseline, args.weighting,
+                                                    args.start, args.end, args.chunk_size)
+    print("Recalculated the air quality of " + str(updated) + " measurements")
+
+    aqtassistant_db.close()
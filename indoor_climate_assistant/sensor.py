@@ -4,31 +4,58 @@ the process of inserting the data into a database.
 
 The output consists of temperature (C), air pressure (hPa), humidity (%RH), gas resistance (Ohms) and air quality (%).
 """
-import bme680
 import time
 
-try:
-    sensor = bme680.BME680(bme680.I2C_ADDR_PRIMARY)
-except IOError:
-    sensor = bme680.BME680(bme680.I2C_ADDR_SECONDARY)
+import numpy as np
 
-# Since the sensor is not factory calibrated we need to add a temperature offset. This also ensures that the
-# correct temperature is used when calculating air pressure and humidity.
-sensor.set_temp_offset(-4)
+# The humidity that gives the best humidity score, 40% being an optimal indoor humidity.
+HUMIDITY_BASELINE = 40.0
 
-# Oversample settings set the trade-off between accuracy and noise. Higher oversampling = less noise, less accuracy.
-sensor.set_humidity_oversample(bme680.OS_2X)
-sensor.set_pressure_oversample(bme680.OS_4X)
-sensor.set_temperature_oversample(bme680.OS_8X)
+# The balance between humidity and gas resistance in the air quality (25:75, humidity:gas).
+HUMIDITY_WEIGHTING = 0.25
 
-# The filter setting protects against momentary changes in the environment, like a door slamming.
-sensor.set_filter(bme680.FILTER_SIZE_3)
+# The bme680 sensor, which is set up the first time it is used so this file can be imported without the sensor hardware,
+# for example to calculate the air quality of simulated readings.
+sensor = None
 
-# Settings regarding the gas resistance reading.
-sensor.set_gas_status(bme680.ENABLE_GAS_MEAS)
-sensor.set_gas_heater_temperature(320)
-sensor.set_gas_heater_duration(150)
-sensor.select_gas_heater_profile(0)
+
+def get_sensor():
+    """
+    Sets up the bme680 sensor the first time it is called and returns it.
+
+    :return: The configured bme680 sensor.
+    """
+    global sensor
+
+    if sensor is not None:
+        return sensor
+
+    import bme680
+
+    try:
+        sensor = bme680.BME680(bme680.I2C_ADDR_PRIMARY)
+    except IOError:
+        sensor = bme680.BME680(bme680.I2C_ADDR_SECONDARY)
+
+    # Since the sensor is not factory calibrated we need to add a temperature offset. This also ensures that the
+    # correct temperature is used when calculating air pressure and humidity.
+    sensor.set_temp_offset(-4)
+
+    # Oversample settings set the trade-off between accuracy and noise. Higher oversampling = less noise, less accuracy.
+    sensor.set_humidity_oversample(bme680.OS_2X)
+    sensor.set_pressure_oversample(bme680.OS_4X)
+    sensor.set_temperature_oversample(bme680.OS_8X)
+
+    # The filter setting protects against momentary changes in the environment, like a door slamming.
+    sensor.set_filter(bme680.FILTER_SIZE_3)
+
+    # Settings regarding the gas resistance reading.
+    sensor.set_gas_status(bme680.ENABLE_GAS_MEAS)
+    sensor.set_gas_heater_temperature(320)
+    sensor.set_gas_heater_duration(150)
+    sensor.select_gas_heater_profile(0)
+
+    return sensor
 
 
 def get_sensor_data(gas_baseline):
@@ -39,6 +66,7 @@ def get_sensor_data(gas_baseline):
     :param gas_baseline: The gas baseline obtained from the burn in period.
     :return: A string containing all data in the requested format.
     """
+    sensor = get_sensor()
     output = []
 
     if sensor.get_sensor_data():
@@ -60,7 +88,7 @@ def get_sensor_data(gas_baseline):
     return output
 
 
-def get_air_quality(gas_resistance, humidity, gas_baseline):
+def get_air_quality(gas_resistance, humidity, gas_baseline, hum_weighting=HUMIDITY_WEIGHTING):
     """
     Runs the sensor for a burn-in period, then uses a combination of relative humidity and gas resistance
     to estimate indoor air quality as a percentage.
@@ -68,14 +96,10 @@ def get_air_quality(gas_resistance, humidity, gas_baseline):
     :param gas_resistance: Current gas resistance from the bme680 sensor.
     :param humidity: Current humidity from the bme680 sensor.
     :param gas_baseline: The gas baseline obtained from the burn in period.
+    :param hum_weighting: The balance between humidity and gas reading in the air quality.
     :return: Air quality based on the gas resistance and humidity.
     """
-    # Set the humidity baseline to 40%, an optimal indoor humidity.
-    hum_baseline = 40.0
-
-    # This sets the balance between humidity and gas reading in the calculation of air_quality_score
-    # (25:75, humidity:gas)
-    hum_weighting = 0.25
+    hum_baseline = HUMIDITY_BASELINE
 
     gas = gas_resistance
     gas_offset = gas_baseline - gas
@@ -108,6 +132,33 @@ def get_air_quality(gas_resistance, humidity, gas_baseline):
     return air_quality_score
 
 
+def get_air_quality_array(gas_resistance, humidity, gas_baseline, hum_weighting=HUMIDITY_WEIGHTING):
+    """
+    Calculates the air quality in the same way as get_air_quality for whole arrays of readings at once. This is used
+    to recalculate the air quality of the recorded readings, for example with a new gas baseline or weighting.
+
+    :param gas_resistance: Array of gas resistance readings.
+    :param humidity: Array of humidity readings.
+    :param gas_baseline: The gas baseline, either a single value or an array with a baseline for each reading.
+    :param hum_weighting: The balance between humidity and gas reading in the air quality.
+    :return: Array of the air quality of each reading, which is NaN if the gas resistance or humidity is NaN.
+    """
+    gas_resistance = np.asarray(gas_resistance, dtype=np.float64)
+    humidity = np.asarray(humidity, dtype=np.float64)
+    gas_baseline = np.asarray(gas_baseline, dtype=np.float64)
+
+    # The humidity score decreases linearly from the humidity baseline towards both 0% and 100%.
+    hum_offset = humidity - HUMIDITY_BASELINE
+    hum_score = np.where(hum_offset > 0, (100 - humidity) / (100 - HUMIDITY_BASELINE), humidity / HUMIDITY_BASELINE)
+    hum_score *= hum_weighting * 100
+
+    # The gas score is the full score when the gas resistance is at or above the gas baseline.
+    gas_score = np.minimum(gas_resistance / gas_baseline, 1.0)
+    gas_score *= 100 - hum_weighting * 100
+
+    return hum_score + gas_score
+
+
 def burn_in_sensor(burn_in_time=300):
     """
     Warms up the sensor for the specified amount of time to optimize the gas resistance data readings.
@@ -116,19 +167,23 @@ def burn_in_sensor(burn_in_time=300):
     The recommend time is 5 minutes for optimal results.
     :return: A gas baseline that can be used for calculating air quality.
     """
+    sensor = get_sensor()
+
     # Start time and current time are used to to handle the burn in time of 5 minutes.
-    start_time = time.time()
-    curr_time = time.time()
+    start_time = time.monotonic()
+    curr_time = time.monotonic()
 
     burn_in_data = []
 
     # Collect gas resistance burn-in values, then use the average of the last 50 values to set the upper limit
-    # for calculating gas_baseline.
-    while curr_time - start_time < burn_in_time:
-        curr_time = time.time()
+    # for calculating gas_baseline. The burn in continues until at least one stable value has been collected.
+    while curr_time - start_time < burn_in_time or not burn_in_data:
+        curr_time = time.monotonic()
         if sensor.get_sensor_data() and sensor.data.heat_stable:
             gas = sensor.data.gas_resistance
             burn_in_data.append(gas)
-            time.sleep(1)
 
-    return sum(burn_in_data[-50:]) / 50.0
+        # Sleeping even if the reading was not stable, since retrying right away would keep the CPU busy.
+        time.sleep(1)
+
+    return sum(burn_in_data[-50:]) / len(burn_in_data[-50:])
@@ -0,0 +1,160 @@
+"""
+Sensor sources file for the sources that the readings can be taken from. Besides the bme680 sensor itself, the readings
+can be generated by a simulator or replayed from exported measurements, so the ingestion, the queries and the
+plotting can be tested and benchmarked without the sensor hardware. Every source returns readings in the same format as
+sensor.get_sensor_data, which is a list with the temperature (C), air pressure (hPa), humidity (%RH), gas resistance
+(Ohms) and air quality (%), or fewer values if the reading is incomplete.
+"""
+import bisect
+import csv
+import datetime
+import math
+import random
+
+import dateutil.parser
+
+from indoor_climate_assistant.database import SENSOR_COLUMNS
+
+
+class BME680Source:
+    """
+    Source that reads from the bme680 sensor. The sensor is only set up when this source is used.
+    """
+    def __init__(self):
+        from indoor_climate_assistant import sensor
+        self.sensor = sensor
+
+    def burn_in(self):
+        """Burns in the sensor and returns the gas baseline."""
+        return self.sensor.burn_in_sensor()
+
+    def read(self, gas_baseline, measured_at):
+        """Reads the sensor. The measurement time is not used since the sensor is read right away."""
+        return self.sensor.get_sensor_data(gas_baseline)
+
+
+class SimulatedSource:
+    """
+    Source that generates readings following a daily pattern, where the temperature peaks in the afternoon and the gas
+    resistance drops in the evening when the room is in use. Noise is added to every reading and a fraction of the
+    readings can be made faulty, to test how the rest of the pipeline handles incomplete, failed and spiking readings.
+    """
+    # The kinds of faults that can be simulated.
+    FAULTS = ["unstable", "failed", "spike"]
+
+    def __init__(self, noise=1.0, fault_rate=0.0, clean_gas_resistance=200000, seed=None):
+        """
+        :param noise: The scale of the noise added to the readings, where 0 gives noiseless readings.
+        :param fault_rate: The fraction of the readings that are faulty.
+        :param clean_gas_resistance: The gas resistance in Ohms when the room is not in use.
+        :param seed: The seed of the random generator, so the same readings can be generated again.
+        """
+        self.noise = noise
+        self.fault_rate = fault_rate
+        self.clean_gas_resistance = clean_gas_resistance
+        self.random = random.Random(seed)
+
+        # The air pressure is a random walk around the standard pressure, since it does not follow a daily pattern.
+        self.pressure = 1013.25
+
+        # The air quality is calculated the same way as for the bme680 sensor. Since the sensor is only set up when it
+        # is used, this does not require the sensor hardware.
+        from indoor_climate_assistant import sensor
+        self.sensor = sensor
+
+    def burn_in(self):
+        """The simulated sensor does not need to burn in, so the clean gas resistance is used as the gas baseline."""
+        return self.clean_gas_resistance
+
+    def read(self, gas_baseline, measured_at):
+        """
+        Generates the reading at the given time.
+
+        :param gas_baseline: The gas baseline used to calculate the air quality.
+        :param measured_at: The time of the reading, which decides where in the daily pattern the reading is.
+        :return: The reading in the same format as sensor.get_sensor_data.
+        """
+        # The fraction of the local day that has passed, which is 0 at midnight.
+        local_time = measured_at.astimezone()
+        day = (local_time.hour * 3600 + local_time.minute * 60 + local_time.second) / 86400
+
+        # The temperature peaks at 15:00 and the humidity is lowest when the temperature is highest.
+        daylight = math.sin(2 * math.pi * (day - 0.375))
+        temperature = 21 + 2 * daylight + self.random.gauss(0, 0.1 * self.noise)
+        humidity = 45 - 8 * daylight + self.random.gauss(0, 0.5 * self.noise)
+
+        self.pressure += (1013.25 - self.pressure) * 0.0001 + self.random.gauss(0, 0.01 * self.noise)
+
+        # The room is in use in the evening, peaking at 21:00, which lowers the gas resistance.
+        occupancy = max(0.0, math.sin(2 * math.pi * (day - 0.625)))
+        gas_resistance = self.clean_gas_resistance * (1 - 0.4 * occupancy) * \
+            (1 + self.random.gauss(0, 0.02 * self.noise))
+
+        fault = self.random.choice(self.FAULTS) if self.random.random() < self.fault_rate else None
+
+        if fault == "failed":
+            return []
+
+        if fault == "spike":
+            temperature += self.random.choice([-1, 1]) * 15
+            gas_resistance *= 0.2
+
+        if fault == "unstable":
+            return [temperature, self.pressure, humidity]
+
+        gas_resistance = int(gas_resistance)
+
+        return [temperature, self.pressure, humidity, gas_resistance,
+                self.sensor.get_air_quality(gas_resistance, humidity, gas_baseline)]
+
+
+class ReplaySource:
+    """
+    Source that replays exported measurements. The recorded readings are aligned with the given start, so the
+    first recorded reading is returned at the start and the replay starts over when the end of the data is reached.
+    Each reading is the latest recorded reading at or before the corresponding time in the data.
+    """
+    def __init__(self, path, start):
+        """
+        :param path: The path to a csv file with a header containing a time column and the sensor columns, for example
+        exported with export_data.py.
+        :param start: The time at which the first recorded reading is replayed.
+        """
+        self.start = start
+
+        with open(path, "r", newline="") as file:
+            rows = sorted((self.parse_time(row["time"]), [float(row[column]) for column in SENSOR_COLUMNS])
+                          for row in csv.DictReader(file))
+
+        if not rows:
+            raise ValueError("The replay file does not contain any readings: " + path)
+
+        self.times = [time for time, _ in rows]
+        self.readings = [reading for _, reading in rows]
+
+        # Including the interval after the last reading, so replaying the data again does not repeat a reading.
+        self.duration = self.times[-1] - self.times[0] + (self.times[-1] - self.times[-2] if len(rows) > 1 else
+                                                          datetime.timedelta(minutes=1))
+
+    def burn_in(self):
+        """The recorded air quality is replayed, so the gas baseline is only used by the gas baseline estimate."""
+        return self.readings[0][3]
+
+    def read(self, gas_baseline, measured_at):
+        """
+        Returns the recorded reading at the time in the data that corresponds to the given time.
+
+        :param gas_baseline: Not used since the recorded air quality is replayed.
+        :param measured_at: The time of the reading.
+        :return: The reading in the same format as sensor.get_sensor_data.
+        """
+        time = self.times[0] + (measured_at - self.start) % self.duration
+
+        return list(self.readings[max(0, bisect.bisect_right(self.times, time) - 1)])
+
+    @staticmethod
+    def parse_time(text):
+        """Parses a timestamp exported by PostgreSQL. Timestamps without a time zone are interpreted as UTC."""
+        time = dateutil.parser.isoparse(text)
+
+        return time if time.tzinfo is not None else time.replace(tzinfo=datetime.timezone.utc)
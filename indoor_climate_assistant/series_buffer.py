@@ -0,0 +1,88 @@
+"""
+Series buffer file for storing the data shown in the central graph. The data is stored in NumPy arrays so the graph can
+be updated with new data without copying the whole series on every update.
+"""
+import numpy as np
+
+
+class SeriesBuffer:
+    """
+    Buffer containing a series of x and y values ordered by x. The values are stored in preallocated NumPy arrays where
+    new values are appended after the existing values and old values are dropped by moving the start of the series.
+    Since the series is always contiguous in the arrays, the x and y properties are views that can be given directly to
+    matplotlib without copying them. When the end of the arrays is reached the series is moved back to the start of the
+    arrays, or the arrays are doubled in size if the series fills more than half of them, which means that appending is
+    amortized O(1).
+    """
+    def __init__(self, x=(), y=()):
+        capacity = max(2 * len(x), 64)
+
+        self.x_array = np.empty(capacity, dtype=float)
+        self.y_array = np.empty(capacity, dtype=float)
+
+        self.start = 0
+        self.end = 0
+
+        self.extend(x, y)
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def x(self):
+        """The x values of the series as a view of the underlying array."""
+        return self.x_array[self.start:self.end]
+
+    @property
+    def y(self):
+        """The y values of the series as a view of the underlying array."""
+        return self.y_array[self.start:self.end]
+
+    def extend(self, x, y):
+        """
+        Appends the given values to the end of the series.
+
+        :param x: The x values that should be appended. They should be larger than the existing x values.
+        :param y: The y values that should be appended.
+        """
+        count = len(x)
+
+        if self.end + count > len(self.x_array):
+            self.make_room(count)
+
+        self.x_array[self.end:self.end + count] = x
+        self.y_array[self.end:self.end + count] = y
+        self.end += count
+
+    def drop_before(self, x):
+        """
+        Drops the values from the start of the series that have an x value smaller than the given value.
+
+        :param x: The smallest x value that should be kept in the series.
+        """
+        self.start += int(np.searchsorted(self.x, x, side="left"))
+
+    def make_room(self, count):
+        """
+        Ensures that the given amount of values can be appended to the end of the arrays by moving the series to the
+        start of the arrays, and doubling the size of the arrays if necessary.
+
+        :param count: The amount of values that should fit after the series.
+        """
+        size = len(self)
+        capacity = len(self.x_array)
+
+        while size + count > capacity // 2:
+            capacity *= 2
+
+        if capacity != len(self.x_array):
+            x_array, y_array = np.empty(capacity, dtype=float), np.empty(capacity, dtype=float)
+        else:
+            x_array, y_array = self.x_array, self.y_array
+
+        # Using copy since the old and new position of the series can overlap when the arrays are reused.
+        x_array[:size] = self.x.copy()
+        y_array[:size] = self.y.copy()
+
+        self.x_array, self.y_array = x_array, y_array
+        self.start, self.end = 0, size
@@ -1,15 +1,18 @@
+import datetime
+
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import *
-from PyQt5 import QtCore
+
+from indoor_climate_assistant.warning_rules import RuleEngine, create_default_rules
 
 
 class SystemTray:
     """
     System tray icon that is used to access the application when it is closed.
     """
-    def __init__(self, main_window, database, app):
+    def __init__(self, main_window, data_store, app):
         self.main_window = main_window
-        self.aqt_assistant_db = database
+        self.data_store = data_store
         self.app = app
 
         # Setting up the system tray icon itself.
@@ -55,38 +58,65 @@ class SystemTray:
         # Add the menu to the tray.
         self.tray.setContextMenu(self.menu)
 
-        # Setup a timer to trigger the warning check every 10 minutes.
-        self.warning_check_timer = QtCore.QTimer()
-        self.warning_check_timer.setInterval(600000)
-        self.warning_check_timer.timeout.connect(self.check_warnings)
-        self.warning_check_timer.start()
+        # The rules for the warnings of each sensor and the engine that evaluates them with every new row of the sensor,
+        # which are created the first time the warnings of the sensor are checked.
+        self.rules = {}
+        self.engines = {}
+
+        # Updating the rules if any of the warning settings are changed.
+        self.main_window.aqMinSpinBox.valueChanged.connect(self.update_rules)
+        self.main_window.tMinSpinBox.valueChanged.connect(self.update_rules)
+        self.main_window.tMaxSpinBox.valueChanged.connect(self.update_rules)
+        self.main_window.aqWarningCheckBox.toggled.connect(self.update_rules)
+        self.main_window.tWarningCheckBox.toggled.connect(self.update_rules)
+
+        # Checking the warnings every time the data store has received new data, so a warning is sent right away.
+        self.data_store.updated.connect(self.check_warnings)
+
+    def update_rules(self):
+        """
+        Updates the thresholds of the warning rules of every sensor and whether they are enabled according to the main
+        window.
+        """
+        for rules in self.rules.values():
+            rules["air quality min"].threshold = self.main_window.aqMinSpinBox.value()
+            rules["air quality min"].enabled = self.main_window.aqWarningCheckBox.isChecked()
+            rules["temperature min"].threshold = self.main_window.tMinSpinBox.value()
+            rules["temperature min"].enabled = self.main_window.tWarningCheckBox.isChecked()
+            rules["temperature max"].threshold = self.main_window.tMaxSpinBox.value()
+            rules["temperature max"].enabled = self.main_window.tWarningCheckBox.isChecked()
 
     def check_warnings(self):
-        """Checks if the warning thresholds have been crossed. If so we send a warning to the user."""
-        # Getting the latest air quality and temperature from the database.
-        air_quality, temperature = self.aqt_assistant_db.get_sensor_data("airquality, temperature", 1)[0]
-
-        title = ""
-        message = ""
-
-        # If the user wants air quality warnings we check it.
-        if self.main_window.aqWarningCheckBox.isChecked():
-            # If the air quality is below the min threshold we add it to the warning.
-            if air_quality < self.main_window.aqMinSpinBox.value():
-                title += " Low air quality "
-                message += "Air quality is too low: " + str(air_quality) + "%\n"
-
-        # If the user wants temperature warnings we check it.
-        if self.main_window.tWarningCheckBox.isChecked():
-            # If the temperature is below the min threshold we add it to the warning.
-            if temperature < self.main_window.tMinSpinBox.value():
-                title += " Low temperature "
-                message += "Temperature is too low: " + str(temperature) + "°C\n"
-
-            # If the temperature is above the max threshold we add it to the warning.
-            if temperature > self.main_window.tMaxSpinBox.value():
-                title += " High temperature "
-                message += "Temperature is too high: " + str(temperature) + "°C\n"
-
-        if title != "" and message != "":
+        """
+        Evaluates the warning rules of each sensor with every row of the sensor that arrived since the last check. If
+        any of the rules send a warning we send it to the user, prefixed with the room of the sensor.
+        """
+        warnings = []
+
+        for sensor_id, _, room in self.data_store.sensors or []:
+            if sensor_id not in self.engines:
+                self.rules[sensor_id] = create_default_rules(0, 0, 0)
+                self.engines[sensor_id] = RuleEngine(list(self.rules[sensor_id].values()))
+                self.update_rules()
+
+            engine = self.engines[sensor_id]
+
+            # On the first check the rows within the longest rolling window are evaluated, so the rolling means are
+            # based on a full window right away. After that the rows are evaluated from the latest evaluated row.
+            if engine.latest_time is None:
+                window = max(rule.mean.window for rule in self.rules[sensor_id].values())
+                start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=window)
+            else:
+                start = datetime.datetime.fromtimestamp(engine.latest_time, datetime.timezone.utc)
+
+            times, (air_quality,) = self.data_store.peek("airquality", sensor_id, start)
+            _, (temperature,) = self.data_store.peek("temperature", sensor_id, start)
+
+            warnings += [(room + ": " + title, message) for title, message in engine.process_arrays(
+                times / 1000000, {"airquality": air_quality, "temperature": temperature})]
+
+        if warnings:
+            title = " ".join(title for title, _ in warnings)
+            message = "\n".join(message for _, message in warnings)
+
             self.tray.showMessage(title, message, QIcon("../resources/graph_icon.ico"))
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file '../resources/mainwindow.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        MainWindow.setObjectName("MainWindow")
+        MainWindow.resize(1224, 647)
+        self.centralwidget = QtWidgets.QWidget(MainWindow)
+        self.centralwidget.setObjectName("centralwidget")
+        self.graphWidget = MplWidget(self.centralwidget)
+        self.graphWidget.setGeometry(QtCore.QRect(10, 10, 981, 581))
+        self.graphWidget.setObjectName("graphWidget")
+        self.tWarningCheckBox = QtWidgets.QCheckBox(self.centralwidget)
+        self.tWarningCheckBox.setGeometry(QtCore.QRect(990, 350, 181, 31))
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.tWarningCheckBox.setFont(font)
+        self.tWarningCheckBox.setObjectName("tWarningCheckBox")
+        self.label = QtWidgets.QLabel(self.centralwidget)
+        self.label.setGeometry(QtCore.QRect(990, 50, 51, 21))
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.label.setFont(font)
+        self.label.setObjectName("label")
+        self.tMinSpinBox = QtWidgets.QDoubleSpinBox(self.centralwidget)
+        self.tMinSpinBox.setGeometry(QtCore.QRect(1110, 390, 51, 22))
+        self.tMinSpinBox.setAlignment(QtCore.Qt.AlignCenter)
+        self.tMinSpinBox.setDecimals(1)
+        self.tMinSpinBox.setSingleStep(0.5)
+        self.tMinSpinBox.setObjectName("tMinSpinBox")
+        self.label_2 = QtWidgets.QLabel(self.centralwidget)
+        self.label_2.setGeometry(QtCore.QRect(990, 150, 101, 21))
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.label_2.setFont(font)
+        self.label_2.setObjectName("label_2")
+        self.label_3 = QtWidgets.QLabel(self.centralwidget)
+        self.label_3.setGeometry(QtCore.QRect(990, 310, 101, 21))
+        font = QtGui.QFont()
+        font.setPointSize(11)
+        self.label_3.setFont(font)
+        self.label_3.setObjectName("label_3")
+        self.tMaxSpinBox = QtWidgets.QDoubleSpinBox(self.centralwidget)
+        self.tMaxSpinBox.setGeometry(QtCore.QRect(1110, 430, 51, 22))
+        self.tMaxSpinBox.setWrapping(False)
+        self.tMaxSpinBox.setFrame(True)
+        self.tMaxSpinBox.setAlignment(QtCore.Qt.AlignCenter)
+        self.tMaxSpinBox.setDecimals(1)
+        self.tMaxSpinBox.setSingleStep(0.5)
+        self.tMaxSpinBox.setObjectName("tMaxSpinBox")
+        self.aqWarningCheckBox = QtWidgets.QCheckBox(self.centralwidget)
+        self.aqWarningCheckBox.setGeometry(QtCore.QRect(990, 270, 171, 31))
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.aqWarningCheckBox.setFont(font)
+        self.aqWarningCheckBox.setObjectName("aqWarningCheckBox")
+        self.aqMinSpinBox = QtWidgets.QDoubleSpinBox(self.centralwidget)
+        self.aqMinSpinBox.setGeometry(QtCore.QRect(1110, 310, 51, 22))
+        self.aqMinSpinBox.setAlignment(QtCore.Qt.AlignCenter)
+        self.aqMinSpinBox.setDecimals(1)
+        self.aqMinSpinBox.setSingleStep(0.5)
+        self.aqMinSpinBox.setObjectName("aqMinSpinBox")
+        self.dataComboBox = QtWidgets.QComboBox(self.centralwidget)
+        self.dataComboBox.setGeometry(QtCore.QRect(990, 80, 171, 31))
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.dataComboBox.setFont(font)
+        self.dataComboBox.setObjectName("dataComboBox")
+        self.dataComboBox.addItem("")
+        self.dataComboBox.addItem("")
+        self.dataComboBox.addItem("")
+        self.dataComboBox.addItem("")
+        self.dataComboBox.addItem("")
+        self.label_5 = QtWidgets.QLabel(self.centralwidget)
+        self.label_5.setGeometry(QtCore.QRect(990, 430, 111, 21))
+        font = QtGui.QFont()
+        font.setPointSize(11)
+        self.label_5.setFont(font)
+        self.label_5.setObjectName("label_5")
+        self.label_4 = QtWidgets.QLabel(self.centralwidget)
+        self.label_4.setGeometry(QtCore.QRect(990, 390, 101, 21))
+        font = QtGui.QFont()
+        font.setPointSize(11)
+        self.label_4.setFont(font)
+        self.label_4.setObjectName("label_4")
+        self.timeFrameComboBox = QtWidgets.QComboBox(self.centralwidget)
+        self.timeFrameComboBox.setGeometry(QtCore.QRect(990, 180, 171, 31))
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.timeFrameComboBox.setFont(font)
+        self.timeFrameComboBox.setObjectName("timeFrameComboBox")
+        self.timeFrameComboBox.addItem("")
+        self.timeFrameComboBox.addItem("")
+        self.timeFrameComboBox.addItem("")
+        self.timeFrameComboBox.addItem("")
+        self.timeFrameComboBox.addItem("")
+        self.timeFrameComboBox.addItem("")
+        MainWindow.setCentralWidget(self.centralwidget)
+        self.menubar = QtWidgets.QMenuBar(MainWindow)
+        self.menubar.setGeometry(QtCore.QRect(0, 0, 1224, 21))
+        self.menubar.setObjectName("menubar")
+        MainWindow.setMenuBar(self.menubar)
+        self.statusbar = QtWidgets.QStatusBar(MainWindow)
+        self.statusbar.setObjectName("statusbar")
+        MainWindow.setStatusBar(self.statusbar)
+
+        self.retranslateUi(MainWindow)
+        QtCore.QMetaObject.connectSlotsByName(MainWindow)
+
+    def retranslateUi(self, MainWindow):
+        _translate = QtCore.QCoreApplication.translate
+        MainWindow.setWindowTitle(_translate("MainWindow", "Indoor Climate Assistant"))
+        self.tWarningCheckBox.setText(_translate("MainWindow", "Temperature Warning"))
+        self.label.setText(_translate("MainWindow", "Data:"))
+        self.label_2.setText(_translate("MainWindow", "Time frame:"))
+        self.label_3.setText(_translate("MainWindow", "Min threshold:"))
+        self.aqWarningCheckBox.setText(_translate("MainWindow", "Air Quality Warning"))
+        self.dataComboBox.setItemText(0, _translate("MainWindow", "Air quality"))
+        self.dataComboBox.setItemText(1, _translate("MainWindow", "Temperature"))
+        self.dataComboBox.setItemText(2, _translate("MainWindow", "Air pressure"))
+        self.dataComboBox.setItemText(3, _translate("MainWindow", "Gas resistance"))
+        self.dataComboBox.setItemText(4, _translate("MainWindow", "Humidity"))
+        self.label_5.setText(_translate("MainWindow", "Max threshold:"))
+        self.label_4.setText(_translate("MainWindow", "Min threshold:"))
+        self.timeFrameComboBox.setItemText(0, _translate("MainWindow", "Now"))
+        self.timeFrameComboBox.setItemText(1, _translate("MainWindow", "Today"))
+        self.timeFrameComboBox.setItemText(2, _translate("MainWindow", "This week"))
+        self.timeFrameComboBox.setItemText(3, _translate("MainWindow", "This month"))
+        self.timeFrameComboBox.setItemText(4, _translate("MainWindow", "This year"))
+        self.timeFrameComboBox.setItemText(5, _translate("MainWindow", "All time"))
+from mplwidget import MplWidget
@@ -0,0 +1,280 @@
+"""
+This file runs the air quality and temperature warnings without the desktop application, for example on the Raspberry
+pi zero or any other Linux host. It listens for the notifications that are sent when data is inserted into the
+PostgreSQL database and evaluates the warning rules with every new row, so it is idle until new data arrives. The
+thresholds are read from the settings of the desktop application and are reloaded when the settings file changes. The
+rules are evaluated separately for the measurements of each sensor, and the warnings are prefixed with the room.
+
+Usage: python warning_daemon.py [--config PATH] [--settings PATH] [--sink {stdout,webhook,desktop}] [--webhook-url URL]
+[--sensor NAME], where --sink can be given multiple times to send the warnings to multiple sinks (stdout by default),
+and --sensor can be given multiple times to only send the warnings of the given sensors (every sensor by default).
+"""
+import argparse
+import datetime
+import json
+import os
+import select
+import subprocess
+import time
+import urllib.request
+
+import psycopg2
+
+from indoor_climate_assistant.database import Database, DATABASE_CONFIG_PATH, NOTIFY_CHANNEL, MEASUREMENTS_TABLE
+from indoor_climate_assistant.warning_rules import RuleEngine, create_default_rules
+
+# The path to the settings file that is saved by the desktop application.
+SETTINGS_PATH = "../resources/settings.json"
+
+
+class StdoutSink:
+    """
+    Sink that prints the warnings.
+    """
+    def send(self, title, message):
+        print(datetime.datetime.now().isoformat(timespec="seconds") + " " + title + ": " + message, flush=True)
+
+
+class WebhookSink:
+    """
+    Sink that posts the warnings as json to a webhook, for example a local home automation server.
+    """
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, title, message):
+        body = json.dumps({"title": title, "message": message}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+
+        # A webhook that is unreachable should not stop the warnings from being sent to the other sinks.
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except OSError as error:
+            print("Error while sending warning to webhook: " + str(error))
+
+
+class DesktopSink:
+    """
+    Sink that shows the warnings as desktop notifications using notify-send.
+    """
+    def send(self, title, message):
+        try:
+            subprocess.run(["notify-send", title, message], check=False)
+        except OSError as error:
+            print("Error while showing desktop notification: " + str(error))
+
+
+class WarningDaemon:
+    """
+    Daemon that evaluates the warning rules with every row inserted into the measurements table and sends the warnings
+    to the given sinks. Each sensor has its own rules, so the rolling means of different rooms are not mixed.
+    """
+    # The number of seconds between each check of the settings file and for new rows while no data is arriving.
+    SETTINGS_CHECK_INTERVAL = 60
+
+    # The number of seconds between the attempts at reconnecting if the database cannot be reached.
+    RECONNECT_DELAY = 30
+
+    def __init__(self, database, sinks, settings_path=SETTINGS_PATH, sensor_names=None):
+        """
+        :param database: The database that the rows are queried from.
+        :param sinks: A list of sinks, which are objects with a send(title, message) method.
+        :param settings_path: The path to the settings file of the desktop application.
+        :param sensor_names: The names of the sensors whose warnings are sent. If None the warnings of every sensor are
+        sent.
+        """
+        self.database = database
+        self.sinks = sinks
+        self.settings_path = settings_path
+        self.sensor_names = sensor_names
+
+        # The room of each sensor, and the rules and the rule engine of each sensor whose warnings are sent, which are
+        # added when the sensors are loaded.
+        self.rooms = {}
+        self.rules = {}
+        self.engines = {}
+
+        # The loaded settings, or None if there is no settings file, the time the settings file was last modified when
+        # it was loaded, or None if there was no settings file, and whether the settings file has been checked yet.
+        self.settings = None
+        self.settings_mtime = None
+        self.settings_checked = False
+        self.load_settings()
+
+        # The connection that receives the notifications.
+        self.listener = None
+
+    def load_settings(self):
+        """
+        Updates the thresholds of the warning rules and whether they are enabled from the settings file, if it has
+        changed since it was last loaded. The rules are disabled if there is no settings file. If the settings file
+        cannot be parsed, for example while it is being written, the previous settings are kept until it is changed.
+        """
+        mtime = os.path.getmtime(self.settings_path) if os.path.isfile(self.settings_path) else None
+        if mtime == self.settings_mtime and self.settings_checked:
+            return
+
+        self.settings_mtime = mtime
+        self.settings_checked = True
+
+        if mtime is None:
+            print("No settings file found at " + self.settings_path + ", the warnings are disabled")
+            self.settings = None
+        else:
+            try:
+                with open(self.settings_path, "r") as file:
+                    settings = json.load(file)
+            except ValueError as error:
+                print("Error while reading the settings file at " + self.settings_path + ", keeping the previous "
+                      "settings: " + str(error))
+                return
+
+            self.settings = settings
+
+        for rules in self.rules.values():
+            self.apply_settings(rules)
+
+    def apply_settings(self, rules):
+        """Updates the thresholds of the given rules and whether they are enabled from the loaded settings."""
+        if self.settings is None:
+            for rule in rules.values():
+                rule.enabled = False
+
+            return
+
+        rules["air quality min"].threshold = self.settings["air quality min threshold"]
+        rules["air quality min"].enabled = self.settings["air quality warning"]
+        rules["temperature min"].threshold = self.settings["temperature min threshold"]
+        rules["temperature min"].enabled = self.settings["temperature warning"]
+        rules["temperature max"].threshold = self.settings["temperature max threshold"]
+        rules["temperature max"].enabled = self.settings["temperature warning"]
+
+    def load_sensors(self):
+        """
+        Loads the sensors from the database and creates the rules of the sensors that do not have them yet. This is
+        done when the daemon starts listening and when a sensor that is not known yet inserts rows.
+        """
+        for sensor_id, name, room in self.database.get_sensors():
+            # Every sensor is known so the notifications of the sensors that are left out do not load the sensors again.
+            self.rooms[sensor_id] = room
+
+            if sensor_id not in self.engines and (self.sensor_names is None or name in self.sensor_names):
+                self.rules[sensor_id] = create_default_rules(0, 0, 0)
+                self.engines[sensor_id] = RuleEngine(list(self.rules[sensor_id].values()))
+                self.apply_settings(self.rules[sensor_id])
+
+    def check_warnings(self):
+        """
+        Evaluates the warning rules of each sensor with every row that was inserted since the last check and sends the
+        warnings. On the first check of a sensor the rows within the longest rolling window are evaluated, so the
+        rolling means are based on a full window right away. The rows of every sensor are queried with a single query
+        from the earliest start, and the rows that a sensor has already evaluated are skipped by its engine.
+        """
+        if not self.engines:
+            return
+
+        end = datetime.datetime.now(datetime.timezone.utc)
+        starts = []
+
+        for sensor_id, engine in self.engines.items():
+            if engine.latest_time is None:
+                window = max(rule.mean.window for rule in self.rules[sensor_id].values())
+                starts.append(end - datetime.timedelta(seconds=window))
+            else:
+                starts.append(datetime.datetime.fromtimestamp(engine.latest_time, datetime.timezone.utc))
+
+        data = self.database.get_range(list(self.engines), ["airquality", "temperature"], min(starts), end,
+                                       as_arrays=True)
+
+        for sensor_id, (times, (air_quality, temperature)) in data.items():
+            warnings = self.engines[sensor_id].process_arrays(times / 1000000, {"airquality": air_quality,
+                                                                                "temperature": temperature})
+
+            for title, message in warnings:
+                for sink in self.sinks:
+                    sink.send(self.rooms[sensor_id] + ": " + title, message)
+
+    def run(self):
+        """
+        Listens for notifications and checks the warnings every time new rows are inserted into the measurements table.
+        The process sleeps in select until a notification arrives. If the connection is lost the daemon reconnects and
+        catches up on the rows that were inserted in the meantime.
+
+        If no notification arrives within the settings check interval the warnings are checked anyway, since a listening
+        connection that was dropped without being closed is only noticed once its keepalives fail, see Database.listen.
+        """
+        while True:
+            try:
+                if self.listener is None:
+                    self.listener = self.database.listen()
+                    self.load_sensors()
+                    self.check_warnings()
+
+                readable, _, _ = select.select([self.listener], [], [], self.SETTINGS_CHECK_INTERVAL)
+                self.load_settings()
+
+                if not readable:
+                    self.check_warnings()
+                    continue
+
+                self.listener.poll()
+                notifications = [json.loads(notify.payload) for notify in self.listener.notifies
+                                 if notify.channel == NOTIFY_CHANNEL]
+                self.listener.notifies.clear()
+
+                notifications = [notification for notification in notifications
+                                 if notification["table"] == MEASUREMENTS_TABLE]
+
+                # Loading the sensors again if rows were inserted by a sensor that is not known yet.
+                if any(notification["sensor_id"] not in self.rooms for notification in notifications):
+                    self.load_sensors()
+
+                if notifications:
+                    self.check_warnings()
+            except (Exception, psycopg2.Error) as pg_error:
+                print("Error while working with PostgreSQL" + str(pg_error))
+
+                self.close()
+                time.sleep(self.RECONNECT_DELAY)
+
+    def close(self):
+        """Closes the listening connection."""
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sends the air quality and temperature warnings without the desktop "
+                                                 "application.")
+    parser.add_argument("--config", default=DATABASE_CONFIG_PATH, help="The database config file.")
+    parser.add_argument("--settings", default=SETTINGS_PATH, help="The settings file with the warning thresholds.")
+    parser.add_argument("--sink", action="append", choices=["stdout", "webhook", "desktop"],
+                        help="Where the warnings are sent. Can be given multiple times.")
+    parser.add_argument("--webhook-url", help="The url that the warnings are posted to by the webhook sink.")
+    parser.add_argument("--sensor", action="append",
+                        help="The name of a sensor whose warnings are sent. Can be given multiple times.")
+    args = parser.parse_args()
+
+    sink_names = args.sink or ["stdout"]
+    if "webhook" in sink_names and args.webhook_url is None:
+        parser.error("--webhook-url is required by the webhook sink")
+
+    sinks = {
+        "stdout": StdoutSink,
+        "webhook": lambda: WebhookSink(args.webhook_url),
+        "desktop": DesktopSink
+    }
+
+    # Only a single connection is needed since the rows are queried one batch at a time.
+    aqtassistant_db = Database(args.config, max_connections=1)
+    daemon = WarningDaemon(aqtassistant_db, [sinks[name]() for name in sink_names], args.settings, args.sensor)
+
+    # Wrapping the infinite loop in a try-except to support command line keyboard interruption.
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.close()
+        aqtassistant_db.close()
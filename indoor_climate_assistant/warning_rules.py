@@ -0,0 +1,197 @@
+"""
+Warning rules file for evaluating the warning thresholds against the data from the bme680 sensor. Every measurement is
+evaluated as it arrives, so short excursions between two checks are not missed. Each rule compares a rolling mean of a
+column against a threshold, and uses a hysteresis band, a debounce duration and a cooldown so a value that hovers around
+the threshold does not cause a stream of warnings. The rules do not depend on Qt so they can be evaluated anywhere the
+measurements are available.
+"""
+import collections
+import math
+
+
+class RollingMean:
+    """
+    Mean of the values within a sliding time window. The sum of the values in the window is kept up to date when values
+    are added and removed, so adding a value takes constant time no matter how large the window is.
+    """
+    def __init__(self, window):
+        """
+        :param window: The length of the window in seconds. If 0 the mean is the latest value.
+        """
+        self.window = window
+        self.values = collections.deque()
+        self.sum = 0.0
+
+    def add(self, time, value):
+        """
+        Adds a value to the window and removes the values that are no longer within the window.
+
+        :param time: The time of the value in seconds. The times must be added in chronological order.
+        :param value: The value that is added.
+        :return: The mean of the values within the window ending at the given time.
+        """
+        self.values.append((time, value))
+        self.sum += value
+
+        while self.values[0][0] <= time - self.window and len(self.values) > 1:
+            self.sum -= self.values.popleft()[1]
+
+        return self.sum / len(self.values)
+
+
+class ThresholdRule:
+    """
+    Rule that is triggered when the rolling mean of a column crosses a threshold. The rule is active from when the
+    threshold has been crossed for the debounce duration until the mean is back on the other side of the hysteresis
+    band. A warning is sent once each time the rule becomes active, unless a warning was sent within the cooldown, in
+    which case the warning is sent when the cooldown has passed if the rule is still active.
+    """
+    def __init__(self, column, threshold, above, title, message, window=0, hysteresis=0.0, debounce=0, cooldown=600):
+        """
+        :param column: The column that the rule is evaluated on.
+        :param threshold: The threshold that the rolling mean is compared with.
+        :param above: True if the rule is triggered when the mean is above the threshold, False if it is triggered when
+        the mean is below the threshold.
+        :param title: The title of the warning.
+        :param message: The message of the warning, where {} is replaced by the mean that triggered the warning.
+        :param window: The length of the rolling mean in seconds.
+        :param hysteresis: How far the mean has to be on the other side of the threshold before the rule is cleared.
+        :param debounce: The number of seconds the threshold has to be crossed before the rule is triggered.
+        :param cooldown: The minimum number of seconds between two warnings from the rule.
+        """
+        self.column = column
+        self.threshold = threshold
+        self.above = above
+        self.title = title
+        self.message = message
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        self.cooldown = cooldown
+        self.enabled = True
+
+        self.mean = RollingMean(window)
+
+        # Whether the rule is active, the time the threshold was first crossed, whether a warning has been sent since
+        # the rule became active and the time of the latest warning.
+        self.active = False
+        self.crossed_since = None
+        self.warned = False
+        self.last_warning_time = None
+
+    def evaluate(self, time, value):
+        """
+        Evaluates the rule with a new measurement.
+
+        :param time: The time of the measurement in seconds.
+        :param value: The value of the column in the measurement.
+        :return: The warning message if the rule sends a warning, otherwise None.
+        """
+        mean = self.mean.add(time, value)
+
+        if not self.enabled:
+            self.active = False
+            self.crossed_since = None
+            return None
+
+        crossed = mean > self.threshold if self.above else mean < self.threshold
+
+        if self.active:
+            cleared = mean <= self.threshold - self.hysteresis if self.above else \
+                mean >= self.threshold + self.hysteresis
+
+            if cleared:
+                self.active = False
+                self.crossed_since = None
+                return None
+        elif crossed:
+            if self.crossed_since is None:
+                self.crossed_since = time
+
+            if time - self.crossed_since < self.debounce:
+                return None
+
+            self.active = True
+            self.warned = False
+        else:
+            self.crossed_since = None
+            return None
+
+        if self.warned or (self.last_warning_time is not None and time - self.last_warning_time < self.cooldown):
+            return None
+
+        self.warned = True
+        self.last_warning_time = time
+
+        return self.message.format(round(mean, 2))
+
+
+class RuleEngine:
+    """
+    Engine that evaluates a list of rules with every new measurement.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+
+        # The time of the latest evaluated measurement, so measurements that are given twice are only evaluated once.
+        self.latest_time = None
+
+    def process(self, time, row):
+        """
+        Evaluates every rule with a single measurement. Missing values are skipped.
+
+        :param time: The time of the measurement in seconds.
+        :param row: A dictionary from each column to its value in the measurement.
+        :return: A list of tuples with the format (title, message) with a tuple for each warning that is sent.
+        """
+        if self.latest_time is not None and time <= self.latest_time:
+            return []
+
+        self.latest_time = time
+        warnings = []
+
+        for rule in self.rules:
+            value = row.get(rule.column)
+
+            if value is None or math.isnan(value):
+                continue
+
+            message = rule.evaluate(time, value)
+            if message is not None:
+                warnings.append((rule.title, message))
+
+        return warnings
+
+    def process_arrays(self, times, columns):
+        """
+        Evaluates every rule with each of the given measurements in chronological order.
+
+        :param times: The time of each measurement in seconds.
+        :param columns: A dictionary from each column to an array with its value in each measurement.
+        :return: A list of tuples with the format (title, message) with a tuple for each warning that is sent.
+        """
+        warnings = []
+
+        for index, time in enumerate(times):
+            warnings += self.process(float(time), {column: float(array[index]) for column, array in columns.items()})
+
+        return warnings
+
+
+def create_default_rules(air_quality_min, temperature_min, temperature_max):
+    """
+    Creates the rules for the air quality and temperature warnings. The air quality is averaged over 15 minutes since it
+    changes quickly when the room is used, while the temperature is averaged over 5 minutes.
+
+    :param air_quality_min: The air quality in percent below which a warning is sent.
+    :param temperature_min: The temperature in degrees celsius below which a warning is sent.
+    :param temperature_max: The temperature in degrees celsius above which a warning is sent.
+    :return: A dictionary from the name of each rule to the rule.
+    """
+    return {
+        "air quality min": ThresholdRule("airquality", air_quality_min, False, "Low air quality",
+                                         "Air quality is too low: {}%", window=900, hysteresis=5, debounce=120),
+        "temperature min": ThresholdRule("temperature", temperature_min, False, "Low temperature",
+                                         "Temperature is too low: {}°C", window=300, hysteresis=0.5, debounce=120),
+        "temperature max": ThresholdRule("temperature", temperature_max, True, "High temperature",
+                                         "Temperature is too high: {}°C", window=300, hysteresis=0.5, debounce=120)
+    }